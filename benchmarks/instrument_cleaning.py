@@ -0,0 +1,127 @@
+"""
+Benchmark of the cleaning of the instrument information (INSTRUMENT, INSTRUMENTTYPE and COMMENT of each spectrum):
+the rule table of normalize_instruments_and_resolution against the former successive re.sub.
+
+Usage, from the repository root:
+    python benchmarks/instrument_cleaning.py [MSP or MGF files...]
+
+Without files, a corpus of comments like the ones of the public libraries (MoNA, MassBank, GNPS) is generated.
+With files, the INSTRUMENT, INSTRUMENTTYPE and COMMENT values of the files are used.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tests"))
+
+from scripts.normalizer.normalize_instruments_and_resolution import clean_instrument, clean_instrument_type, clean_comment
+from test_instrument_cleaning import reference_clean_instrument, reference_clean_comment
+import random
+import time
+import re
+
+# Number of generated spectra when no file is given
+GENERATED_SPECTRA = 20000
+
+# Number of timed repetitions, the best one is kept
+REPEATS = 5
+
+INSTRUMENTS = ["Q Exactive Plus Orbitrap Thermo Scientific", "maXis plus UHR-ToF-MS, Bruker Daltonics",
+               "Agilent 6530 Q-TOF", "TripleTOF 5600 SCIEX", "API 3000, Applied Biosystems", "LTQ Orbitrap XL",
+               "Waters Xevo G2-XS QTof", "Agilent 6460 Triple Quad", "Thermo Q Exactive HF", "ACQUITY UPLC I-Class"]
+
+INSTRUMENT_TYPES = ["LC-ESI-QTOF", "LC-ESI-ITFT", "LC-ESI-QFT", "GC-EI-TOF", "LC-ESI-QQ", "ESI-QTOF", "LC-ESI-TOF",
+                    "LC-APCI-QTOF", "MALDI-TOF", "LC-ESI-IT"]
+
+COMMENT_FIELDS = ["\"SMILES=CN1C=NC2=C1C(=O)N(C(=O)N2C)C\"", "\"accession=MSBNK-RIKEN-PR100001\"",
+                  "\"author=Nihon Waters K.K.\"", "\"license=CC BY-SA\"", "\"exact mass=194.0804\"",
+                  "\"ionization=ESI\"", "\"fragmentation mode=HCD\"", "\"collision energy=35 (nominal)\"",
+                  "\"resolution=17500\"", "\"column=Acquity UPLC BEH C18 1.7um, 2.1x100mm, Waters\"",
+                  "\"flow gradient=99/1 at 0-1 min, 61/39 at 3 min\"", "\"retention time=3.21 min\"",
+                  "\"computed SPLASH=splash10-0002-0900000000-b112e4e059e1ecf98c5f\"",
+                  "\"submitter=Tobias Kind (UC Davis)\"", "\"MoNA Rating=5.0\""]
+
+
+def generate_corpus(n_spectra, seed=0):
+    """
+    Generates the (INSTRUMENT, INSTRUMENTTYPE, COMMENT) values of n_spectra spectra.
+
+    :param n_spectra: The number of spectra.
+    :param seed: The seed of the generator.
+    :return: The list of the values, lowercase like in clean_spectrum_instrument_info.
+    """
+    rng = random.Random(seed)
+
+    return [(rng.choice(INSTRUMENTS).lower(),
+             rng.choice(INSTRUMENT_TYPES).lower(),
+             " ".join(rng.sample(COMMENT_FIELDS, rng.randint(2, len(COMMENT_FIELDS)))).lower())
+            for _ in range(n_spectra)]
+
+
+def read_corpus(file_paths):
+    """
+    Reads the INSTRUMENT, INSTRUMENTTYPE and COMMENT values of MSP or MGF files (one value per line, the spectra are
+    not rebuilt: each value is cleaned by the three functions).
+
+    :param file_paths: The paths of the files.
+    :return: The list of the values, lowercase like in clean_spectrum_instrument_info.
+    """
+    field_pattern = re.compile(r"(?i)^(?:instrument|instrumenttype|instrument_type|comments?|source_instrument)\s*[:=]\s*(.*)$")
+
+    corpus = []
+    for file_path in file_paths:
+        with open(file_path, "r", encoding="utf-8", errors="ignore") as file:
+            for line in file:
+                match = field_pattern.match(line)
+                if match:
+                    value = match.group(1).strip().lower()
+                    corpus.append((value, value, value))
+
+    return corpus
+
+
+def time_cleaning(corpus, cleanings):
+    """
+    Times the cleaning of a corpus.
+
+    :param corpus: The list of (INSTRUMENT, INSTRUMENTTYPE, COMMENT) values.
+    :param cleanings: The cleaning functions of the three values.
+    :return: The best time of REPEATS runs, in seconds.
+    """
+    instrument_cleaning, instrument_type_cleaning, comment_cleaning = cleanings
+
+    best = float("inf")
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        for instrument, instrument_type, comment in corpus:
+            instrument_cleaning(instrument)
+            instrument_type_cleaning(instrument_type)
+            comment_cleaning(comment)
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def main(file_paths):
+    corpus = read_corpus(file_paths) if file_paths else generate_corpus(GENERATED_SPECTRA)
+
+    rule_table = (clean_instrument, clean_instrument_type, clean_comment)
+    successive_sub = (reference_clean_instrument, reference_clean_comment, reference_clean_comment)
+
+    # Both implementations must give the same cleaned values
+    for values in corpus:
+        assert [cleaning(value) for cleaning, value in zip(rule_table, values)] == \
+               [cleaning(value) for cleaning, value in zip(successive_sub, values)], values
+
+    mean_length = sum(len(comment) for _, _, comment in corpus) / max(1, len(corpus))
+    print(f"{len(corpus)} spectra, mean comment length {mean_length:.0f} characters")
+
+    successive_sub_time = time_cleaning(corpus, successive_sub)
+    rule_table_time = time_cleaning(corpus, rule_table)
+
+    print(f"successive re.sub: {successive_sub_time:.3f} s")
+    print(f"rule table:        {rule_table_time:.3f} s ({successive_sub_time / rule_table_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -4,6 +4,7 @@ import ctypes
 import time
 import platform
 import traceback
+import multiprocessing
 
 from PyQt6.QtWidgets import QApplication, QMessageBox
 from PyQt6.QtGui import QPixmap, QIcon
@@ -125,4 +126,6 @@ def run_GUI():
 
 
 if __name__ == "__main__":
+    # Required by the worker processes of the execution engine in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
     run_GUI()
\ No newline at end of file
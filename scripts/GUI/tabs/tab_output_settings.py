@@ -1,7 +1,8 @@
-from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QSpacerItem, QSizePolicy
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QSpacerItem, QSizePolicy, QComboBox
 from PyQt6.QtCore import Qt, QSize, pyqtSignal
 from PyQt6.QtGui import QPainter, QColor, QBrush, QPen, QFont
 from scripts.GUI.utils.global_vars import parameters_dict  # Importer le dictionnaire global
+from scripts.executor import EXECUTION_MODES
 
 
 # Class for the custom Toggle Switch with modern styling
@@ -81,6 +82,11 @@ class OutputSettingTab(QWidget):
         parameters_dict['csv'] = 1.0
         parameters_dict['msp'] = 1.0
         parameters_dict['json'] = 1.0
+        parameters_dict['execution_mode'] = "process"
+        parameters_dict['streaming_mode'] = 0.0
+        parameters_dict['batch_normalization'] = 1.0
+        parameters_dict['skip_unchanged_inputs'] = 0.0
+        parameters_dict['normalizers_timing'] = 0.0
 
         # Define the main layout (global vertical layout)
         main_layout = QVBoxLayout()
@@ -97,6 +103,11 @@ class OutputSettingTab(QWidget):
         center_layout.addLayout(self._create_row("CSV", "csv"))
         center_layout.addLayout(self._create_row("MSP", "msp"))
         center_layout.addLayout(self._create_row("JSON", "json"))
+        center_layout.addLayout(self._create_mode_row("EXECUTION MODE", "execution_mode", EXECUTION_MODES))
+        center_layout.addLayout(self._create_row("LOW MEMORY (streaming)", "streaming_mode"))
+        center_layout.addLayout(self._create_row("BATCH NORMALIZATION", "batch_normalization"))
+        center_layout.addLayout(self._create_row("SKIP UNCHANGED INPUTS", "skip_unchanged_inputs"))
+        center_layout.addLayout(self._create_row("NORMALIZERS TIMING", "normalizers_timing"))
 
         # Add the centered layout to the main layout
         main_layout.addLayout(center_layout)
@@ -111,7 +122,14 @@ class OutputSettingTab(QWidget):
         info_button.setFixedSize(30, 30)
 
         # Set a tooltip for the button
-        info_button.setToolTip("This tab lets you choose the output formats to be written by FragHub at the end of processing.")
+        info_button.setToolTip("This tab lets you choose the output formats to be written by FragHub at the end of processing.\n"
+                               "EXECUTION MODE runs the processing in worker processes (process, fastest), in threads (thread)\n"
+                               "or without parallelism (serial). Use thread if the worker processes fail to start.\n"
+                               "LOW MEMORY processes the spectra by batches to bound the memory used on large libraries.\n"
+                               "BATCH NORMALIZATION normalizes the metadata of the spectra together, each distinct value once\n"
+                               "(otherwise spectrum by spectrum, same results).\n"
+                               "SKIP UNCHANGED INPUTS does not read again the input files unchanged since the last run.\n"
+                               "NORMALIZERS TIMING reports the time spent in each metadata normalizer at the end of the run.")
 
         # Add the button to the bottom-right layout
         info_button_layout.addWidget(info_button)
@@ -141,6 +159,31 @@ class OutputSettingTab(QWidget):
 
         return row_layout
 
+    def _create_mode_row(self, label_text, parameter_key, modes):
+        # Create a row with a drop-down menu of the modes and a label
+        row_layout = QHBoxLayout()  # Horizontal layout
+        row_layout.setAlignment(Qt.AlignmentFlag.AlignCenter)  # Center each row
+
+        # Create the drop-down menu, initialized with the current mode, and connect its signal
+        mode_menu = QComboBox()
+        mode_menu.addItems(modes)
+        mode_menu.setCurrentText(parameters_dict[parameter_key])
+        mode_menu.currentTextChanged.connect(lambda mode: self.update_mode(parameter_key, mode))
+
+        # Create the label for the text
+        label = QLabel(label_text)
+        label.setStyleSheet("font-size: 14px;")  # Slightly increase the text size
+
+        # Add the menu and the text to the row
+        row_layout.addWidget(mode_menu)
+        row_layout.addWidget(label)
+
+        return row_layout
+
     def update_parameter(self, key, state):
         # Update the global dictionary with 1.0 or 0.0 depending on the state
-        parameters_dict[key] = 1.0 if state else 0.0
\ No newline at end of file
+        parameters_dict[key] = 1.0 if state else 0.0
+
+    def update_mode(self, key, mode):
+        # Update the global dictionary with the selected mode
+        parameters_dict[key] = mode
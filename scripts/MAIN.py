@@ -6,7 +6,9 @@ from scripts.normalize_to_not_found import *
 from scripts.ontologies_completion import *
 from scripts.convertors.csv_to_msp import *
 from scripts.de_novo_calculation import *
+from scripts.executor import *
 from scripts.spectrum_normalizer import *
+from scripts.streaming_pipeline import *
 from scripts.duplicatas_remover import *
 from scripts.splash_generator import *
 from scripts.set_projects import *
@@ -75,12 +77,38 @@ def MAIN(progress_callback=None, total_items_callback=None, prefix_callback=None
 
         init_project(output_directory)
 
+        # The statistics of the instrument resolution cache and the timings of the normalizers are reported per run
+        reset_instrument_cache_statistics()
+        reset_normalizer_timings()
+
         start_time = time.time()
 
         input_path = parameters_dict["input_directory"]
 
+        # Fingerprints of the input files of the previous runs
+        load_input_fingerprints(output_directory)
+
+        # Skip the input files unchanged since a previous successful run, all their spectra were already processed
+        if parameters_dict.get('skip_unchanged_inputs', 0.0) == 1.0 and parameters_dict['reset_updates'] != 1.0:
+            input_path, unchanged_files = filter_unchanged_inputs(input_path)
+            if unchanged_files and deletion_callback:
+                deletion_callback(f"unchanged input files skipped: {len(unchanged_files)}")
+
         check_stop_flag()
 
+        # Streaming mode: the spectra flow in bounded batches from the loaders to the writers
+        if parameters_dict.get('streaming_mode', 0.0) == 1.0:
+            streaming_processing(input_path, output_directory, check_stop_flag, progress_callback=progress_callback,
+                                 total_items_callback=total_items_callback, prefix_callback=prefix_callback,
+                                 item_type_callback=item_type_callback, step_callback=step_callback,
+                                 deletion_callback=deletion_callback)
+
+            time.sleep(0.01)
+            if completion_callback:
+                completion_callback(
+                    "--- TOTAL TIME: %s ---" % time.strftime("%H:%M:%S", time.gmtime(time.time() - start_time)))
+            return 0
+
         # STEP 1: convert files to json if needed (Multithreaded)
         FINAL_MSP, FINAL_CSV, FINAL_JSON, FINAL_MGF = parsing_to_dict(input_path, progress_callback=progress_callback,
                                                                       total_items_callback=total_items_callback,
@@ -109,11 +137,14 @@ def MAIN(progress_callback=None, total_items_callback=None, prefix_callback=None
         if step_callback:
             step_callback("-- GENERATING SPLASH UNIQUE ID --")
         time.sleep(0.01)
+        # The SPLASH of the peak lists met in the previous runs are read from the SPLASH cache of the project
+        load_splash_cache(output_directory)
         FINAL_MSP, FINAL_CSV, FINAL_JSON, FINAL_MGF = generate_splash_id(FINAL_MSP, FINAL_CSV, FINAL_JSON, FINAL_MGF,
                                                                          progress_callback=progress_callback,
                                                                          total_items_callback=total_items_callback,
                                                                          prefix_callback=prefix_callback,
                                                                          item_type_callback=item_type_callback)
+        save_splash_cache(output_directory)
         check_stop_flag()
 
         spectrum_list = []
@@ -127,7 +158,7 @@ def MAIN(progress_callback=None, total_items_callback=None, prefix_callback=None
         del FINAL_MGF
 
         # STEP 3: removing duplicatas
-        spectrum_list = pd.DataFrame(spectrum_list)[ordered_columns]
+        spectrum_list = spectra_to_dataframe(spectrum_list)[ordered_columns]
         spectrum_list = spectrum_list.astype({col: str for col in ordered_columns if col != 'PEAKS_LIST'})
         time.sleep(0.01)
         if step_callback:
@@ -154,6 +185,9 @@ def MAIN(progress_callback=None, total_items_callback=None, prefix_callback=None
                                                                                  item_type_callback=item_type_callback)
         deletion_callback(f"previously cleaned: {scripts.deletion_report.previously_cleaned}")
 
+        # The SPLASH of all the spectra of the input files are now recorded, so are the fingerprints of the files
+        save_input_fingerprints(output_directory, input_path)
+
         check_stop_flag()
 
         if spectrum_list:
@@ -186,6 +220,9 @@ def MAIN(progress_callback=None, total_items_callback=None, prefix_callback=None
                 Minimum high peaks not required: {scripts.deletion_report.minimum_high_peaks_not_requiered}
                 """
             )
+            deletion_callback(instrument_cache_report())
+            if normalizer_timings_report():
+                deletion_callback(normalizer_timings_report())
 
             check_stop_flag()
 
@@ -197,7 +234,9 @@ def MAIN(progress_callback=None, total_items_callback=None, prefix_callback=None
                         "--- TOTAL TIME: %s ---" % time.strftime("%H:%M:%S", time.gmtime(time.time() - start_time)))
                 return 0
 
-            spectrum_list = pd.DataFrame(spectrum_list)[ordered_columns].astype(str)
+            # The peaks stay numpy arrays up to the writers
+            spectrum_list = pd.DataFrame(spectrum_list)[ordered_columns]
+            spectrum_list = spectrum_list.astype({col: str for col in ordered_columns if col != 'PEAKS_LIST'})
 
             # STEP 5: mols derivations and calculations
             time.sleep(0.01)
@@ -362,4 +401,8 @@ def MAIN(progress_callback=None, total_items_callback=None, prefix_callback=None
             deletion_callback("\n-- PROCESS INTERRUPTED BY USER --")
 
     except Exception:
-        raise
\ No newline at end of file
+        raise
+
+    finally:
+        # Stop the worker processes of the run
+        shutdown_executor()
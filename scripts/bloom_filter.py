@@ -0,0 +1,167 @@
+import numpy as np
+import math
+import os
+
+# Version of the Bloom filter file format, a file written with another version is ignored
+BLOOM_FILTER_VERSION = 1
+
+# Default false positive rate of the Bloom filters
+DEFAULT_FALSE_POSITIVE_RATE = 0.01
+
+
+def create_bloom_filter(capacity, false_positive_rate=DEFAULT_FALSE_POSITIVE_RATE):
+    """
+    Creates an empty Bloom filter sized for capacity keys at the given false positive rate.
+
+    :param capacity: The number of keys the filter is sized for.
+    :param false_positive_rate: The false positive rate at capacity.
+    :return: The Bloom filter, a dictionary {"bits", "n_bits", "n_hashes", "capacity", "count"}.
+    """
+    capacity = max(1, int(capacity))
+
+    # Optimal number of bits and of hash functions
+    n_bits = max(64, int(math.ceil(-capacity * math.log(false_positive_rate) / math.log(2) ** 2)))
+    n_bits = -(-n_bits // 8) * 8
+    n_hashes = max(1, int(round(n_bits / capacity * math.log(2))))
+
+    return {"bits": np.zeros(n_bits // 8, dtype=np.uint8),
+            "n_bits": n_bits,
+            "n_hashes": n_hashes,
+            "capacity": capacity,
+            "count": 0}
+
+
+def mix64(values):
+    """
+    Finalizer of SplitMix64: spreads the bits of 64 bits hashes.
+
+    :param values: A uint64 array.
+    :return: The mixed uint64 array.
+    """
+    values = (values ^ (values >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    values = (values ^ (values >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return values ^ (values >> np.uint64(31))
+
+
+def key_hashes(keys):
+    """
+    Computes two stable 64 bits hashes per key (FNV-1a over the UTF-8 bytes, then SplitMix64 mixing), vectorised over
+    the characters of all the keys at once.
+
+    :param keys: A list of string keys.
+    :return: A tuple of two uint64 arrays (h1, h2).
+    """
+    try:
+        encoded = np.array(keys, dtype=np.bytes_)
+    except UnicodeEncodeError:
+        encoded = np.array([key.encode("utf-8") for key in keys], dtype=np.bytes_)
+
+    lengths = np.char.str_len(encoded)
+    characters = encoded.view(np.uint8).reshape(len(keys), -1)
+
+    # FNV-1a, the bytes past the end of each key (padding) are skipped
+    hashes = np.full(len(keys), 0xCBF29CE484222325, dtype=np.uint64)
+    for column in range(characters.shape[1]):
+        in_key = column < lengths
+        mixed = (hashes ^ characters[:, column]) * np.uint64(0x100000001B3)
+        hashes = np.where(in_key, mixed, hashes)
+
+    h1 = mix64(hashes)
+    h2 = mix64(h1 ^ np.uint64(0x9E3779B97F4A7C15)) | np.uint64(1)
+
+    return h1, h2
+
+
+def bloom_positions(bloom_filter, keys):
+    """
+    Computes the bit positions of keys in a Bloom filter, by double hashing.
+
+    :param bloom_filter: The Bloom filter.
+    :param keys: A list of string keys.
+    :return: A (len(keys), n_hashes) array of bit positions.
+    """
+    h1, h2 = key_hashes(keys)
+
+    # h1 + i * h2 (modulo 2**64), then modulo the number of bits
+    steps = np.arange(bloom_filter["n_hashes"], dtype=np.uint64)
+    return (h1[:, None] + steps * h2[:, None]) % np.uint64(bloom_filter["n_bits"])
+
+
+def bloom_add(bloom_filter, keys):
+    """
+    Adds keys to a Bloom filter.
+
+    :param bloom_filter: The Bloom filter, updated in place.
+    :param keys: A list of string keys.
+    :return: None
+    """
+    if not keys:
+        return
+
+    positions = bloom_positions(bloom_filter, keys).ravel()
+
+    # Set the bits in place on the packed array (bit i of byte j is position 8 * j + i)
+    np.bitwise_or.at(bloom_filter["bits"], positions >> np.uint64(3),
+                     np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+
+    bloom_filter["count"] += len(keys)
+
+
+def bloom_contains(bloom_filter, keys):
+    """
+    Tests the membership of keys in a Bloom filter. False means that the key was never added, True that it may have
+    been added (false positive rate of the filter).
+
+    :param bloom_filter: The Bloom filter.
+    :param keys: A list of string keys.
+    :return: A boolean array.
+    """
+    if not keys:
+        return np.zeros(0, dtype=bool)
+
+    positions = bloom_positions(bloom_filter, keys)
+    bits = (bloom_filter["bits"][positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+
+    return bits.all(axis=1)
+
+
+def save_bloom_filter(bloom_filter, bloom_filter_path, generation):
+    """
+    Writes a Bloom filter to disk (NumPy .npz file), through a temporary file.
+
+    :param bloom_filter: The Bloom filter.
+    :param bloom_filter_path: The path of the file.
+    :param generation: The generation of the data the filter was built from, to detect stale filters.
+    :return: None
+    """
+    header = np.array([BLOOM_FILTER_VERSION, bloom_filter["n_bits"], bloom_filter["n_hashes"],
+                       bloom_filter["capacity"], bloom_filter["count"], generation], dtype=np.int64)
+
+    temporary_path = bloom_filter_path + ".tmp"
+    with open(temporary_path, "wb") as f:
+        np.savez(f, header=header, bits=bloom_filter["bits"])
+    os.replace(temporary_path, bloom_filter_path)
+
+
+def load_bloom_filter(bloom_filter_path):
+    """
+    Reads a Bloom filter written by save_bloom_filter.
+
+    :param bloom_filter_path: The path of the file.
+    :return: A tuple (Bloom filter, generation), or (None, None) if the file is missing, corrupted or outdated.
+    """
+    if not os.path.isfile(bloom_filter_path):
+        return None, None
+
+    try:
+        with np.load(bloom_filter_path) as data:
+            header = data["header"].tolist()
+            bits = data["bits"]
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+    version, n_bits, n_hashes, capacity, count, generation = header
+    if version != BLOOM_FILTER_VERSION or len(bits) * 8 != n_bits:
+        return None, None
+
+    return {"bits": bits, "n_bits": n_bits, "n_hashes": n_hashes, "capacity": capacity, "count": count}, generation
@@ -1,3 +1,4 @@
+from scripts.peak_arrays import *
 import pandas as pd
 import time
 import re
@@ -32,7 +33,8 @@ def dataframe_to_msp(dataframe, name, progress_callback=None, total_items_callba
     # Reindex the DataFrame to ensure consecutive indexing (important after filtering/splitting)
     dataframe = dataframe.reset_index(drop=True)
 
-    # Convert all columns to string type
+    # Format the peak arrays to text in one pass, then convert all columns to string type
+    dataframe = format_peaks_column(dataframe, "\n")
     dataframe = dataframe.astype(str)
 
     # Indicate the ongoing task
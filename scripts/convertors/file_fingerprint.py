@@ -0,0 +1,146 @@
+import hashlib
+import json
+import os
+
+# Name of the file recording the fingerprint of the input files of the previous runs, in the project output directory
+FINGERPRINTS_FILENAME = "input_fingerprints.json"
+
+# Size of the blocks read to compute the fingerprint of a file
+FINGERPRINT_BLOCK_SIZE = 1024 * 1024
+
+global fingerprint_records
+# Fingerprints of the input files of the previous runs {absolute path: {"size", "mtime_ns", "fingerprint"}}
+fingerprint_records = {}
+
+global computed_fingerprints
+# Fingerprints computed during this run, same structure as fingerprint_records
+computed_fingerprints = {}
+
+
+def file_signature(file_path):
+    """
+    Returns the size and modification time of a file, used as fast path to avoid reading unchanged files again.
+
+    :param file_path: Path to the file.
+    :return: A tuple (size in bytes, modification time in nanoseconds).
+    """
+    stat = os.stat(file_path)
+
+    return stat.st_size, stat.st_mtime_ns
+
+
+def compute_file_fingerprint(file_path):
+    """
+    Computes the content fingerprint of a file: a BLAKE2b (256 bits) digest of its bytes, read by blocks.
+
+    :param file_path: Path to the file.
+    :return: The hexadecimal fingerprint.
+    """
+    blake2b_hash = hashlib.blake2b(digest_size=32)
+
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(FINGERPRINT_BLOCK_SIZE), b''):
+            blake2b_hash.update(block)
+
+    return blake2b_hash.hexdigest()
+
+
+def generate_file_hash(file_path):
+    """
+    Returns the content fingerprint of a file (BLAKE2b of its bytes). When the size and modification time of the file
+    match the ones recorded (in this run or in a previous run), the recorded fingerprint is returned without reading
+    the file.
+
+    :param file_path: Path to the file.
+    :return: The hexadecimal fingerprint, or an error message if the file does not exist.
+    """
+    try:
+        size, mtime_ns = file_signature(file_path)
+    except FileNotFoundError:
+        return f"Error: File not found at {file_path}"
+
+    file_key = os.path.abspath(file_path)
+
+    # Fast path: unchanged size and modification time
+    for records in (computed_fingerprints, fingerprint_records):
+        record = records.get(file_key)
+        if record and record["size"] == size and record["mtime_ns"] == mtime_ns:
+            computed_fingerprints[file_key] = record
+            return record["fingerprint"]
+
+    fingerprint = compute_file_fingerprint(file_path)
+    computed_fingerprints[file_key] = {"size": size, "mtime_ns": mtime_ns, "fingerprint": fingerprint}
+
+    return fingerprint
+
+
+def load_input_fingerprints(output_directory):
+    """
+    Loads the fingerprints of the input files of the previous runs of the project. A missing or corrupted file gives
+    no fingerprint.
+
+    :param output_directory: The project output directory.
+    :return: The dictionary of the recorded fingerprints.
+    """
+    global fingerprint_records, computed_fingerprints
+
+    fingerprint_records = {}
+    computed_fingerprints = {}
+
+    fingerprints_path = os.path.join(output_directory, FINGERPRINTS_FILENAME)
+    if os.path.isfile(fingerprints_path):
+        try:
+            with open(fingerprints_path, 'r') as f:
+                fingerprint_records = json.load(f)
+        except (OSError, ValueError):
+            fingerprint_records = {}
+
+    return fingerprint_records
+
+
+def filter_unchanged_inputs(input_path):
+    """
+    Splits the input files between the files to process and the files whose content fingerprint matches the one
+    recorded by a previous successful run (unchanged files, all their spectra were already processed).
+
+    :param input_path: The list of input file paths.
+    :return: A tuple (files to process, unchanged files).
+    """
+    files_to_process = []
+    unchanged_files = []
+
+    for files in input_path:
+        record = fingerprint_records.get(os.path.abspath(files))
+
+        if record and os.path.isfile(files) and generate_file_hash(files) == record["fingerprint"]:
+            unchanged_files.append(files)
+        else:
+            files_to_process.append(files)
+
+    return files_to_process, unchanged_files
+
+
+def save_input_fingerprints(output_directory, input_path):
+    """
+    Records the fingerprints of the input files successfully processed by this run, merged with the fingerprints of
+    the previous runs.
+
+    :param output_directory: The project output directory.
+    :param input_path: The list of the input file paths processed by this run.
+    :return: None
+    """
+    for files in input_path:
+        if os.path.isfile(files):
+            # Computed during parsing in most cases (fast path)
+            generate_file_hash(files)
+
+            file_key = os.path.abspath(files)
+            fingerprint_records[file_key] = computed_fingerprints[file_key]
+
+    fingerprints_path = os.path.join(output_directory, FINGERPRINTS_FILENAME)
+    temporary_path = fingerprints_path + ".tmp"
+
+    # Write to a temporary file first so that an interrupted run never leaves a truncated file
+    with open(temporary_path, 'w') as f:
+        json.dump(fingerprint_records, f, ensure_ascii=False, indent=4)
+    os.replace(temporary_path, fingerprints_path)
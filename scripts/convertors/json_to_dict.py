@@ -1,6 +1,6 @@
 from scripts.calculate_maximized_chunk_size import *
+from scripts.executor import *
 from scripts.convertors.keys_convertor import *
-import concurrent.futures
 import scripts.globals_vars
 import re
 
@@ -156,7 +156,6 @@ def json_to_dict_processing(FINAL_JSON, progress_callback=None, total_items_call
     :param item_type_callback: A function to specify the type of items processed (optional).
     :return: None
     """
-    start = 0
     end = len(FINAL_JSON)
 
     # Setting total items via callback if provided
@@ -171,31 +170,12 @@ def json_to_dict_processing(FINAL_JSON, progress_callback=None, total_items_call
     if item_type_callback:
         item_type_callback("spectra")
 
-    # Variable to track progress
-    processed_items = 0
+    # Process all the spectra with the long-lived pool of the shared execution engine (process / thread / serial),
+    # the progress is reported as the sub-chunks complete
+    FINAL_JSON = executor_map(json_to_dict, FINAL_JSON, progress_callback=progress_callback)
 
-    # Calculate chunk size once
-    chunk_size = calculate_maximized_chunk_size(data_list=FINAL_JSON)
-
-    # Process the data in chunks
-    while start < end:
-        # Use ThreadPoolExecutor to process the chunk
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            FINAL_JSON[start:start + chunk_size] = list(
-                executor.map(json_to_dict, FINAL_JSON[start:start + chunk_size]))
-
-        # Filter out None results
-        FINAL_JSON[start:start + chunk_size] = [
-            item for item in FINAL_JSON[start:start + chunk_size] if item is not None
-        ]
-
-        # Update progress
-        processed_items += min(chunk_size, end - start)  # Avoid exceeding total size
-        if progress_callback:
-            progress_callback(processed_items)
-
-        # Move to the next chunk
-        start += chunk_size
+    # Filter out None results
+    FINAL_JSON = [item for item in FINAL_JSON if item is not None]
 
     return FINAL_JSON
 
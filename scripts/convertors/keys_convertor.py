@@ -1,3 +1,4 @@
+from scripts.spectrum_record import *
 import pandas as pd
 import scripts.globals_vars
 import os
@@ -6,21 +7,26 @@ import os
 def convert_keys(metadata_dict):
     """
     Convert keys in metadata_dict based on the provided keys_dict and keys_list.
-    Dictionaries are a built-in data type in Python used to store collections of items that are mapped to keys.
+
+    The conversion uses the precomputed keys_alias_table (lower case synonym -> index of its key in keys_list): each
+    value is written straight to the slot of its key, and the values are packed in a Spectrum record.
 
     :param metadata_dict: A dictionary containing metadata information.
 
-    :return: A dictionary with converted keys based on the predefined keys_dict and keys_list.
+    :return: A Spectrum record with the fields of keys_list, the keys missing from the metadata are "".
     """
-    # Creating a dictionary comprehension that converts all keys from metadata to lower case
-    # and matches them with the keys available in keys_dict and keys_list.
-    # The output is a dictionary where the keys are mapped from keys_dict and the values come from metadata_dict.
-    converted = {scripts.globals_vars.keys_dict[key.lower()]: val for key, val in metadata_dict.items() if key.lower() in scripts.globals_vars.keys_dict and scripts.globals_vars.keys_dict[key.lower()] in scripts.globals_vars.keys_list}
-    del metadata_dict
+    keys_alias_table = scripts.globals_vars.keys_alias_table
 
-    # After initial conversion, there might still be some keys from keys_list that are not in the converted dictionary.
-    # This line adds those missing keys to the converted dictionary with an empty string ("") as their value.
-    converted.update({key: "" for key in scripts.globals_vars.keys_list if key not in converted})
+    # Fixed layout, one slot per key of keys_list
+    values = [""] * len(scripts.globals_vars.keys_list)
+
+    # Each known key is lowered once and mapped straight to its slot. When several synonyms of the same key are
+    # present, the last one wins.
+    for key, val in metadata_dict.items():
+        index = keys_alias_table.get(key.lower())
+        if index is not None:
+            values[index] = val
+    del metadata_dict
 
-    # Returning the result that is a dictionary with matching and new keys.
-    return converted
+    # Returning the result that is a record with matching and new keys.
+    return Spectrum(*values)
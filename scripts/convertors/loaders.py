@@ -1,29 +1,242 @@
-import hashlib
+from scripts.convertors.file_fingerprint import *
+from scripts.GUI.utils.global_vars import parameters_dict
+from scripts.executor import *
+import scripts.globals_vars
+import itertools
 import ijson
 import json
+import mmap
+import io
 import os
 import re
 
+try:
+    import orjson
+except ImportError:
+    # orjson is optional, the standard json module decodes the NDJSON files without it
+    orjson = None
 
-def generate_file_hash(file_path):
+# Default size of the byte ranges (shards) a large MSP or MGF file is split into to be loaded by several worker
+# processes, in MB (parameters_dict["file_shard_size_mb"], 0 disables the sharding)
+DEFAULT_FILE_SHARD_SIZE_MB = 64
+
+
+# Size of the blocks of lines read from an NDJSON (line-delimited JSON) file, in bytes
+NDJSON_BLOCK_SIZE = 1024 * 1024
+
+# Number of bytes read at the start of a JSON file to detect its format, the first line of an NDJSON file must fit in it
+JSON_SNIFF_SIZE = 1024 * 1024
+
+# ijson backends from the fastest to the slowest, the first one available is used to read the JSON arrays
+IJSON_BACKENDS = ("yajl2_c", "yajl2_cffi", "yajl2", "python")
+
+
+def select_ijson_backend():
     """
-    Gets the size of a file in bytes, converts it to a string,
-    and returns the SHA-256 hash of that string.
+    Returns the fastest ijson backend available (IJSON_BACKENDS), instead of the one ijson happens to load by
+    default.
+
+    :return: The ijson backend module.
     """
-    try:
-        # Get the size of the file in bytes
-        file_size = os.path.getsize(file_path)
+    for backend_name in IJSON_BACKENDS:
+        try:
+            return ijson.get_backend(backend_name)
+        except ImportError:
+            # The C library (or cffi) of this backend is not installed
+            continue
+
+    return ijson
+
+
+global ijson_backend
+# ijson backend used to read the JSON arrays, selected once at import
+ijson_backend = select_ijson_backend()
+
+
+def msp_record_to_string(record, header):
+    """
+    Convert the raw bytes of one MSP record into the spectrum string expected by the MSP parser.
+
+    :param record: The bytes of a single MSP record (everything between two blank lines).
+    :param header: The "FILENAME: ...\nFILEHASH: ...\n" header prepended to each spectrum.
+    :return: The spectrum string, or None if the record only contains whitespace.
+    """
+    # Decode the record and strip every line, exactly as the line-by-line reader did
+    lines = [line.strip() for line in record.decode("UTF-8").split("\n")]
+    lines = [line for line in lines if line]
+
+    # Ignore records made only of whitespace (e.g. several blank lines at the end of the file)
+    if not lines:
+        return None
+
+    # FILENAME and FILEHASH are attached directly, no regex rewrite is needed afterwards
+    return header + "\n".join(lines)
+
+
+def iter_spectrum_from_msp(msp_file_path, progress_callback=None, total_items_callback=None, prefix_callback=None, item_type_callback=None):
+    """
+    Lazily read the spectra of a given MSP (Mass Spectral Peak) file.
+
+    The file is memory-mapped and read only once: record boundaries (blank lines) are found by scanning
+    the bytes, and the progress is estimated from the byte offset (in KB) instead of pre-counting the spectra.
+
+    Arguments:
+    msp_file_path (str): The path to the MSP file.
+    progress_callback (callable, optional): A function to update the progress (KB read).
+    total_items_callback (callable, optional): A function to set the total number of KB to read.
+    prefix_callback (callable, optional): A function to update the prefix dynamically.
+    item_type_callback (callable, optional): A function to specify the type of items processed.
 
-        # Convert the file size (an integer) to a string to be hashed
-        data_to_hash = str(file_size)
+    Yields:
+    spectrum (str): Each spectrum of the file, with its FILENAME and FILEHASH already attached.
+    """
+    file_hash = generate_file_hash(msp_file_path)
 
-        # Calculate the SHA-256 hash of the size string
-        sha256_hash = hashlib.sha256(data_to_hash.encode('utf-8')).hexdigest()
+    # Get the file name and the file size
+    filename = os.path.basename(msp_file_path)
+    file_size = os.path.getsize(msp_file_path)
 
-        return sha256_hash
+    # The progress is expressed in KB so that the total stays in the range of a Qt int signal
+    total_kb = max(1, -(-file_size // 1024))
 
-    except FileNotFoundError:
-        return f"Error: File not found at {file_path}"
+    if total_items_callback:
+        total_items_callback(total_kb, 0)  # Total items = file size in KB, Completed = 0
+
+    if prefix_callback:
+        prefix_callback(f"loading [{filename}]:")
+
+    if item_type_callback:
+        item_type_callback("KB")
+
+    # An empty file cannot be memory-mapped and does not contain any spectrum
+    if file_size == 0:
+        return
+
+    header = f"FILENAME: {filename}\nFILEHASH: {file_hash}\n"
+
+    with open(msp_file_path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for spectrum, offset in iter_msp_records(mm, 0, file_size, header):
+                yield spectrum
+
+                # Estimate the progress from the current byte offset
+                if progress_callback:
+                    progress_callback(offset // 1024)
+
+    if progress_callback:
+        progress_callback(total_kb)
+
+
+def iter_msp_records(mm, start, end, header):
+    """
+    Yields the spectra of the MSP records found in a byte range of a memory-mapped MSP file. The range must start at
+    the beginning of a record and end at the end of a record (see find_msp_record_end).
+
+    :param mm: The memory-mapped MSP file.
+    :param start: The offset of the first byte of the range.
+    :param end: The offset following the last byte of the range.
+    :param header: The "FILENAME: ...\nFILEHASH: ...\n" header prepended to each spectrum.
+    :return: A generator yielding tuples (spectrum string, offset of the end of its record).
+    """
+    # Each separator match is a run of blank lines ending the current record
+    for separator in scripts.globals_vars.msp_record_separator_pattern.finditer(mm, start, end):
+        spectrum = msp_record_to_string(mm[start:separator.start()], header)
+        start = separator.end()
+
+        if spectrum:
+            yield spectrum, start
+
+    # The last record is not necessarily followed by a blank line
+    spectrum = msp_record_to_string(mm[start:end], header)
+    if spectrum:
+        yield spectrum, end
+
+
+def find_msp_record_end(mm, position):
+    """
+    Returns the offset of the end of the first MSP record boundary (run of blank lines) found at or after position.
+    The sequential scan of the file finds the same boundary, as the blank lines are matched greedily.
+
+    :param mm: The memory-mapped MSP file.
+    :param position: The offset to search from.
+    :return: The offset following the blank lines, or the file size if there is no boundary after position.
+    """
+    separator = scripts.globals_vars.msp_record_separator_pattern.search(mm, position)
+
+    return separator.end() if separator else len(mm)
+
+
+def find_mgf_record_end(mm, position):
+    """
+    Returns the offset following the first "END IONS" line found at or after position, the boundary between two MGF
+    records. Lines are delimited like in a text mode file (\n, \r or \r\n).
+
+    :param mm: The memory-mapped MGF file.
+    :param position: The offset to search from.
+    :return: The offset of the start of the next line, or the file size if there is no boundary after position.
+    """
+    while True:
+        position = mm.find(b"END IONS", position)
+        if position < 0:
+            return len(mm)
+
+        # Boundaries of the line containing the match
+        line_start = max(mm.rfind(b"\n", 0, position), mm.rfind(b"\r", 0, position)) + 1
+        line_ends = [offset for offset in (mm.find(b"\n", position), mm.find(b"\r", position)) if offset >= 0]
+        line_end = min(line_ends) if line_ends else len(mm)
+
+        if mm[line_start:line_end].decode("UTF-8", errors="replace").strip() == "END IONS":
+            # Skip the line terminator, "\r\n" counts as a single one
+            if mm[line_end:line_end + 2] == b"\r\n":
+                return line_end + 2
+            return min(line_end + 1, len(mm))
+
+        position = line_end
+
+
+def get_file_shards(file_path, find_record_end):
+    """
+    Splits a file into byte ranges (shards) of about parameters_dict["file_shard_size_mb"] MB aligned to record
+    boundaries, to be loaded by the worker processes. Files are only sharded in process mode (the loaders are CPU
+    bound and would hold the GIL in threads) and when they are larger than one shard.
+
+    :param file_path: Path to the file.
+    :param find_record_end: A function (memory-mapped file, offset) -> offset of the next record boundary.
+    :return: The list of the (start, end) byte ranges, or an empty list if the file must be loaded by one reader.
+    """
+    shard_size = int(float(parameters_dict.get("file_shard_size_mb", DEFAULT_FILE_SHARD_SIZE_MB)) * 1024 * 1024)
+    file_size = os.path.getsize(file_path)
+
+    if shard_size <= 0 or file_size <= shard_size or get_execution_mode() != "process":
+        return []
+
+    boundaries = [0]
+
+    with open(file_path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # Move each theoretical boundary to the end of the next record
+            for target in range(shard_size, file_size, shard_size):
+                if target > boundaries[-1]:
+                    boundaries.append(find_record_end(mm, target))
+
+    if boundaries[-1] != file_size:
+        boundaries.append(file_size)
+
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def load_msp_shard(shard):
+    """
+    Loads the spectra of one shard of an MSP file, in a worker process.
+
+    :param shard: A tuple (MSP file path, start offset, end offset, FILENAME/FILEHASH header).
+    :return: The list of the spectrum strings of the shard, in file order.
+    """
+    msp_file_path, start, end, header = shard
+
+    with open(msp_file_path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return [spectrum for spectrum, offset in iter_msp_records(mm, start, end, header)]
 
 
 def load_spectrum_list_from_msp(msp_file_path, progress_callback=None, total_items_callback=None, prefix_callback=None, item_type_callback=None):
@@ -32,83 +245,53 @@ def load_spectrum_list_from_msp(msp_file_path, progress_callback=None, total_ite
 
     Arguments:
     msp_file_path (str): The path to the MSP file.
-    progress_callback (callable, optional): A function to update the progress percentage.
-    total_items_callback (callable, optional): A function to set the total number of spectra (e.g., initialize a progress bar).
+    progress_callback (callable, optional): A function to update the progress (KB read).
+    total_items_callback (callable, optional): A function to set the total number of KB to read.
     prefix_callback (callable, optional): A function to update the prefix dynamically.
+    item_type_callback (callable, optional): A function to specify the type of items processed.
 
     Returns:
     spectrum_list (List[str]): The list of spectra read from the file, where each spectrum is represented as a string.
     """
+    shards = get_file_shards(msp_file_path, find_msp_record_end)
+
+    # Small files are read by a single reader
+    if not shards:
+        return list(iter_spectrum_from_msp(msp_file_path, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback))
+
     file_hash = generate_file_hash(msp_file_path)
+    filename = os.path.basename(msp_file_path)
+    header = f"FILENAME: {filename}\nFILEHASH: {file_hash}\n"
 
-    # Étape 1 : Compter le nombre de spectres
-    with open(msp_file_path, 'r', encoding="UTF-8") as file:
-        # Compter les spectres (lignes vides)
-        num_spectra = sum(1 for line in file if line.strip() == '')
-        file.seek(0)  # Remettre le curseur au début
+    # The progress is expressed in KB, estimated from the number of shards loaded
+    total_kb = max(1, -(-shards[-1][1] // 1024))
 
-    # Étape 2 : Exécuter le callback pour initialiser les totaux si défini
     if total_items_callback:
-        total_items_callback(num_spectra, 0)  # Total items = num_spectra, Completed = 0
+        total_items_callback(total_kb, 0)
 
-    # Mise à jour dynamique avec le préfixe si défini
     if prefix_callback:
-        prefix_callback(f"loading [{os.path.basename(msp_file_path)}]:")
+        prefix_callback(f"loading [{filename}]:")
 
     if item_type_callback:
-        item_type_callback("spectra")
-
-    # Étape 3 : Obtenir le nom du fichier
-    filename = os.path.basename(msp_file_path)
+        item_type_callback("KB")
 
-    # Étape 4 : Initialiser une liste pour stocker les spectres
-    spectrum_list = []
-
-    # Étape 5 : Initialiser un buffer pour contenir temporairement les données
-    buffer = [f"FILENAME: {filename}\n"]  # initialisation du buffer avec le nom du fichier
-    processed_spectra = 0
-
-    # Étape 6 : Ouvrir le fichier et lire ligne par ligne
-    with open(msp_file_path, 'r', encoding="UTF-8") as file:
-        for line in file:
-            if line.strip() == '':  # Fin d'un spectre
-                if buffer and len(buffer) > 1:  # Vérifier que le buffer contient des données pertinentes
-                    spectrum = '\n'.join(buffer)
-                    spectrum = re.sub(
-                        r"FILENAME: .*\n",
-                        f"FILENAME: {os.path.basename(msp_file_path)}\nFILEHASH: {file_hash}\n",
-                        spectrum,
-                        flags=re.IGNORECASE
-                    )
-                    spectrum_list.append(spectrum)
-                    buffer = [f"FILENAME: {os.path.basename(msp_file_path)}\n"]  # Réinitialisation du buffer
-
-                    # Mise à jour des progrès
-                    processed_spectra += 1
-                    if progress_callback:
-                        progress_callback(processed_spectra)
-            else:
-                buffer.append(line.strip())
-
-        # Étape 4 : Vérifier le dernier spectre resté dans le buffer
-        if buffer and len(buffer) > 1:  # Ajouter le contenu du dernier spectre non traité
-            spectrum = '\n'.join(buffer)
-            spectrum_list.append(spectrum)
+    # The shards are loaded in parallel, their spectra are concatenated back in file order
+    shard_spectra = executor_map(load_msp_shard, [(msp_file_path, start, end, header) for start, end in shards],
+                                 progress_callback=(lambda loaded_shards: progress_callback(loaded_shards * total_kb // len(shards))) if progress_callback else None)
 
-    # Retourne la liste des spectres extraits
-    return spectrum_list
+    return list(itertools.chain.from_iterable(shard_spectra))
 
 
-def load_spectrum_list_from_mgf(mgf_file_path, progress_callback=None, total_items_callback=None, prefix_callback=None,
-                                item_type_callback=None):
+def iter_spectrum_from_mgf(mgf_file_path, progress_callback=None, total_items_callback=None, prefix_callback=None,
+                           item_type_callback=None):
     """
-    Load a spectrum list from a given MGF (Mascot Generic Format) file, with support for progress callbacks.
+    Lazily yield the spectra of a given MGF (Mascot Generic Format) file, with support for progress callbacks.
     :param mgf_file_path: The path to the MGF file.
     :param progress_callback: A function to update the progress (optional).
     :param total_items_callback: A function to set the total number of items (optional).
     :param prefix_callback: A function to dynamically set the prefix for the operation (optional).
     :param item_type_callback: A function to specify the type of items processed (optional).
-    :return: The list of spectra read from the file. Each spectrum is represented as a string.
+    :return: A generator yielding the spectra read from the file. Each spectrum is represented as a string.
     """
     file_hash = generate_file_hash(mgf_file_path)
 
@@ -130,38 +313,149 @@ def load_spectrum_list_from_mgf(mgf_file_path, progress_callback=None, total_ite
     if item_type_callback:
         item_type_callback("spectra")
 
-    # Initialize variables for parsing
-    spectrum_list = []
-    buffer = [f"FILENAME={filename}"]
     processed_items = 0
 
     with open(mgf_file_path, 'r', encoding="UTF-8") as file:
-        for line in file:
-            # Detect end of a spectrum
-            if line.strip() == 'END IONS':
-                if buffer:
-                    # Process the buffer into a single spectrum string
-                    spectrum = '\n'.join(buffer)
-                    spectrum = re.sub(r"FILENAME=.*\n", f"FILENAME={filename}\nFILEHASH={file_hash}\n", spectrum, flags=re.IGNORECASE)
-                    spectrum_list.append(spectrum)
-                    buffer = [f"FILENAME={filename}"]  # Reset the buffer for the next spectrum
-
-                # Update progress via callback if provided
-                processed_items += 1
-                if progress_callback:
-                    progress_callback(processed_items)
-            else:
-                # Accumulate lines in the buffer
-                buffer.append(line.strip())
+        for spectrum in iter_mgf_records(file, filename, file_hash):
+            yield spectrum
 
-    # Return the list of spectra
-    return spectrum_list
+            # Update progress via callback if provided
+            processed_items += 1
+            if progress_callback:
+                progress_callback(processed_items)
+
+
+def iter_mgf_records(lines, filename, file_hash):
+    """
+    Yields the spectra of the MGF records read from lines of an MGF file. The lines following the last "END IONS"
+    line are ignored.
+
+    :param lines: An iterable of the lines of an MGF file, or of a shard of it starting at the beginning of a record.
+    :param filename: The name of the MGF file.
+    :param file_hash: The fingerprint of the MGF file.
+    :return: A generator yielding the spectra, each spectrum is represented as a string.
+    """
+    # Initialize variables for parsing
+    buffer = [f"FILENAME={filename}"]
+
+    for line in lines:
+        # Detect end of a spectrum
+        if line.strip() == 'END IONS':
+            # Process the buffer into a single spectrum string
+            spectrum = '\n'.join(buffer)
+            spectrum = re.sub(r"FILENAME=.*\n", f"FILENAME={filename}\nFILEHASH={file_hash}\n", spectrum, flags=re.IGNORECASE)
+            yield spectrum
+            buffer = [f"FILENAME={filename}"]  # Reset the buffer for the next spectrum
+        else:
+            # Accumulate lines in the buffer
+            buffer.append(line.strip())
+
+
+def load_mgf_shard(shard):
+    """
+    Loads the spectra of one shard of an MGF file, in a worker process.
+
+    :param shard: A tuple (MGF file path, start offset, end offset, file name, file fingerprint).
+    :return: The list of the spectrum strings of the shard, in file order.
+    """
+    mgf_file_path, start, end, filename, file_hash = shard
+
+    with open(mgf_file_path, 'rb') as file:
+        file.seek(start)
+        shard_bytes = file.read(end - start)
+
+    # Decode the lines like a text mode file (universal newlines)
+    with io.TextIOWrapper(io.BytesIO(shard_bytes), encoding="UTF-8") as lines:
+        return list(iter_mgf_records(lines, filename, file_hash))
+
+
+def load_spectrum_list_from_mgf(mgf_file_path, progress_callback=None, total_items_callback=None, prefix_callback=None,
+                                item_type_callback=None):
+    """
+    Load a spectrum list from a given MGF (Mascot Generic Format) file, with support for progress callbacks.
+    :param mgf_file_path: The path to the MGF file.
+    :param progress_callback: A function to update the progress (optional).
+    :param total_items_callback: A function to set the total number of items (optional).
+    :param prefix_callback: A function to dynamically set the prefix for the operation (optional).
+    :param item_type_callback: A function to specify the type of items processed (optional).
+    :return: The list of spectra read from the file. Each spectrum is represented as a string.
+    """
+    shards = get_file_shards(mgf_file_path, find_mgf_record_end)
+
+    # Small files are read by a single reader: materialize the lazy reader into a list
+    if not shards:
+        return list(iter_spectrum_from_mgf(mgf_file_path, progress_callback, total_items_callback, prefix_callback,
+                                           item_type_callback))
+
+    file_hash = generate_file_hash(mgf_file_path)
+    filename = os.path.basename(mgf_file_path)
+
+    # The progress is expressed in shards, the spectra are not counted upfront
+    if total_items_callback:
+        total_items_callback(len(shards), 0)
+
+    if prefix_callback:
+        prefix_callback(f"Loading [{filename}]:")
+
+    if item_type_callback:
+        item_type_callback("shards")
+
+    # The shards are loaded in parallel, their spectra are concatenated back in file order
+    shard_spectra = executor_map(load_mgf_shard, [(mgf_file_path, start, end, filename, file_hash) for start, end in shards],
+                                 progress_callback=progress_callback)
+
+    return list(itertools.chain.from_iterable(shard_spectra))
+
+
+def sniff_json_format(json_file_path):
+    """
+    Detects the format of a JSON file from its first bytes (at most JSON_SNIFF_SIZE bytes after the leading whitespace):
+    a JSON array starts with "[", a file whose first line is a complete JSON value is read as NDJSON (one JSON object
+    per line). Any other file (a pretty-printed JSON object, or a first line longer than JSON_SNIFF_SIZE) is read by
+    the JSON array loader, like before the detection.
+
+    :param json_file_path: Path to the JSON file.
+    :return: "array" or "ndjson".
+    """
+    with open(json_file_path, 'rb') as file:
+        first_bytes = file.read(JSON_SNIFF_SIZE)
+
+        # Skip the UTF-8 byte order mark and the leading whitespace (possibly longer than the first read)
+        first_bytes = first_bytes.removeprefix(b"\xef\xbb\xbf").lstrip()
+        while not first_bytes:
+            block = file.read(JSON_SNIFF_SIZE)
+            if not block:
+                break
+            first_bytes = block.lstrip()
+
+        # Whether the first bytes run to the end of the file
+        end_of_file = not file.read(1)
+
+    # An empty file has no spectrum, the NDJSON loader reads it without error
+    if not first_bytes:
+        return "ndjson"
+
+    if first_bytes.startswith(b"["):
+        return "array"
+
+    # The first line must end within the first bytes (or the file), a longer line is not decoded
+    newline = first_bytes.find(b"\n")
+    if newline == -1 and not end_of_file:
+        return "array"
+
+    try:
+        decode_ndjson_line(first_bytes[:newline] if newline != -1 else first_bytes)
+    except ValueError:
+        return "array"
+
+    return "ndjson"
 
 
 def load_spectrum_list_json(json_file_path, progress_callback=None, total_items_callback=None, prefix_callback=None,
                             item_type_callback=None):
     """
-    This function loads a list of spectra from a given JSON file, with support for progress callbacks based on the number of items.
+    This function loads a list of spectra from a given JSON file (JSON array), with support for progress callbacks
+    based on the byte position in the file.
 
     :param json_file_path: A string representing the path to the JSON file containing the spectra.
     :param progress_callback: A function to update the progress (optional).
@@ -175,30 +469,28 @@ def load_spectrum_list_json(json_file_path, progress_callback=None, total_items_
     # Extract the filename from the given path
     filename = os.path.basename(json_file_path)
 
+    # The progress is expressed in KB read, the items are not counted upfront
+    total_kb = max(1, -(-os.path.getsize(json_file_path) // 1024))
+
+    if total_items_callback:
+        total_items_callback(total_kb, 0)  # total = file size in KB, completed = 0
+
     # Dynamically update the prefix if provided
     if prefix_callback:
         prefix_callback(f"loading [{filename}]:")
 
     # Update the item type being processed if provided
     if item_type_callback:
-        item_type_callback("spectra")
-
-    # Open the JSON file for reading
-    with open(json_file_path, 'r', encoding="UTF-8") as file:
-        # Use ijson to count the total number of items upfront
-        total_items = sum(1 for _ in ijson.items(file, 'item'))
+        item_type_callback("KB")
 
-    # Re-set the total number of items via the total_items_callback
-    if total_items_callback:
-        total_items_callback(total_items, 0)  # total = total_items, completed = 0
+    # Open the JSON file for reading, ijson decodes the UTF-8 bytes itself
+    with open(json_file_path, 'rb') as file:
+        # Skip the UTF-8 byte order mark, ijson does not accept it
+        if file.read(3) != b"\xef\xbb\xbf":
+            file.seek(0)
 
-    # Re-open the JSON file to retrieve items using a generator
-    with open(json_file_path, 'r', encoding="UTF-8") as file:
-        # Create a generator to yield each 'item' in the JSON file using ijson
-        spectra = ijson.items(file, 'item')
-
-        # Progress variable to track the number of processed items
-        processed_items = 0
+        # Create a generator to yield each 'item' in the JSON file using the selected ijson backend
+        spectra = ijson_backend.items(file, 'item')
 
         # Loop over each spectrum in the file
         for spectrum in spectra:
@@ -206,19 +498,64 @@ def load_spectrum_list_json(json_file_path, progress_callback=None, total_items_
             spectrum["filename"] = filename
             spectrum["filehash"] = file_hash
 
-            # Update progress if progress_callback is provided
-            processed_items += 1
+            # Estimate the progress from the position in the file
             if progress_callback:
-                progress_callback(processed_items)
+                progress_callback(file.tell() // 1024)
 
             # Yield the current spectrum, allowing the function to be used as a generator
             yield spectrum
 
+    if progress_callback:
+        progress_callback(total_kb)
+
+
+def decode_ndjson_line(line):
+    """
+    Decodes one line of an NDJSON file, with orjson when it is installed. The lines orjson rejects but the json
+    module accepts (NaN, integers above 64 bits) are decoded by the json module.
+
+    :param line: The bytes of the line.
+    :return: The decoded JSON value.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            pass
+
+    return json.loads(line)
+
+
+def decode_ndjson_block(block_task):
+    """
+    Decodes a block of complete lines of an NDJSON file, ignoring the blank lines.
+
+    :param block_task: A tuple (bytes of the block, file name, file fingerprint).
+    :return: The list of the spectra (dictionaries) of the block, with their filename and filehash.
+    """
+    block, filename, file_hash = block_task
+
+    spectra = []
+    for line in block.splitlines():
+        if line.strip():
+            spectrum = decode_ndjson_line(line)
+
+            # Add the original file name to the spectrum
+            spectrum["filename"] = filename
+            spectrum["filehash"] = file_hash
+
+            spectra.append(spectrum)
+
+    return spectra
+
 
 def load_spectrum_list_json_2(json_file_path, progress_callback=None, total_items_callback=None, prefix_callback=None, item_type_callback=None):
     """
-    This function loads a list of spectra from a given JSON file, with progress management
-    based on the number of items using callbacks.
+    This function loads a list of spectra from a given NDJSON (line-delimited JSON) file, with progress management
+    based on the byte position in the file using callbacks.
+
+    The file is read in blocks of complete lines (NDJSON_BLOCK_SIZE bytes). In process mode, the blocks read
+    together (one per core) are decoded in parallel by the worker processes. The spectra are yielded in file order.
 
     :param json_file_path: A string representing the path to the JSON file containing the spectra.
     :param progress_callback: A function to update the progress (optional).
@@ -232,40 +569,49 @@ def load_spectrum_list_json_2(json_file_path, progress_callback=None, total_item
     # Extract the file name from the given path
     filename = os.path.basename(json_file_path)
 
+    # The progress is expressed in KB read, the lines are not counted upfront
+    total_kb = max(1, -(-os.path.getsize(json_file_path) // 1024))
+
+    # Set the total via `total_items_callback` if provided
+    if total_items_callback:
+        total_items_callback(total_kb, 0)  # total = file size in KB, completed = 0
+
     # Set the dynamic prefix via callback if provided
     if prefix_callback:
         prefix_callback(f"loading [{filename}]:")
 
     # Specify the type of items processed via callback
     if item_type_callback:
-        item_type_callback("spectra")
-
-    # Compute the total number of spectra in the file to set `total_items`
-    with open(json_file_path, 'r', encoding="UTF-8") as file:
-        total_items = sum(1 for line in file if line.strip())  # Count non-empty lines
-
-    # Set the total via `total_items_callback` if provided
-    if total_items_callback:
-        total_items_callback(total_items, 0)  # total = total_items, completed = 0
-
-    # Reset the file to start reading items
-    with open(json_file_path, 'r', encoding="UTF-8") as file:
-        processed_items = 0  # Variable to track the number of processed items
-
-        # Read line by line
-        for line in file:
-            if line.strip():  # Check that the line is not empty
-                # Parse the JSON object from the current line
-                spectrum = json.loads(line.strip())
+        item_type_callback("KB")
+
+    # Decode the blocks in the worker processes only in process mode, threads would hold the GIL
+    parallel = get_execution_mode() == "process"
+    blocks_per_read = max(1, scripts.globals_vars.cpu_count or 1) if parallel else 1
+
+    with open(json_file_path, 'rb') as file:
+        while True:
+            # Read the next blocks, each one completed up to the end of its last line
+            blocks = []
+            for _ in range(blocks_per_read):
+                block = file.read(NDJSON_BLOCK_SIZE)
+                if not block:
+                    break
+                blocks.append((block + file.readline(), filename, file_hash))
+
+            if not blocks:
+                break
+
+            if len(blocks) > 1:
+                decoded_blocks = executor_map(decode_ndjson_block, blocks)
+            else:
+                decoded_blocks = [decode_ndjson_block(blocks[0])]
 
-                # Add the original file name to the spectrum
-                spectrum["filename"] = filename
-                spectrum["filehash"] = file_hash
+            for spectra in decoded_blocks:
+                yield from spectra
 
-                # Update progress via `progress_callback` if defined
-                processed_items += 1
-                if progress_callback:
-                    progress_callback(processed_items)
+            # Estimate the progress from the position in the file
+            if progress_callback:
+                progress_callback(file.tell() // 1024)
 
-                # Yield the current spectrum
-                yield spectrum
\ No newline at end of file
+    if progress_callback:
+        progress_callback(total_kb)
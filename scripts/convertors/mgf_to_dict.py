@@ -1,6 +1,6 @@
 from scripts.calculate_maximized_chunk_size import *
+from scripts.executor import *
 from scripts.convertors.keys_convertor import *
-import concurrent.futures
 import scripts.globals_vars
 import re
 
@@ -149,7 +149,6 @@ def mgf_to_dict_processing(FINAL_MGF, progress_callback=None, total_items_callba
     :param item_type_callback: A function to specify the type of items processed (optional).
     :return: A list of JSON-formatted spectrums.
     """
-    start = 0
     end = len(FINAL_MGF)
 
     # Set total items via callback if provided
@@ -164,27 +163,11 @@ def mgf_to_dict_processing(FINAL_MGF, progress_callback=None, total_items_callba
     if item_type_callback:
         item_type_callback("spectra")
 
-    # Variable to track progress
-    processed_items = 0
+    # Process all the spectra with the long-lived pool of the shared execution engine (process / thread / serial),
+    # the progress is reported as the sub-chunks complete
+    FINAL_MGF = executor_map(mgf_to_dict, FINAL_MGF, progress_callback=progress_callback)
 
-    # Calculate the chunk size once, outside the loop
-    chunk_size = calculate_maximized_chunk_size(data_list=FINAL_MGF)
-
-    # Process the data in chunks
-    while start < end:
-        # Use ThreadPoolExecutor to process the chunk
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            FINAL_MGF[start:start + chunk_size] = list(executor.map(mgf_to_dict, FINAL_MGF[start:start + chunk_size]))
-
-        # Filter out None results
-        FINAL_MGF[start:start + chunk_size] = [item for item in FINAL_MGF[start:start + chunk_size] if item is not None]
-
-        # Update progress via callback if provided
-        processed_items += min(chunk_size, end - start)  # Ensure not to exceed the total size
-        if progress_callback:
-            progress_callback(processed_items)
-
-        # Move to the next chunk
-        start += chunk_size
+    # Filter out None results
+    FINAL_MGF = [item for item in FINAL_MGF if item is not None]
 
     return FINAL_MGF
@@ -1,31 +1,45 @@
 from scripts.calculate_maximized_chunk_size import *
+from scripts.executor import *
 from scripts.convertors.keys_convertor import *
-import concurrent.futures
 import scripts.globals_vars
+import numpy as np
 import re
 
 
 def extract_metadata_and_peak_list(spectrum):
     """
-    Extracts the metadata and peak list from the given spectrum.
+    Extracts the metadata and peak list from the given spectrum, in one pass and without backtracking. The result is
+    the same as the groups 1 and 2 of metadata_peak_list_split_pattern_msp: the metadata ends with the line of the
+    last ':' followed by a newline, and the peak list is made of the peak lines following it.
     :param spectrum: The spectrum from which to extract the metadata and peak list.
     :type spectrum: str
-    :return: The metadata and peak list extracted from the spectrum. If the regex pattern does not match, both metadata and peak list will be None.
+    :return: The metadata and peak list extracted from the spectrum. If there is no metadata line, both metadata and peak list will be None.
     :rtype: tuple(str, str)
     """
+    # The metadata ends at the newline following the last ':' which is followed by a newline
+    last_newline = spectrum.rfind('\n')
+    last_colon = spectrum.rfind(':', 0, last_newline) if last_newline != -1 else -1
 
-    # Initialize the metadata and peak_list as None
-    metadata, peak_list = None, None
+    # If there is no such line, there is no metadata
+    if last_colon == -1:
+        return None, None
 
-    # Use a regex pattern to search for matches within the input spectrum
-    match = re.search(scripts.globals_vars.metadata_peak_list_split_pattern_msp, spectrum)
+    metadata_end = spectrum.find('\n', last_colon) + 1
+    metadata = spectrum[:metadata_end]
 
-    # If a match is found, assign the groups to metadata and peak_list variables
-    if match:
-        metadata, peak_list = match.group(1), match.group(2)
+    # Fast path: the rest of the spectrum is only made of "m/z intensity" lines
+    if scripts.globals_vars.simple_peak_list_pattern.fullmatch(spectrum, metadata_end):
+        return metadata, spectrum[metadata_end:]
+
+    # Otherwise, consume the peak lines one by one until the first line which is not a peak
+    position = metadata_end
+    match = scripts.globals_vars.peak_line_pattern_msp.match(spectrum, position)
+    while match:
+        position = match.end()
+        match = scripts.globals_vars.peak_line_pattern_msp.match(spectrum, position)
 
     # Return the metadata and peak_list
-    return metadata, peak_list
+    return metadata, spectrum[metadata_end:position]
 
 
 def check_for_metadata_in_comments(metadata_matches):
@@ -136,6 +150,10 @@ def peak_list_to_array(peak_list):
 
     If there are no matches found (meaning no peaks were found in the peak_list string), the function returns an empty list.
     """
+    # Fast path: only "m/z intensity" lines, all the values are converted at once
+    if scripts.globals_vars.simple_peak_list_pattern.fullmatch(peak_list):
+        return np.array(peak_list.split(), dtype=np.float64).reshape(-1, 2).tolist()
+
     peak_list = re.findall(scripts.globals_vars.peak_list_split_pattern, peak_list)  # use regex to find all peaks in the string
 
     # If peak matches found return list of lists, where inner lists are pair of floats
@@ -234,7 +252,6 @@ def msp_to_dict_processing(FINAL_MSP, progress_callback=None, total_items_callba
     :param item_type_callback: A function to specify the type of items being processed (e.g., "spectra").
     :return: List of spectra in JSON format.
     """
-    start = 0
     end = len(FINAL_MSP)
 
     # Initialize the total number of items via the callback (if defined)
@@ -249,27 +266,11 @@ def msp_to_dict_processing(FINAL_MSP, progress_callback=None, total_items_callba
     if item_type_callback:
         item_type_callback("spectra")
 
-    # Initialize the variable to track progress
-    processed_items = 0
-
-    # Calculate the chunk size once at the beginning
-    chunk_size = calculate_maximized_chunk_size(data_list=FINAL_MSP)
-
-    # Process the MSP spectra in chunks
-    while start < end:
-        # Use ThreadPoolExecutor for parallel processing
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            FINAL_MSP[start:start + chunk_size] = list(executor.map(msp_to_dict, FINAL_MSP[start:start + chunk_size]))
-
-        # Filter out None results
-        FINAL_MSP[start:start + chunk_size] = [item for item in FINAL_MSP[start:start + chunk_size] if item is not None]
-
-        # Update the progress
-        processed_items += min(chunk_size, end - start)  # Ensure the total doesn't exceed the total size
-        if progress_callback:
-            progress_callback(processed_items)
+    # Process all the spectra with the long-lived pool of the shared execution engine (process / thread / serial),
+    # the progress is reported as the sub-chunks complete
+    FINAL_MSP = executor_map(msp_to_dict, FINAL_MSP, progress_callback=progress_callback)
 
-        # Move to the next chunk
-        start += chunk_size
+    # Filter out None results
+    FINAL_MSP = [item for item in FINAL_MSP if item is not None]
 
     return FINAL_MSP
@@ -3,56 +3,100 @@ from scripts.convertors.msp_to_dict import *
 from scripts.convertors.csv_to_dict import *
 from scripts.convertors.mgf_to_dict import *
 from scripts.convertors.loaders import *
+from scripts.GUI.utils.global_vars import parameters_dict
+from scripts.executor import *
+import scripts.globals_vars
+import concurrent.futures
 import pandas as pd
-import hashlib
+import itertools
 import time
 import json
 import os
 import re
 
+# Default maximum number of input files loaded at the same time (parameters_dict["ingestion_files_in_flight"])
+DEFAULT_FILES_IN_FLIGHT = 4
 
-def generate_file_hash(file_path):
+# Number of rows read at once from a CSV file
+CSV_CHUNK_SIZE = 50000
+
+
+def get_files_in_flight():
     """
-    Gets the size of a file in bytes, converts it to a string,
-    and returns the SHA-256 hash of that string.
+    Returns the maximum number of input files loaded at the same time selected in
+    parameters_dict["ingestion_files_in_flight"] (1 loads the files one after another).
+
+    :return: The maximum number of files in flight.
     """
-    try:
-        # Get the size of the file in bytes
-        file_size = os.path.getsize(file_path)
+    return max(1, int(parameters_dict.get("ingestion_files_in_flight", DEFAULT_FILES_IN_FLIGHT)))
 
-        # Convert the file size (an integer) to a string to be hashed
-        data_to_hash = str(file_size)
 
-        # Calculate the SHA-256 hash of the size string
-        sha256_hash = hashlib.sha256(data_to_hash.encode('utf-8')).hexdigest()
+def load_files_concurrently(tasks, progress_callback=None, total_items_callback=None, prefix_callback=None,
+                            item_type_callback=None):
+    """
+    Runs per-file load tasks on the thread pool of the run, with a bounded number of files loaded at the same time
+    (get_files_in_flight()), and returns their results in the order of the tasks, whatever the order in which the
+    files complete, so that the merged spectrum lists are reproducible.
 
-        return sha256_hash
+    Threads are used even in process mode: reading the files and hashing them release the GIL, and the file
+    fingerprints computed while loading must be recorded in the parent process.
 
-    except FileNotFoundError:
-        return f"Error: File not found at {file_path}"
+    :param tasks: A list of (loader, file path) tuples. The loader is called with the file path and the callbacks.
+    :param progress_callback: A function to update the progress (optional).
+    :param total_items_callback: A function to set the total number of items (optional).
+    :param prefix_callback: A function to dynamically set the prefix for the operation (optional).
+    :param item_type_callback: A function to specify the type of items processed (optional).
+    :return: The list of the results of the loaders, in the order of tasks.
+    """
+    files_in_flight = get_files_in_flight()
 
+    # A single file, a single file in flight or the serial mode: the files are loaded one after another, with the
+    # progress of each loader
+    if len(tasks) <= 1 or files_in_flight <= 1 or get_execution_mode() == "serial":
+        return [loader(files, progress_callback=progress_callback, total_items_callback=total_items_callback,
+                       prefix_callback=prefix_callback, item_type_callback=item_type_callback)
+                for loader, files in tasks]
 
-def concatenate_MSP(msp_list, progress_callback=None, total_items_callback=None, prefix_callback=None, item_type_callback=None):
-    """
-    This function concatenates multiple MSP files into a single spectrum list.
+    pool, workers = get_pool("thread")
+    files_in_flight = min(files_in_flight, workers)
 
-    :param msp_list: A list of paths to MSP files. List structure: [file1, file2, file3, ...]
-    :return: Returns a list of spectra loaded from the MSP files.
+    # The progress is expressed in files, the loaders report nothing when they run concurrently
+    if total_items_callback:
+        total_items_callback(len(tasks), 0)
 
-    The function loads the MSP files in the order they appear in the msp_list, combining
-    them into one continuous list of spectra.
-    """
-    # Initialize empty list to store spectra
-    spectrum_list = []
+    if prefix_callback:
+        prefix_callback("Loading input files:")
 
-    # Loop over each file in the msp_list
-    for files in msp_list:
-        # The extend method appends elements from the iterable (the result of load_spectrum_list_from_msp function)
-        # to the end of the list.
-        spectrum_list.extend(load_spectrum_list_from_msp(files, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback))
+    if item_type_callback:
+        item_type_callback("files")
 
-    # Return combined list of spectra
-    return spectrum_list
+    results = [None] * len(tasks)
+    pending_tasks = iter(enumerate(tasks))
+    futures = {}
+    processed_files = 0
+
+    # Fill the window of files in flight
+    for index, (loader, files) in itertools.islice(pending_tasks, files_in_flight):
+        futures[pool.submit(loader, files)] = index
+
+    while futures:
+        done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+
+        for future in done:
+            # Place the result of the file at the position of its task
+            results[futures.pop(future)] = future.result()
+
+            processed_files += 1
+            if progress_callback:
+                progress_callback(processed_files)
+
+            # A file completed, the next one can be loaded
+            next_task = next(pending_tasks, None)
+            if next_task is not None:
+                index, (loader, files) = next_task
+                futures[pool.submit(loader, files)] = index
+
+    return results
 
 
 def detect_separator(file_path):
@@ -88,41 +132,43 @@ def detect_separator(file_path):
         return ';'
 
 
-def concatenate_csv(csv_list, progress_callback=None, total_items_callback=None, prefix_callback=None,
-                    item_type_callback=None):
+def is_known_csv_column(column):
     """
-    Concatenates multiple CSV files into a single DataFrame, with support for progress reporting via callbacks.
+    Tells whether a CSV column is kept when reading a CSV file: only the columns converted to a key of keys_list by
+    convert_keys (peak list columns included) are read, the other ones would be dropped by the conversion anyway.
 
-    :param csv_list: List of paths to CSV files to be concatenated.
-    :param progress_callback: A function to update the progress (optional).
-    :param total_items_callback: A function to set the total number of items (optional).
-    :param prefix_callback: A function to dynamically set the prefix for the operation (optional).
-    :param item_type_callback: A function to specify the type of items processed (optional).
-    :return: Concatenated DataFrame.
+    :param column: The name of the column in the CSV file.
+    :return: True if the column must be read.
     """
-    total_files = len(csv_list)
+    key = scripts.globals_vars.keys_dict.get(column.lower())
 
-    if total_items_callback:
-        total_items_callback(total_files, 0)
+    return key is not None and key in scripts.globals_vars.keys_list
 
-    if prefix_callback:
-        prefix_callback("Reading CSV files:")
 
-    if item_type_callback:
-        item_type_callback("csv_files")
+def iter_csv_chunks(file, chunk_size=None):
+    """
+    Reads a CSV file by chunks of rows into DataFrames of strings with lower case column names, adding the filename
+    and filehash columns when they are missing. Only the known columns are read (see is_known_csv_column).
 
-    df_list = []
-    processed_files = 0
+    :param file: Path to the CSV file.
+    :param chunk_size: The maximum number of rows per chunk (CSV_CHUNK_SIZE by default).
+    :return: A generator yielding the DataFrames of the chunks, in file order.
+    """
+    file_hash = generate_file_hash(file)
 
-    for file in csv_list:
-        file_hash = generate_file_hash(file)
+    # 1. Detect the separator before reading the file
+    separator = detect_separator(file)
 
-        # 1. Detect the separator before reading the file
-        separator = detect_separator(file)
+    # 2. Read the header to select the known columns by position. When there is none, all the columns are read so
+    # that each row still gives a spectrum.
+    columns = pd.read_csv(file, sep=separator, quotechar='"', encoding="UTF-8", dtype=str, nrows=0).columns
+    usecols = [position for position, column in enumerate(columns) if is_known_csv_column(column)] or None
 
-        # 2. Use the detected separator in pd.read_csv
-        df = pd.read_csv(file, sep=separator, quotechar='"', encoding="UTF-8", dtype=str)
+    # 3. Use the detected separator in pd.read_csv, the rows are read by chunks
+    chunks = pd.read_csv(file, sep=separator, quotechar='"', encoding="UTF-8", dtype=str, usecols=usecols,
+                         chunksize=chunk_size or CSV_CHUNK_SIZE)
 
+    for df in chunks:
         df.columns = df.columns.str.lower()
 
         if 'filename' not in df.columns:
@@ -131,80 +177,110 @@ def concatenate_csv(csv_list, progress_callback=None, total_items_callback=None,
         if 'filehash' not in df.columns:
             df['filehash'] = file_hash
 
-        df.columns = df.columns.str.lower()
-        df = df.astype(str)
-        df_list.append(df)
-
-        processed_files += 1
-        if progress_callback:
-            progress_callback(processed_files)
+        # The columns are already strings, only the missing values have to be converted like astype(str) does
+        yield df.fillna("nan")
 
-    df = pd.concat(df_list, ignore_index=True)
-    return df
 
+def load_spectrum_list_from_csv(file, progress_callback=None, total_items_callback=None, prefix_callback=None,
+                                item_type_callback=None):
+    """
+    Loads the spectra of a CSV file: each chunk of rows read is converted to spectrum dictionaries
+    (csv_to_dict_processing) before the next one is read, so that the whole table is never held as a DataFrame.
 
-def concatenate_JSON(json_list, progress_callback=None, total_items_callback=None, prefix_callback=None, item_type_callback=None):
+    :param file: Path to the CSV file.
+    :param progress_callback: A function to update the progress (optional).
+    :param total_items_callback: A function to set the total number of items (optional).
+    :param prefix_callback: A function to dynamically set the prefix for the operation (optional).
+    :param item_type_callback: A function to specify the type of items processed (optional).
+    :return: The list of the spectra (dictionaries with converted keys) of the file.
     """
-    This function is used to concatenate JSON files into a single list.
+    spectrum_list = []
 
-    Parameters:
-        json_list (list[str]) : A list of JSON file paths.
+    for df in iter_csv_chunks(file):
+        spectrum_list.extend(csv_to_dict_processing(df, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback))
+
+    return spectrum_list
 
-    Returns:
-        list[dict] : The concatenated list with spectrum dictionaries.
 
-    Usage:
-        The function is used when there are multiple JSON files, but the application
-        needs them in one collective list. Used mainly in file conversion or
-        preprocessing before data analysis.
+def iter_spectrum_from_json(json_file_path, progress_callback=None, total_items_callback=None, prefix_callback=None,
+                            item_type_callback=None):
     """
+    Lazily yield the spectra of a JSON file, read as a JSON array or as line-delimited JSON depending on its first
+    bytes (see sniff_json_format).
 
-    # Initialize an empty list to keep all spectrums
-    spectrum_list = []
+    :param json_file_path: Path to the JSON file.
+    :param progress_callback: A function to update the progress (optional).
+    :param total_items_callback: A function to set the total number of items (optional).
+    :param prefix_callback: A function to dynamically set the prefix for the operation (optional).
+    :param item_type_callback: A function to specify the type of items processed (optional).
+    :return: A generator yielding each spectrum (a dictionary) from the JSON file.
+    """
+    if sniff_json_format(json_file_path) == "array":
+        yield from load_spectrum_list_json(json_file_path, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
+    else:
+        yield from load_spectrum_list_json_2(json_file_path, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
 
-    # Loop over each file in the json_list
-    for files in json_list:
-        # Using extend method to add elements of individual spectrums
-        # from each file to the global spectrum_list
-        # 'load_spectrum_list_json()' is used to load list of spectrum
-        # from individual json file
-        try:
-            spectrum_list.extend(load_spectrum_list_json(files, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback))
-        except:
-            spectrum_list.extend(load_spectrum_list_json_2(files, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback))
-
-    # The final list of all spectra from all JSON files is returned
-    return spectrum_list
 
+def load_spectrum_list_from_json(json_file_path, progress_callback=None, total_items_callback=None,
+                                 prefix_callback=None, item_type_callback=None):
+    """
+    Load the list of spectra of a JSON file (JSON array or line-delimited JSON).
 
-def concatenate_MGF(mgf_list, progress_callback=None, total_items_callback=None, prefix_callback=None, item_type_callback=None):
+    :param json_file_path: Path to the JSON file.
+    :param progress_callback: A function to update the progress (optional).
+    :param total_items_callback: A function to set the total number of items (optional).
+    :param prefix_callback: A function to dynamically set the prefix for the operation (optional).
+    :param item_type_callback: A function to specify the type of items processed (optional).
+    :return: The list of spectra (dictionaries) of the file.
     """
-    Concatenates multiple MGF files into a single spectrum list.
-
-    This function is instrumental in the conversion of MGF files as it binds
-    all MGF files' data into a single list by iterating over the provided list of file paths.
-    Once each file's spectrum list has been loaded via the external function `load_spectrum_list_from_mgf()`,
-    it extends the main list `spectrum_list` with the new spectrum data from each file.
-    This way, all the spectral data from all MGF files are consolidated into one list.
-
-    :param mgf_list: A list of paths to MGF files. These are the files that the function will concatenate
-                     the spectral data from. Each item in the list should be a string representing an absolute or
-                     relative path to a MGF file.
-    :type mgf_list: list[str])
-    :return: The concatenated spectrum list. This list contains all the spectra from all MGF files provided.
-    :rtype: list[str]
+    return list(iter_spectrum_from_json(json_file_path, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback))
+
+
+def concatenate_input_files(json_list, msp_list, mgf_list, csv_list, progress_callback=None,
+                            total_items_callback=None, prefix_callback=None, item_type_callback=None):
+    """
+    Loads the input files of every format in a single window of files in flight (see load_files_concurrently), so
+    that the files of the different formats are read concurrently, then concatenates the spectra of each format in
+    the order of its file list.
+
+    :param json_list: A list of paths to JSON files.
+    :param msp_list: A list of paths to MSP files.
+    :param mgf_list: A list of paths to MGF files.
+    :param csv_list: A list of paths to CSV files.
+    :param progress_callback: A function to update the progress (optional).
+    :param total_items_callback: A function to set the total number of items (optional).
+    :param prefix_callback: A function to dynamically set the prefix for the operation (optional).
+    :param item_type_callback: A function to specify the type of items processed (optional).
+    :return: A tuple (JSON spectra, MSP spectra, MGF spectra, CSV spectra). The CSV spectra are already converted to
+             dictionaries by the CSV loader (see load_spectrum_list_from_csv).
     """
-    spectrum_list = []  # Initialize an empty list to store spectra
-    for files in mgf_list:  # Loop over each file path in the mgf_list
-        # Extend the spectrum_list with spectral data from current file
-        # The load_spectrum_list_from_mgf() is supposed to return a list of spectra from a single MGF file.
-        spectrum_list.extend(load_spectrum_list_from_mgf(files, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback))
-    return spectrum_list  # Return the final concatenated list of all spectra
+    tasks = [(load_spectrum_list_from_json, files) for files in json_list]
+    tasks += [(load_spectrum_list_from_msp, files) for files in msp_list]
+    tasks += [(load_spectrum_list_from_mgf, files) for files in mgf_list]
+    tasks += [(load_spectrum_list_from_csv, files) for files in csv_list]
+
+    loaded_files = load_files_concurrently(tasks, progress_callback=progress_callback,
+                                           total_items_callback=total_items_callback, prefix_callback=prefix_callback,
+                                           item_type_callback=item_type_callback)
+
+    # The results are in the order of the tasks, split them back by format
+    json_end = len(json_list)
+    msp_end = json_end + len(msp_list)
+    mgf_end = msp_end + len(mgf_list)
+
+    json_spectra = list(itertools.chain.from_iterable(loaded_files[:json_end]))
+    msp_spectra = list(itertools.chain.from_iterable(loaded_files[json_end:msp_end]))
+    mgf_spectra = list(itertools.chain.from_iterable(loaded_files[msp_end:mgf_end]))
+    csv_spectra = list(itertools.chain.from_iterable(loaded_files[mgf_end:]))
+
+    return json_spectra, msp_spectra, mgf_spectra, csv_spectra
 
 
 def parsing_to_dict(input_path, progress_callback=None, total_items_callback=None, prefix_callback=None, item_type_callback=None, step_callback=None):
     """
     This function converts file data (JSON, XML, CSV, MSP, MGF) in a directory to JSON format.
+    The files of every format are first loaded concurrently (see concatenate_input_files), then the spectra of each
+    format are converted (the CSV rows are converted by chunks while they are loaded).
     :param input_path: The path of the input directory where the files are located.
     :return: A tuple containing the converted data from each file type to JSON format. The order of the elements in the tuple is as follows:
         - FINAL_MSP: The converted data from MSP files to JSON format.
@@ -213,25 +289,35 @@ def parsing_to_dict(input_path, progress_callback=None, total_items_callback=Non
         - FINAL_JSON: The converted data from JSON files to JSON format (not actually converted, just collected).
         - FINAL_MGF: The converted data from MGF files to JSON format.
     """
-    # JSON
-    # Initializing an empty list to contain the final JSON data
+    # Initializing empty lists to contain the final data of each format
     FINAL_JSON = []
-    # A list to store all the paths of json files found in the directory
-    json_list = []
-    # A boolean variable to check if there is any json file in the directory
-    json_to_do = False
-    # Iterate over all directories, subdirectories and files in the given directory
-    for files in input_path:
-        # Check if current file is a json file
-        if files.endswith(".json"):
-            # Get the full path to the json file
-            json_path = files
-            # Add the json file path to our list
-            json_list.append(json_path)
-            # Set json_to_do to True as we found at least one json file
-            json_to_do = True
+    FINAL_MSP = []
+    FINAL_MGF = []
+    FINAL_CSV = []
+
+    # Lists to store all the paths of the files of each format, in the order of input_path
+    json_list = [files for files in input_path if files.endswith(".json")]
+    msp_list = [files for files in input_path if files.endswith(".msp")]
+    mgf_list = [files for files in input_path if files.endswith(".mgf")]
+    csv_list = [files for files in input_path if files.endswith(".csv")]
+
+    # Nothing to do if there is no file of a known format
+    if not (json_list or msp_list or mgf_list or csv_list):
+        return FINAL_MSP, FINAL_CSV, FINAL_JSON, FINAL_MGF
+
+    # Sleep for a short time to correctly display progress bar
+    time.sleep(0.01)
+    # Print a status message that the loading has started
+    if step_callback:
+        step_callback("-- LOADING INPUT FILES --")
+    # Sleep for a short time to correctly display progress bar
+    time.sleep(0.01)
+    # Loading all the input files, a bounded number of files at the same time
+    json_spectra, msp_spectra, mgf_spectra, FINAL_CSV = concatenate_input_files(json_list, msp_list, mgf_list, csv_list, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
+
+    # JSON
     # If there are json files to process
-    if json_to_do == True:
+    if json_list:
         # Sleep for a short time to correctly display progress bar
         time.sleep(0.01)
         # Print a status message that the conversion has started
@@ -239,30 +325,12 @@ def parsing_to_dict(input_path, progress_callback=None, total_items_callback=Non
             step_callback("-- PARSING JSON TO DICT --")
         # Sleep for a short time to correctly display progress bar
         time.sleep(0.01)
-        # Concatenating all json files into a single list
-        FINAL_JSON = concatenate_JSON(json_list, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
         # Reformating the JSON structure to a better structure
-        FINAL_JSON = json_to_dict_processing(FINAL_JSON, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
+        FINAL_JSON = json_to_dict_processing(json_spectra, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
 
     # MSP
-    # Initializing an empty list to hold the final MSP data
-    FINAL_MSP = []
-    # Creating a list to store the paths of all MSP files found within the directory
-    msp_list = []
-    # A boolean variable to check if there is any MSP file to process within the directory
-    msp_to_do = False
-    # Looping through the directory and all subdirectories to find files
-    for files in input_path:
-        # Checking if the current file is an MSP file
-        if files.endswith(".msp"):
-            # Constructing the full path to the MSP file
-            msp_path = files
-            # Adding the path of the current MSP file to our list
-            msp_list.append(msp_path)
-            # Setting the msp_to_do flag to True as we have at least one MSP file to process
-            msp_to_do = True
     # If there are any MSP files to process
-    if msp_to_do == True:
+    if msp_list:
         # Sleep for a short time to correctly display progress bar
         time.sleep(0.01)
         # Displaying a status message indicating the beginning of MSP to JSON conversion
@@ -270,30 +338,12 @@ def parsing_to_dict(input_path, progress_callback=None, total_items_callback=Non
             step_callback("-- PARSING MSP TO DICT --")
         # Sleep for a short time to correctly display progress bar
         time.sleep(0.01)
-        # Concatenating all found MSP files into a single list
-        FINAL_MSP = concatenate_MSP(msp_list, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
         # Converting each MSP spectrum to a JSON spectrum
-        FINAL_MSP = msp_to_dict_processing(FINAL_MSP, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
+        FINAL_MSP = msp_to_dict_processing(msp_spectra, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
 
     # MGF
-    # Initializing an empty list to hold the final MGF (Mascot Generic Format) data
-    FINAL_MGF = []
-    # A list to store the paths of all MGF files found within the directory
-    mgf_list = []
-    # A boolean variable to check if there is any MGF file to process within the directory
-    mgf_to_do = False
-    # Looping over each directory, subdirectory, and file in the provided directory
-    for files in input_path:
-        # Checking if the file has a .mgf extension
-        if files.endswith(".mgf"):
-            # Constructing the full path to the MGF file
-            mgf_path = files
-            # Adding the path of the current MGF file to our list
-            mgf_list.append(mgf_path)
-            # Setting the mgf_to_do flag to True as we have at least one MGF file to process
-            mgf_to_do = True
     # Only proceed if there are MGF files to process
-    if mgf_to_do == True:
+    if mgf_list:
         # Sleep for a short time to correctly display progress bar
         time.sleep(0.01)
         # Printing a status message signaling the start of the MGF to JSON conversion
@@ -301,40 +351,84 @@ def parsing_to_dict(input_path, progress_callback=None, total_items_callback=Non
             step_callback("-- PARSING MGF TO DICT --")
         # Sleep for a short time to correctly display progress bar
         time.sleep(0.01)
-        # Concatenating all found MGF files into a single list
-        FINAL_MGF = concatenate_MGF(mgf_list, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
         # Converting each MGF spectrum to a JSON spectrum
-        FINAL_MGF = mgf_to_dict_processing(FINAL_MGF, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
+        FINAL_MGF = mgf_to_dict_processing(mgf_spectra, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
 
     # CSV
-    # Initializing an empty list to contain the final CSV data
-    FINAL_CSV = []
-    # A list to keep track of all CSV file paths found within the directory
-    csv_list = []
-    # A boolean flag to check if there is any CSV file to process
-    csv_to_do = False
-    # Walking through the directory and all its subdirectories to look for files
-    for files in input_path:
-        # Checking if the current file has the extension '.csv'
-        if files.endswith(".csv"):
-            # If it's a CSV file, getting full path to it
-            csv_path = files
-            # Adding this CSV file path to our list
-            csv_list.append(csv_path)
-            # Setting the csv_to_do flag to True as there's at least one CSV file to process
-            csv_to_do = True
-    # Go ahead only if there are CSV files to process
-    if csv_to_do == True:
-        # Sleep for a short time to correctly display progress bar
-        time.sleep(0.01)
-        # Printing a status message to signify the start of CSV to JSON conversion
-        if step_callback:
-            step_callback("-- PARSING CSV TO DICT --")
-        # Sleep for a short time to correctly display progress bar
-        time.sleep(0.01)
-        # Concatenate all CSV files into one list
-        FINAL_CSV = concatenate_csv(csv_list, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
-        # Convert the CSV data to JSON
-        FINAL_CSV = csv_to_dict_processing(FINAL_CSV, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
+    # The CSV files are converted to JSON by chunks of rows while they are loaded
 
     return FINAL_MSP, FINAL_CSV, FINAL_JSON, FINAL_MGF
+
+
+def batch_iterator(iterable, batch_size):
+    """
+    Group the items of an iterable into lists of at most batch_size items.
+
+    :param iterable: Any iterable (e.g. a loader generator).
+    :param batch_size: The maximum number of items per batch.
+    :return: A generator yielding lists of items.
+    """
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    # Yield the last incomplete batch
+    if batch:
+        yield batch
+
+
+def iter_parsed_batches(input_path, batch_size, progress_callback=None, total_items_callback=None, prefix_callback=None,
+                        item_type_callback=None, step_callback=None):
+    """
+    Streaming counterpart of parsing_to_dict: reads the input files lazily and yields the parsed spectra in bounded
+    batches, so that only one batch of spectra is resident in memory at a time.
+    The files are read in the order used by MAIN to concatenate the parsed spectra (MSP, CSV, JSON then MGF).
+
+    :param input_path: The list of input file paths.
+    :param batch_size: The maximum number of spectra per batch.
+    :return: A generator yielding tuples (mode, batch) where mode is "MSP", "CSV", "JSON" or "MGF" and batch a list
+             of parsed spectrum dictionaries.
+    """
+    msp_list = [files for files in input_path if files.endswith(".msp")]
+    csv_list = [files for files in input_path if files.endswith(".csv")]
+    json_list = [files for files in input_path if files.endswith(".json")]
+    mgf_list = [files for files in input_path if files.endswith(".mgf")]
+
+    # MSP
+    for files in msp_list:
+        for batch in batch_iterator(iter_spectrum_from_msp(files), batch_size):
+            if step_callback:
+                step_callback(f"-- PARSING MSP TO DICT [{os.path.basename(files)}] --")
+            batch = msp_to_dict_processing(batch, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
+            if batch:
+                yield "MSP", batch
+
+    # CSV
+    for files in csv_list:
+        for df in iter_csv_chunks(files, batch_size):
+            if step_callback:
+                step_callback(f"-- PARSING CSV TO DICT [{os.path.basename(files)}] --")
+            batch = csv_to_dict_processing(df, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
+            if batch:
+                yield "CSV", batch
+
+    # JSON
+    for files in json_list:
+        for batch in batch_iterator(iter_spectrum_from_json(files), batch_size):
+            if step_callback:
+                step_callback(f"-- PARSING JSON TO DICT [{os.path.basename(files)}] --")
+            batch = json_to_dict_processing(batch, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
+            if batch:
+                yield "JSON", batch
+
+    # MGF
+    for files in mgf_list:
+        for batch in batch_iterator(iter_spectrum_from_mgf(files), batch_size):
+            if step_callback:
+                step_callback(f"-- PARSING MGF TO DICT [{os.path.basename(files)}] --")
+            batch = mgf_to_dict_processing(batch, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
+            if batch:
+                yield "MGF", batch
@@ -1,7 +1,8 @@
 from scripts.GUI.utils.global_vars import parameters_dict
 from scripts.calculate_maximized_chunk_size import *
+from scripts.executor import *
 from scripts.globals_vars import atoms_of_life
-import concurrent.futures
+from scripts.peak_arrays import *
 from math import floor
 from numba import jit
 import pandas as pd
@@ -302,15 +303,12 @@ def _prepare_annotation_data(spectrum_row, atoms):
         if element in atoms:
             max_composition[element] = int(count_str) if count_str else 1
 
-    peaks_list_str = spectrum_row.get("PEAKS_LIST", "")
-    if not peaks_list_str:
+    # The peaks are a numpy array (text peak lists are still accepted)
+    peaks_array = as_peak_array(spectrum_row.get("PEAKS_LIST", ""))
+    if peaks_array.size == 0:
         return None, None, None, None
 
-    # Handle both semicolon-separated and newline-separated peak formats
-    if ';' in peaks_list_str:
-        peaks = [(float(mz), float(i)) for p in peaks_list_str.strip().split(';') for mz, i in [p.split()]]
-    else:
-        peaks = [(float(mz), float(i)) for l in peaks_list_str.strip().split('\n') for mz, i in [l.split()]]
+    peaks = [tuple(peak) for peak in peaks_array.tolist()]
 
     proton_mass = atoms.get('H')  # Safer access
     elements_to_test = list(max_composition.keys())
@@ -348,27 +346,26 @@ def process_single_spectrum(spectrum_dict):
     # are accessible in this scope.
     annotations = parse_and_annotate_spectrum(spectrum_dict, atoms_of_life, ppm_tolerance=ppm_tol)
 
-    # Step 2: Generate the new PEAKS_LIST string
+    # Step 2: Generate the new PEAKS_LIST string, the annotated peak lists are formatted to text here (with the
+    # formula of each peak as third column), the other peak lists stay numpy arrays
     original_peak_list = spectrum_dict.get('PEAKS_LIST', "")
 
-    def _generate_updated_peak_list_string(peak_list_str, annots):
-        if not annots or not peak_list_str or pd.isna(peak_list_str):
-            return peak_list_str
-        lines = str(peak_list_str).strip().split('\n')
+    def _generate_updated_peak_list_string(peak_list, annots):
+        if not annots:
+            return peak_list
+        peak_array = as_peak_array(peak_list)
+        if peak_array.size == 0:
+            return peak_list
         keys = list(annots.keys())
         new_lines = []
-        for line in lines:
-            parts = line.split()
-            if len(parts) < 2: continue
-            mz_str, intensity_str = parts[0], parts[1]
-            mz_val = float(mz_str)
+        for mz_val, intensity_val in peak_array.tolist():
             closest_key = min(keys, key=lambda k: abs(k - mz_val))
             formula_str = ""
             if abs(closest_key - mz_val) < 1e-5:
                 data = annots.get(closest_key, [{}])[0]
                 if 'formula' in data:
                     formula_str = f"{data['formula']}/{data['error_ppm']}"
-            new_lines.append(f"{mz_str} {intensity_str} {formula_str}")
+            new_lines.append(f"{PEAK_FORMAT % (mz_val, intensity_val)} {formula_str}")
         return "\n".join(new_lines)
 
     updated_list = _generate_updated_peak_list_string(original_peak_list, annotations)
@@ -381,7 +378,7 @@ def process_single_spectrum(spectrum_dict):
 
 def de_novo_calculation(spectrum_df, progress_callback=None, total_items_callback=None, prefix_callback=None, item_type_callback=None):
     """
-    Calculates de novo annotations using a ThreadPoolExecutor and batch processing.
+    Calculates de novo annotations using the shared execution engine and batch processing.
     """
     # Configure callbacks
     if prefix_callback:
@@ -396,33 +393,11 @@ def de_novo_calculation(spectrum_df, progress_callback=None, total_items_callbac
     if total_items_callback:
         total_items_callback(total_items, 0)
 
-    # 2. Calculate the batch size (chunks)
-    chunk_size = calculate_maximized_chunk_size(data_list=records)
-
-    # List to collect the final results
-    final_results = []
-    processed_items = 0
-
-    # 3. Loop over the list, processing one batch at a time
-    for i in range(0, total_items, chunk_size):
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # Extract the current batch
-            chunk = records[i:i + chunk_size]
-
-            # Execute the processing function on each dictionary in the batch
-            results = list(executor.map(process_single_spectrum, chunk))
-
-        # Add the results of the processed batch to the final list
-        final_results.extend(results)
-
-        # Update the number of processed items
-        processed_items += len(chunk)
-
-        # 4. Update the progress bar after each batch
-        if progress_callback:
-            progress_callback(processed_items)
+    # 2. Execute the processing function on each dictionary with the long-lived pool of the shared execution engine
+    # (process / thread / serial), the progress bar is updated as the sub-chunks complete
+    final_results = executor_map(process_single_spectrum, records, progress_callback=progress_callback)
 
-    # 5. Convert the list of dictionaries back into a DataFrame
+    # 3. Convert the list of dictionaries back into a DataFrame
     final_df = pd.DataFrame(final_results)
 
     # Remove the 'annotation_results' column before returning the result.
@@ -1,7 +1,22 @@
 import scripts.deletion_report
+import scripts.globals_vars
 import pandas as pd
+import tempfile
+import pickle
 import os
 
+# Prefix of the temporary spill store of the streaming duplicates removal, created in the project output directory
+DUPLICATAS_SPILL_PREFIX = "duplicatas_spill_"
+
+global duplicatas_spill, duplicatas_index, duplicatas_spilled
+# Spill store of the streaming duplicates removal (temporary file of pickled spectra), opened by open_duplicatas_spill
+duplicatas_spill = None
+# Index {(SPLASH, INCHIKEY): (best row size, spill offset)} of the spectrum kept for each key
+duplicatas_index = {}
+# Number of spectra written to the spill store
+duplicatas_spilled = 0
+
+
 def remove_duplicatas(spectrum_list, output_directory, progress_callback=None, total_items_callback=None, prefix_callback=None, item_type_callback=None):
     """
     Removes duplicate entries from a given spectrum list based on the maximum 'row_size' for each unique
@@ -30,9 +45,10 @@ def remove_duplicatas(spectrum_list, output_directory, progress_callback=None, t
 
     Returns:
     --------
-    list of dict
-        A list of dictionaries with duplicate spectra removed, retaining only the
-        spectrum with the largest 'row_size' for each combination of SPLASH and INCHIKEY.
+    DataFrame
+        The DataFrame with duplicate spectra removed, retaining only the spectrum with the largest 'row_size'
+        for each combination of SPLASH and INCHIKEY, in the original order. The data stays columnar for the
+        following stages.
     """
     total_items = len(spectrum_list)
 
@@ -45,28 +61,32 @@ def remove_duplicatas(spectrum_list, output_directory, progress_callback=None, t
     if total_items_callback:
         total_items_callback(total_items, 0)
 
-    # Calculate the size of rows in characters
-    spectrum_list['row_size'] = spectrum_list.apply(lambda row: row.astype(str).map(len).sum(), axis=1)
+    # Calculate the size of rows in characters, column by column (PEAKS_LIST is measured as its string representation)
+    row_size = pd.Series(0, index=spectrum_list.index)
+    for column in spectrum_list.columns:
+        values = spectrum_list[column]
+        if column == 'PEAKS_LIST' or values.dtype != object:
+            values = values.astype(str)
+        row_size += values.str.len().fillna(3).astype(int)
 
-    # Separate entries with empty or non-empty INCHIKEY
-    empty_inchikey_df = spectrum_list[spectrum_list['INCHIKEY'].isna() | (spectrum_list['INCHIKEY'].str.strip() == "")]
-    non_empty_inchikey_df = spectrum_list[~(spectrum_list['INCHIKEY'].isna() | (spectrum_list['INCHIKEY'].str.strip() == ""))]
+    # Entries with empty INCHIKEY are not considered for deduplication
+    inchikey = spectrum_list['INCHIKEY']
+    empty_inchikey = inchikey.isna() | (inchikey.str.strip() == "")
 
-    # Identify unique indices for SPLASH and INCHIKEY (non-empty)
-    unique_indices = non_empty_inchikey_df.groupby(['SPLASH', 'INCHIKEY'])['row_size'].idxmax()
+    # For each SPLASH and INCHIKEY (non-empty), keep the first entry with the largest row size: stable sort by
+    # decreasing row size, then keep the first entry of each key
+    candidates = pd.DataFrame({'SPLASH': spectrum_list['SPLASH'],
+                               'INCHIKEY': inchikey,
+                               'row_size': row_size})[~empty_inchikey]
+    candidates = candidates.sort_values('row_size', ascending=False, kind='mergesort')
+    winners = candidates.drop_duplicates(subset=['SPLASH', 'INCHIKEY'], keep='first').index
 
-    # Combine indices to keep: unique entries and entries without INCHIKEY
-    all_indices_to_keep = set(unique_indices).union(set(empty_inchikey_df.index))
-
-    # Identify duplicates to delete
-    all_indices = set(spectrum_list.index)
-    indices_to_delete = list(all_indices - all_indices_to_keep)
+    # Combine the entries to keep: unique entries and entries without INCHIKEY
+    to_keep = empty_inchikey.copy()
+    to_keep[winners] = True
 
     # Extract duplicates to delete
-    deleted_spectra = spectrum_list.loc[indices_to_delete].copy()
-
-    # Drop the temporary 'row_size' column before adding them to the list of duplicates
-    deleted_spectra = deleted_spectra.drop(columns=['row_size'])
+    deleted_spectra = spectrum_list[~to_keep].copy()
     deleted_spectra['DELETION_REASON'] = "spectrum deleted because it's a duplicate (SPLASH + INCHIKEY)"
 
     # Create the directory to store deleted spectra
@@ -79,21 +99,200 @@ def remove_duplicatas(spectrum_list, output_directory, progress_callback=None, t
 
     del deleted_spectra
 
-    # Keep only unique spectra (convert the set to a list)
-    spectrum_list = spectrum_list.loc[list(all_indices_to_keep)]
-
-    # Drop the temporary 'row_size' column
-    spectrum_list = spectrum_list.drop(columns=['row_size'])
+    # Keep only unique spectra
+    spectrum_list = spectrum_list[to_keep]
 
     # Update progress, if necessary
     if progress_callback:
         progress_callback(total_items)
         progress_callback(100)
 
-    # Convert to a list of dictionaries
-    spectrum_list = spectrum_list.to_dict(orient='records')
-
     # Update the deletion report
     scripts.deletion_report.duplicatas_removed = total_items - len(spectrum_list)
 
-    return spectrum_list
\ No newline at end of file
+    return spectrum_list
+
+def duplicatas_key(spectrum):
+    """
+    Returns the deduplication key of a spectrum dictionary.
+
+    :param spectrum: A spectrum dictionary.
+    :return: The (SPLASH, INCHIKEY) key, or None if the INCHIKEY is empty (the spectrum is always kept).
+    """
+    inchikey = spectrum.get('INCHIKEY')
+
+    if inchikey is None or not str(inchikey).strip():
+        return None
+
+    return str(spectrum.get('SPLASH')), str(inchikey)
+
+
+def write_duplicatas_removed(deleted_spectra, output_directory, written_files=None):
+    """
+    Writes removed duplicates to DELETED_SPECTRUMS/duplicatas_removed.csv.
+
+    :param deleted_spectra: A list of the removed spectrum dictionaries.
+    :param output_directory: The base directory where `DELETED_SPECTRUMS` and the CSV file will be stored.
+    :param written_files: A set of the deletion files already written during this run, appended to instead of being
+                          overwritten. Updated in place.
+    :return: None
+    """
+    # Create the directory to store deleted spectra
+    deleted_spectrums_dir = os.path.join(output_directory, 'DELETED_SPECTRUMS')
+    os.makedirs(deleted_spectrums_dir, exist_ok=True)
+
+    # Write removed duplicates to a CSV file
+    deleted_spectra_file = os.path.join(deleted_spectrums_dir, 'duplicatas_removed.csv')
+    deleted_spectra = pd.DataFrame(deleted_spectra, columns=scripts.globals_vars.keys_list)
+    deleted_spectra['DELETION_REASON'] = "spectrum deleted because it's a duplicate (SPLASH + INCHIKEY)"
+    if written_files is not None and deleted_spectra_file in written_files:
+        # Append without headers, the file was already written during this run
+        if not deleted_spectra.empty:
+            deleted_spectra.to_csv(deleted_spectra_file, mode='a', sep='\t', index=False, quotechar='"', header=False)
+    else:
+        deleted_spectra.to_csv(deleted_spectra_file, sep='\t', index=False, quotechar='"')
+        if written_files is not None:
+            written_files.add(deleted_spectra_file)
+
+
+def open_duplicatas_spill(output_directory):
+    """
+    Opens the temporary on-disk store of the streaming duplicates removal, in the project output directory, and
+    resets the in-memory index of the best spectrum of each (SPLASH, INCHIKEY) key.
+
+    :param output_directory: The project output directory.
+    :return: None
+    """
+    global duplicatas_spill, duplicatas_index, duplicatas_spilled
+
+    close_duplicatas_spill()
+
+    duplicatas_spill = tempfile.TemporaryFile(prefix=DUPLICATAS_SPILL_PREFIX, dir=output_directory)
+    duplicatas_index = {}
+    duplicatas_spilled = 0
+
+
+def spill_duplicatas_candidates(spectrum_list, progress_callback=None, total_items_callback=None,
+                                prefix_callback=None, item_type_callback=None):
+    """
+    First pass of the streaming duplicates removal: appends a batch of spectra to the spill store and records, for
+    each (SPLASH, INCHIKEY) key, the row size and spill offset of the first spectrum with the largest row size (the
+    spectrum kept by remove_duplicatas). Only this index is kept in memory.
+
+    :param spectrum_list: A list of spectrum dictionaries (one batch), with str values except PEAKS_LIST.
+    :param progress_callback: A function to report progress (processed items).
+    :param total_items_callback: A function to report the total number of items to process.
+    :param prefix_callback: A function to set the prefix for the operation.
+    :param item_type_callback: A function to specify the type of items.
+    :return: None
+    """
+    global duplicatas_spilled
+
+    if prefix_callback:
+        prefix_callback("Spilling duplicates candidates:")
+
+    if item_type_callback:
+        item_type_callback("spectra")
+
+    if total_items_callback:
+        total_items_callback(len(spectrum_list), 0)
+
+    for spectrum in spectrum_list:
+        offset = duplicatas_spill.tell()
+        pickle.dump(spectrum, duplicatas_spill, protocol=pickle.HIGHEST_PROTOCOL)
+        duplicatas_spilled += 1
+
+        # Entries with empty INCHIKEY are not considered for deduplication
+        key = duplicatas_key(spectrum)
+        if key is None:
+            continue
+
+        # Size of the row in characters, like remove_duplicatas
+        row_size = sum(len(str(value)) for value in spectrum.values())
+
+        # Strictly larger only: the first spectrum with the largest row size wins
+        best = duplicatas_index.get(key)
+        if best is None or row_size > best[0]:
+            duplicatas_index[key] = (row_size, offset)
+
+    if progress_callback:
+        progress_callback(len(spectrum_list))
+
+
+def iter_deduplicated_batches(output_directory, batch_size, written_files=None, progress_callback=None,
+                              total_items_callback=None, prefix_callback=None, item_type_callback=None):
+    """
+    Second pass of the streaming duplicates removal: reads the spill store sequentially and yields the kept spectra
+    (the winner of each key and the spectra with empty INCHIKEY) in bounded batches, in their original order. The
+    other spectra are written to DELETED_SPECTRUMS/duplicatas_removed.csv.
+
+    :param output_directory: The base directory where `DELETED_SPECTRUMS` and the CSV file will be stored.
+    :param batch_size: The maximum number of spectra read per batch.
+    :param written_files: A set of the deletion files already written during this run, appended to instead of being
+                          overwritten. Updated in place.
+    :param progress_callback: A function to report progress (processed items).
+    :param total_items_callback: A function to report the total number of items to process.
+    :param prefix_callback: A function to set the prefix for the operation.
+    :param item_type_callback: A function to specify the type of items.
+    :return: A generator yielding lists of spectrum dictionaries with duplicates removed.
+    """
+    duplicatas_spill.flush()
+    duplicatas_spill.seek(0)
+
+    remaining = duplicatas_spilled
+
+    while remaining:
+        if prefix_callback:
+            prefix_callback("Removing duplicates:")
+
+        if item_type_callback:
+            item_type_callback("spectra")
+
+        total_items = min(batch_size, remaining)
+        if total_items_callback:
+            total_items_callback(total_items, 0)
+
+        kept_spectra = []
+        deleted_spectra = []
+
+        for _ in range(total_items):
+            offset = duplicatas_spill.tell()
+            spectrum = pickle.load(duplicatas_spill)
+
+            key = duplicatas_key(spectrum)
+            if key is None or duplicatas_index[key][1] == offset:
+                kept_spectra.append(spectrum)
+            else:
+                deleted_spectra.append(spectrum)
+
+        remaining -= total_items
+
+        # Update progress, if necessary
+        if progress_callback:
+            progress_callback(total_items)
+
+        write_duplicatas_removed(deleted_spectra, output_directory, written_files=written_files)
+
+        # Update the deletion report
+        scripts.deletion_report.duplicatas_removed += len(deleted_spectra)
+
+        del deleted_spectra
+
+        if kept_spectra:
+            yield kept_spectra
+
+
+def close_duplicatas_spill():
+    """
+    Closes (and thereby deletes) the spill store of the streaming duplicates removal and frees its index.
+
+    :return: None
+    """
+    global duplicatas_spill, duplicatas_index, duplicatas_spilled
+
+    if duplicatas_spill is not None:
+        duplicatas_spill.close()
+
+    duplicatas_spill = None
+    duplicatas_index = {}
+    duplicatas_spilled = 0
@@ -0,0 +1,269 @@
+from scripts.GUI.utils.global_vars import parameters_dict
+from scripts.calculate_maximized_chunk_size import *
+import concurrent.futures
+import scripts.deletion_report
+import scripts.global_report
+import scripts.globals_vars
+import threading
+
+# Counters updated by the stage functions {name: module}, merged back from the worker processes. A counter is a number
+# or a dictionary of numbers {key: count}.
+COUNTERS = {"duplicatas_removed": scripts.deletion_report,
+            "previously_cleaned": scripts.deletion_report,
+            "no_peaks_list": scripts.deletion_report,
+            "no_smiles_no_inchi_no_inchikey": scripts.deletion_report,
+            "no_precursor_mz": scripts.deletion_report,
+            "low_entropy_score": scripts.deletion_report,
+            "minimum_peaks_not_requiered": scripts.deletion_report,
+            "all_peaks_above_precursor_mz": scripts.deletion_report,
+            "no_peaks_in_mz_range": scripts.deletion_report,
+            "minimum_high_peaks_not_requiered": scripts.deletion_report,
+            "no_or_bad_adduct": scripts.deletion_report,
+            "instrument_cache_hits": scripts.global_report,
+            "instrument_cache_misses": scripts.global_report,
+            "normalizer_calls": scripts.global_report,
+            "normalizer_seconds": scripts.global_report}
+
+EXECUTION_MODES = ("thread", "process", "serial")
+
+# ProcessPoolExecutor does not accept more than 61 workers on Windows
+MAX_PROCESS_WORKERS = 61
+
+global process_pool, process_workers, thread_pool, thread_workers
+process_pool = None
+process_workers = 0
+thread_pool = None
+thread_workers = 0
+
+# The pools may be requested by several threads at once (e.g. the loaders of input files loaded concurrently)
+pool_lock = threading.Lock()
+
+
+def get_execution_mode():
+    """
+    Returns the execution mode of the CPU-bound stages selected in parameters_dict["execution_mode"]:
+    "process" (default, one worker process per core), "thread" or "serial" (no parallelism, for debugging).
+
+    :return: The execution mode.
+    """
+    mode = parameters_dict.get("execution_mode", "process")
+
+    # Fall back to threads on unknown values
+    if mode not in EXECUTION_MODES:
+        return "thread"
+
+    return mode
+
+
+def init_worker(parameters):
+    """
+    Initializer of the worker processes: copies the user parameters of the parent process and loads the
+    globals_vars tables once per worker.
+
+    :param parameters: A copy of parameters_dict in the parent process.
+    :return: None
+    """
+    parameters_dict.clear()
+    parameters_dict.update(parameters)
+
+    # Loading the tables is done by importing the module
+    import scripts.globals_vars
+
+
+def apply_to_chunk(func, chunk, batched=False):
+    """
+    Applies func to a chunk of items.
+
+    :param func: A function.
+    :param chunk: A list of items.
+    :param batched: True if func takes the whole list of items and returns the list of results.
+    :return: The list of results.
+    """
+    if batched:
+        return func(chunk)
+
+    return [func(item) for item in chunk]
+
+
+def counter_delta(before, after):
+    """
+    Returns the increase of a counter (see COUNTERS) between two of its values.
+
+    :param before: The previous value (a copy for the dictionaries).
+    :param after: The current value.
+    :return: The difference, a dictionary of the keys which changed for the dictionary counters.
+    """
+    if isinstance(after, dict):
+        return {key: value - before.get(key, 0) for key, value in after.items() if value != before.get(key, 0)}
+
+    return after - before
+
+
+def merge_counter(name, delta):
+    """
+    Adds the increase of a counter recorded in a worker process to the counter of the parent process.
+
+    :param name: The name of the counter in COUNTERS.
+    :param delta: The increase returned by counter_delta.
+    :return: None
+    """
+    module = COUNTERS[name]
+
+    if isinstance(delta, dict):
+        counter = getattr(module, name)
+        for key, value in delta.items():
+            counter[key] = counter.get(key, 0) + value
+    else:
+        setattr(module, name, getattr(module, name) + delta)
+
+
+def run_chunk(func, chunk, batched=False):
+    """
+    Applies func to a chunk of items inside a worker process. The counters and deleted spectra
+    recorded by func in the worker are returned so that they can be merged in the parent process.
+
+    :param func: A picklable (module level) function.
+    :param chunk: A list of items.
+    :param batched: True if func takes the whole list of items and returns the list of results.
+    :return: A tuple (results, counters deltas, deleted spectrum list).
+    """
+    before = {name: (dict(getattr(module, name)) if isinstance(getattr(module, name), dict) else getattr(module, name))
+              for name, module in COUNTERS.items()}
+    scripts.deletion_report.deleted_spectrum_list = []
+
+    results = apply_to_chunk(func, chunk, batched)
+
+    deltas = {name: counter_delta(before[name], getattr(module, name)) for name, module in COUNTERS.items()}
+    deleted_spectrum_list = scripts.deletion_report.deleted_spectrum_list
+    scripts.deletion_report.deleted_spectrum_list = []
+
+    return results, deltas, deleted_spectrum_list
+
+
+def run_chunk_in_thread(func, chunk, batched=False):
+    """
+    Applies func to a chunk of items inside a worker thread. The deletion report is shared with the threads,
+    so there is nothing to merge.
+
+    :param func: A function.
+    :param chunk: A list of items.
+    :param batched: True if func takes the whole list of items and returns the list of results.
+    :return: A tuple (results, None, None).
+    """
+    return apply_to_chunk(func, chunk, batched), None, None
+
+
+def get_pool(mode):
+    """
+    Returns the long-lived pool of the run for the given mode ("process" or "thread"), created at first use and
+    shared by all the stages of the pipeline. The worker processes are initialized with a copy of the current
+    parameters_dict, so the pools must be shut down at the end of each run (shutdown_executor).
+
+    :param mode: "process" or "thread".
+    :return: A tuple (pool, number of workers).
+    """
+    global process_pool, process_workers, thread_pool, thread_workers
+
+    with pool_lock:
+        if mode == "process":
+            if process_pool is None:
+                process_workers = max(1, min(scripts.globals_vars.cpu_count or 1, MAX_PROCESS_WORKERS))
+                process_pool = concurrent.futures.ProcessPoolExecutor(max_workers=process_workers,
+                                                                      initializer=init_worker,
+                                                                      initargs=(dict(parameters_dict),))
+            return process_pool, process_workers
+
+        if thread_pool is None:
+            # Same default number of workers as ThreadPoolExecutor()
+            thread_workers = min(32, (scripts.globals_vars.cpu_count or 1) + 4)
+            thread_pool = concurrent.futures.ThreadPoolExecutor(max_workers=thread_workers)
+        return thread_pool, thread_workers
+
+
+def shutdown_executor():
+    """
+    Shuts down the pools of the run, if any.
+
+    :return: None
+    """
+    global process_pool, thread_pool
+
+    if process_pool is not None:
+        process_pool.shutdown(wait=True, cancel_futures=True)
+        process_pool = None
+
+    if thread_pool is not None:
+        thread_pool.shutdown(wait=True, cancel_futures=True)
+        thread_pool = None
+
+
+def executor_map(func, items, progress_callback=None, allow_processes=True, batched=False):
+    """
+    Applies func to every item of items with the execution mode selected by the user and returns the results in
+    the order of items, like list(ThreadPoolExecutor().map(func, items)).
+
+    All the items are submitted at once, in sub-chunks, to the long-lived pool of the run: the workers pick the
+    next sub-chunk as soon as they are free, so a slow spectrum does not stall the others, and the progress is
+    reported as the sub-chunks complete. In process mode the sub-chunks also limit the pickling overhead, and the
+    counters (COUNTERS) / deleted spectra recorded in the workers are merged into the parent process.
+
+    :param func: A module level function (it must be picklable in process mode).
+    :param items: A list of items.
+    :param progress_callback: A function called with the number of processed items (optional).
+    :param allow_processes: False for functions relying on a state of the parent process: threads are used instead
+                            of processes.
+    :param batched: True if func takes a list of items (a sub-chunk) and returns the list of their results, for
+                    functions vectorised over several items.
+    :return: The list of results.
+    """
+    mode = get_execution_mode()
+
+    if mode == "process" and not allow_processes:
+        mode = "thread"
+
+    if batched and (mode == "serial" or len(items) <= 1):
+        results = func(items)
+        if progress_callback:
+            progress_callback(len(results))
+        return results
+
+    if mode == "serial" or len(items) <= 1:
+        results = []
+        for item in items:
+            results.append(func(item))
+            if progress_callback:
+                progress_callback(len(results))
+        return results
+
+    pool, workers = get_pool(mode)
+    run = run_chunk if mode == "process" else run_chunk_in_thread
+
+    # Eight sub-chunks per worker to balance the load between them, bounded by the memory available per core
+    sub_chunk_size = max(1, min(-(-len(items) // (workers * 8)), calculate_maximized_chunk_size(data_list=items)))
+
+    futures = {}
+    for start in range(0, len(items), sub_chunk_size):
+        futures[pool.submit(run, func, items[start:start + sub_chunk_size], batched)] = start
+
+    results = [None] * len(items)
+    processed_items = 0
+
+    for future in concurrent.futures.as_completed(futures):
+        chunk_results, deltas, deleted_spectrum_list = future.result()
+
+        # Place the results of the sub-chunk at their position
+        start = futures[future]
+        results[start:start + len(chunk_results)] = chunk_results
+
+        # Merge the deletion report of the worker process
+        if deltas:
+            for name, delta in deltas.items():
+                if delta:
+                    merge_counter(name, delta)
+            scripts.deletion_report.deleted_spectrum_list.extend(deleted_spectrum_list)
+
+        processed_items += len(chunk_results)
+        if progress_callback:
+            progress_callback(processed_items)
+
+    return results
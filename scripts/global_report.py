@@ -18,3 +18,22 @@ report_dict = {"pos_lc_exp_spectrum_number": 0,
                "neg_gc_insilico_spectrum_unique_inchikey": 0,
                "TOTAL_unique_inchikey": 0
                }
+
+global instrument_cache_hits
+# Number of spectra whose instrument was resolved from the instrument resolution cache (in batch normalization, the
+# spectra sharing the instrument information of a group resolved once count as hits, see
+# record_repeated_instrument_lookups)
+instrument_cache_hits = 0
+
+global instrument_cache_misses
+# Number of spectra whose instrument was resolved by searching the instrument tree
+instrument_cache_misses = 0
+
+global normalizer_calls
+# Number of spectra passed to each metadata normalizer {normalizer name: spectra}, when
+# parameters_dict["normalizers_timing"] is 1.0 (in batch normalization, the spectra of a batch normalized column-wise)
+normalizer_calls = {}
+
+global normalizer_seconds
+# Cumulative time of each metadata normalizer {normalizer name: seconds}
+normalizer_seconds = {}
@@ -60,6 +60,15 @@ metadata_peak_list_split_pattern_mgf = re.compile(r"([\s\S]*=.*[0-9]*\n)(((-?\d+
 
 global metadata_peak_list_split_pattern_msp
 metadata_peak_list_split_pattern_msp = re.compile(r"([\s\S]*:.*[0-9]*\n)(((-?\d+[.,]?\d*(?:[Ee][+-]?\d+)?)(\s+|:)(-?\d+[.,]?\d*(?:[Ee][+-]?\d+)?)(.*)(\n|$))*)")
+
+global peak_line_pattern_msp
+peak_line_pattern_msp = re.compile(r"(-?\d+[.,]?\d*(?:[Ee][+-]?\d+)?)(?:\s+|:)(-?\d+[.,]?\d*(?:[Ee][+-]?\d+)?).*(?:\n|$)")  # one peak line of metadata_peak_list_split_pattern_msp
+
+global simple_peak_list_pattern
+simple_peak_list_pattern = re.compile(r"(?:-?[0-9]+\.?[0-9]*(?:[Ee][+-]?[0-9]+)?[ \t]+-?[0-9]+\.?[0-9]*(?:[Ee][+-]?[0-9]+)?[ \t\r]*(?:\n|\Z))*")  # "m/z intensity" lines only, ASCII digits (use with fullmatch)
+
+global msp_record_separator_pattern
+msp_record_separator_pattern = re.compile(rb"\n(?:[ \t\r\f\v]*\n)+")  # one or more blank lines between two MSP records (bytes)
 # ======================================
 
 # ===== normalizers regex pattern ======
@@ -75,6 +84,9 @@ sub_adduct_pattern = re.compile(r"\(|\)|(.*\[)|(\]([\d\+\-\*]*)?)")
 global float_check_pattern
 float_check_pattern = re.compile(r"(-?\d+[.,]?\d*(?:[Ee][+-]?\d+)?)")
 
+global gc_instrument_type_pattern
+gc_instrument_type_pattern = re.compile(r"\bGC\b")
+
 global ms_level_pattern
 ms_level_pattern = re.compile(r"(?:ms)?(\d)", flags=re.IGNORECASE)
 
@@ -107,6 +119,22 @@ ionization_mode_pattern = re.compile(r"((?:^|\b)?APCI(?:\b|$)?)|((?:^|\b)?ACPI(?
 
 global empty_pattern
 empty_pattern = re.compile(r"(^CCS:( .*)?)|(^\$:00in-source( .*)?)|(^0( .*)?)|(^0\.0( .*)?)|(^$)|(^na( .*)?)|(^n/a( .*)?)|(^nan( .*)?)|(^unknown( .*)?)|(^unknow( .*)?)|(^none( .*)?)|(^\?( .*)?)|(^unk( .*)?)|(^x( .*)?)", flags=re.IGNORECASE)
+EMPTY_VALUE_FIRST_CHARACTERS = frozenset("cC$0nNuU?xX")  # only the empty string and the values starting with one of these characters can match empty_pattern
+
+global triple_tof_pattern
+triple_tof_pattern = re.compile(r"triple(-| )?tof")
+
+global triple_quad_pattern
+triple_quad_pattern = re.compile(r"triple(-| )?quad")
+
+global uplc_pattern
+uplc_pattern = re.compile(r"... uplc ...")
+
+global instrument_infos_forbidden_characters_pattern
+instrument_infos_forbidden_characters_pattern = re.compile(r'[^-\w\s]')
+
+global regex_metacharacters_pattern
+regex_metacharacters_pattern = re.compile(r"[.^$*+?{}\[\]\\|()]")  # instrument tree keys which are regex patterns, not literal names
 # =====================================
 
 # ======================================================================================================================
@@ -223,6 +251,11 @@ keys_list = ['FILENAME',
              'NUM PEAKS',
              'PEAKS_LIST']
 
+global keys_alias_table
+# Known synonym -> index of its key in keys_list, built once from keys_dict (the synonyms of keys outside keys_list
+# are left out)
+keys_alias_table = {synonym: keys_list.index(key) for synonym, key in keys_dict.items() if key in set(keys_list)}
+
 # ======================================================================================================================
 
 # ====================================================OTHER VARS========================================================
@@ -7,6 +7,7 @@ def normalize_to_not_found(df: pd.DataFrame) -> pd.DataFrame:
 
     This function creates a copy of the input DataFrame, then replaces all empty string values
     within the DataFrame with the string "NOT FOUND". The modified DataFrame is returned as a result.
+    The PEAKS_LIST column (numpy arrays of peaks) is left unchanged.
 
     Parameters:
     df: pd.DataFrame
@@ -17,6 +18,7 @@ def normalize_to_not_found(df: pd.DataFrame) -> pd.DataFrame:
         A copy of the input DataFrame with all empty string values replaced by "NOT FOUND".
     """
     df_processed = df.copy()
-    df_processed = df_processed.replace('', 'NOT FOUND')
+    text_columns = [column for column in df_processed.columns if column != 'PEAKS_LIST']
+    df_processed[text_columns] = df_processed[text_columns].replace('', 'NOT FOUND')
 
     return df_processed
\ No newline at end of file
@@ -1,3 +1,4 @@
+from scripts.normalizer.shared_checks import *
 import scripts.deletion_report
 import scripts.globals_vars
 import re
@@ -35,7 +36,7 @@ def check_for_bad_adduct(metadata_dict):
                 adduct = metadata_dict['PRECURSORTYPE']
 
     instrument_type = metadata_dict["INSTRUMENTTYPE"]
-    if re.search(r"\bGC\b", instrument_type):
+    if is_gc_instrument_type(instrument_type):
         if not adduct:
             return metadata_dict
 
@@ -1,6 +1,7 @@
 from rdkit.Chem.Descriptors import ExactMolWt
 from rdkit import RDLogger, Chem
 import pandas as pd
+from scripts.normalizer.shared_checks import *
 import scripts.globals_vars
 import re
 import os
@@ -42,11 +43,12 @@ def precursor_mz_need_re_calculation(metadata_dict):
     :param metadata_dict: A dictionary containing metadata information.
     :return: This function returns 'True' if the 'PRECURSORMZ' value in the metadata dictionary needs to be recalculated, and 'False' otherwise.
     """
-    # Check if 'PRECURSORMZ' value matches the float_check_pattern
-    if not re.search(scripts.globals_vars.float_check_pattern, str(metadata_dict["PRECURSORMZ"])):
+    # Check if 'PRECURSORMZ' value matches the float_check_pattern (shared with the spectrum cleaning)
+    precursor_mz = float_check_value(str(metadata_dict["PRECURSORMZ"]))
+    if precursor_mz is None:
         # If 'PRECURSORMZ' value doesn't match the float_check_pattern, return True indicating that the value needs to be recalculated
         return True
-    elif float(re.search(scripts.globals_vars.float_check_pattern, str(metadata_dict["PRECURSORMZ"])).group(1).replace(",", ".")) <= 0.0:
+    elif float(precursor_mz.replace(",", ".")) <= 0.0:
         # If 'PRECURSORMZ' value is less than or equal to 0.0, return True indicating that the value needs to be recalculated.
         return True
     return False
@@ -1,6 +1,7 @@
 from rdkit.Chem.rdMolDescriptors import CalcMolFormula
 from rdkit.Chem.Descriptors import ExactMolWt, MolWt
 from rdkit import RDLogger, Chem
+from scripts.peak_arrays import *
 import scripts.deletion_report
 import scripts.globals_vars
 import pandas as pd
@@ -91,7 +92,7 @@ def map_transformations(row, unique_transforms):
 
 
 def mols_derivation_and_calculation(CONCATENATE_DF, output_directory, progress_callback=None, total_items_callback=None,
-                                    prefix_callback=None, item_type_callback=None):
+                                    prefix_callback=None, item_type_callback=None, written_files=None):
     """
     Derives and calculates molecular properties based on unique INCHI and SMILES in the given DataFrame with progress reporting using callbacks.
 
@@ -100,6 +101,8 @@ def mols_derivation_and_calculation(CONCATENATE_DF, output_directory, progress_c
     :param total_items_callback: A function to set the total number of items to process.
     :param prefix_callback: A function to dynamically set the prefix for the operation (if needed).
     :param item_type_callback: A function to specify the type of items (e.g., "molecules").
+    :param written_files: A set of the deletion files already written during this run, appended to instead of
+                          being overwritten (streaming mode). Updated in place.
     :return: Tuple where the first element is the filtered DataFrame with calculated properties,
              and the second element is another DataFrame with dropped rows.
     """
@@ -167,6 +170,7 @@ def mols_derivation_and_calculation(CONCATENATE_DF, output_directory, progress_c
     rows_to_drop = CONCATENATE_DF[CONCATENATE_DF[critical_columns].isnull().any(axis=1)]  # Rows to drop
     CONCATENATE_DF = CONCATENATE_DF.dropna(subset=critical_columns)  # Filtered DataFrame
 
+    rows_to_drop = format_peaks_column(rows_to_drop, "\n")
     rows_to_drop['DELETION_REASON'] = "spectrum deleted because it has neither inchi nor smiles nor inchikey, even after re calculation"
 
     # Step 6: Write dropped rows to a CSV file
@@ -177,7 +181,13 @@ def mols_derivation_and_calculation(CONCATENATE_DF, output_directory, progress_c
     deleted_file_path = os.path.join(deletion_dir, "deleted_no_inchi_smiles_inchikey_after_re_calculation.csv")
 
     # Write the rows_to_drop DataFrame to the CSV file
-    rows_to_drop.to_csv(deleted_file_path, index=False, sep='\t', encoding='utf-8')
+    if written_files is not None and deleted_file_path in written_files:
+        # Append without headers, the file was already written during this run
+        rows_to_drop.to_csv(deleted_file_path, mode='a', index=False, sep='\t', encoding='utf-8', header=False)
+    else:
+        rows_to_drop.to_csv(deleted_file_path, index=False, sep='\t', encoding='utf-8')
+        if written_files is not None:
+            written_files.add(deleted_file_path)
 
     del rows_to_drop
 
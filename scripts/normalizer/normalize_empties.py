@@ -12,7 +12,8 @@ def normalize_empties(metadata_dict):
     for k, v in metadata_dict.items():  # traversing all items (key-value pairs) in the dictionary
 
         if isinstance(v, str):  # if the value is a string
-            if re.fullmatch(scripts.globals_vars.empty_pattern, v):  # if the value matches the 'empty_pattern' regex
+            # if the value matches the 'empty_pattern' regex (tested only for the values starting like an empty value)
+            if (not v or v[0] in scripts.globals_vars.EMPTY_VALUE_FIRST_CHARACTERS) and scripts.globals_vars.empty_pattern.fullmatch(v):
                 metadata_dict[k] = ''  # replace value in dictionary with empty string
 
         # if the value is a float or numpy float and is NaN,
@@ -1,41 +1,68 @@
+from scripts.GUI.utils.global_vars import parameters_dict
+import scripts.global_report
 import scripts.globals_vars
+import threading
 import json
 import re
 
+# Default maximum number of entries of the instrument resolution cache (parameters_dict["instrument_cache_max_entries"],
+# 0 disables the cache)
+DEFAULT_INSTRUMENT_CACHE_MAX_ENTRIES = 100000
 
-def clean_instrument(instrument):
-    """
-    Clean the instrument name string by removing specific prefixes and modifying the format.
-    :param instrument: The instrument name string to be cleaned.
-    :return: The cleaned instrument name string.
-    """
-    # Replace "-tof" with "tof" in instrument name
-    instrument = re.sub("-tof", "tof", instrument)
+global instrument_matchers
+# Compiled matchers of the nodes of the instrument tree {tuple of the node path: matcher}, built at first use
+instrument_matchers = {}
 
-    # Replace "q-" with "q" in instrument name
-    instrument = re.sub("q-", "q", instrument)
+global instrument_resolution_cache
+# Dictionary {cleaned instrument infos: resolved instrument or None}, from the least to the most recently used entry.
+# One cache per process, shared by its threads and kept between the chunks and the batches of the run.
+instrument_resolution_cache = {}
 
-    # Replace "q exactive" with " qexactive " in instrument name
-    instrument = re.sub("q exactive", " qexactive ", instrument)
+# The cache and its statistics are updated by the worker threads
+instrument_cache_lock = threading.Lock()
 
-    # Replace "applied biosystems" with " sciex " in instrument name
-    instrument = re.sub("applied biosystems", " sciex ", instrument)
 
-    # Replace " ab " with " sciex " in instrument name
-    instrument = re.sub(" ab ", " sciex ", instrument)
+# Rules of the cleaning of the instrument information, applied in order: (literal, replacement, regex or None). A rule
+# without regex replaces its literal pattern with str.replace, a regex rule is only applied when its literal part is in
+# the text. Each rule is applied to the result of the previous ones, like the successive re.sub they replace.
+COMMENT_CLEANING_RULES = [("-tof", "tof", None),  # Replace "-tof" with "tof"
+                          ("q-", "q", None),  # Replace "q-" with "q"
+                          ("-", " ", None),  # Replace the hyphens with spaces
+                          ("q exactive", " qexactive ", None),  # Replace "q exactive" with " qexactive "
+                          ("applied biosystems", " sciex ", None),  # Replace "applied biosystems" with " sciex "
+                          (" ab ", " sciex ", None),  # Replace " ab " with " sciex "
+                          ("sciex", " sciex ", None),  # Add spaces around "sciex"
+                          ("triple", " qqq ", scripts.globals_vars.triple_tof_pattern),  # Replace "triple(-| )?tof" with " qqq "
+                          ("triple", " qqq ", scripts.globals_vars.triple_quad_pattern),  # Replace "triple(-| )?quad" with " qqq "
+                          (" uplc ", " ", scripts.globals_vars.uplc_pattern)]  # Remove "... uplc ..."
 
-    # Add spaces around "sciex" in instrument name
-    instrument = re.sub("sciex", " sciex ", instrument)
+# The hyphens of the instrument names are kept
+INSTRUMENT_CLEANING_RULES = [rule for rule in COMMENT_CLEANING_RULES if rule[0] != "-"]
 
-    # Replace "triple(-| )?tof" or "triple(-| )?tof" with " qqq " in instrument name
-    instrument = re.sub("triple(-| )?tof", " qqq ", instrument)
-    instrument = re.sub("triple(-| )?quad", " qqq ", instrument)
 
-    # Remove "... uplc ..." from instrument name
-    instrument = re.sub("... uplc ...", " ", instrument)
+def apply_cleaning_rules(text, cleaning_rules):
+    """
+    Applies a table of cleaning rules to a text, in order.
+    :param text: The text to be cleaned.
+    :param cleaning_rules: A list of (literal, replacement, regex or None) rules, see COMMENT_CLEANING_RULES.
+    :return: The cleaned text.
+    """
+    for literal, replacement, pattern in cleaning_rules:
+        # Most rules do not apply to a given text, the literal test skips them
+        if literal in text:
+            text = text.replace(literal, replacement) if pattern is None else pattern.sub(replacement, text)
 
-    # Return the cleaned instrument name
-    return instrument
+    return text
+
+
+def clean_instrument(instrument):
+    """
+    Clean the instrument name string by removing specific prefixes and modifying the format.
+    :param instrument: The instrument name string to be cleaned.
+    :return: The cleaned instrument name string.
+    """
+    # Apply the cleaning rules of the instrument names (INSTRUMENT_CLEANING_RULES)
+    return apply_cleaning_rules(instrument, INSTRUMENT_CLEANING_RULES)
 
 
 def clean_instrument_type(instrument_type):
@@ -46,41 +73,8 @@ def clean_instrument_type(instrument_type):
     :return: The cleaned instrument string.
     :rtype: str
     """
-    # If the given instrument type string contains "-tof", this line replaces
-    # it with "tof"
-    instrument_type = re.sub("-tof", "tof", instrument_type)
-
-    # If the given instrument type string contains "q-", this line replaces
-    # it with "q"
-    instrument_type = re.sub("q-", "q", instrument_type)
-
-    # Replaces all hyphen characters in the instrument type string with spaces
-    instrument_type = re.sub("-", " ", instrument_type)
-
-    # If the given instrument type string contains "q exactive", this line
-    # replaces it with "qexactive"
-    instrument_type = re.sub("q exactive", " qexactive ", instrument_type)
-
-    # If the given instrument type string contains "applied biosystems",
-    # this line replaces it with "sciex"
-    instrument_type = re.sub("applied biosystems", " sciex ", instrument_type)
-
-    # If the given instrument type string contains " ab ", this line replaces
-    # it with "sciex"
-    instrument_type = re.sub(" ab ", " sciex ", instrument_type)
-
-    # Surrounds "sciex" in the instrument type string with spaces, if not surrounded yet.
-    instrument_type = re.sub("sciex", " sciex ", instrument_type)
-
-    # If the given instrument type string contains "triple(-| )?tof" or
-    # "triple(-| )?quad", this line replaces it with "qqq"
-    instrument_type = re.sub("triple(-| )?tof", " qqq ", instrument_type)
-    instrument_type = re.sub("triple(-| )?quad", " qqq ", instrument_type)
-
-    # If the given instrument type string contains "... uplc ...", this line removes it
-    instrument_type = re.sub("... uplc ...", " ", instrument_type)
-
-    return instrument_type
+    # Apply the cleaning rules of the comments, the hyphens are replaced by spaces (COMMENT_CLEANING_RULES)
+    return apply_cleaning_rules(instrument_type, COMMENT_CLEANING_RULES)
 
 
 def clean_comment(comment):
@@ -91,37 +85,8 @@ def clean_comment(comment):
     :return: The cleaned comment.
     :rtype: str
     """
-
-    # Replaces "-tof" with "tof" in the comment string
-    comment = re.sub("-tof", "tof", comment)
-
-    # Replaces "q-" with "q" in the comment string
-    comment = re.sub("q-", "q", comment)
-
-    # Replaces "-" (hyphen) with " " (space) in the comment string
-    comment = re.sub("-", " ", comment)
-
-    # Replaces "q exactive" with " qexactive " in the comment string
-    comment = re.sub("q exactive", " qexactive ", comment)
-
-    # Replaces "applied biosystems" with " sciex " in the comment string
-    comment = re.sub("applied biosystems", " sciex ", comment)
-
-    # Replaces " ab " with " sciex " in the comment string
-    comment = re.sub(" ab ", " sciex ", comment)
-
-    # Surrounds "sciex" in the comment string with spaces, if not surrounded yet
-    comment = re.sub("sciex", " sciex ", comment)
-
-    # Replaces "triple(-| )?tof" or "triple(-| )?quad" with " qqq " in the comment string
-    comment = re.sub("triple(-| )?tof", " qqq ", comment)
-    comment = re.sub("triple(-| )?quad", " qqq ", comment)
-
-    # Removes "... uplc ..." from the comment string
-    comment = re.sub("... uplc ...", " ", comment)
-
-    # Returns the cleaned comment string
-    return comment
+    # Apply the cleaning rules of the comments (COMMENT_CLEANING_RULES)
+    return apply_cleaning_rules(comment, COMMENT_CLEANING_RULES)
 
 
 def clean_spectrum_instrument_info(metadata_dict):
@@ -144,12 +109,104 @@ def clean_spectrum_instrument_info(metadata_dict):
     instrument_infos = instrument + " " + instrument_type + " " + comment
 
     # remove any non-word, non-whitespace, and non-hyphen characters, and strip leading/trailing whitespaces
-    instrument_infos = re.sub(r'[^-\w\s]', ' ', instrument_infos)
+    instrument_infos = scripts.globals_vars.instrument_infos_forbidden_characters_pattern.sub(' ', instrument_infos)
     instrument_infos = ' '.join(instrument_infos.split()).strip()
 
     return instrument_infos
 
 
+def get_instrument_matcher(node_path):
+    """
+    Returns the compiled matcher of the keys of a node of the instrument tree, built at the first search in this node.
+    The matcher is a single regex: a lookahead of the alternation of all the keys of the node between word boundaries
+    (or the start or the end), in the order of the tree, capturing the text of the key matched at each position.
+    :param node_path: The keys leading to the node, from the root of the instrument tree.
+    :return: A tuple (regex or None if the node has no key, keys, {literal key: priority},
+    [(priority, compiled key) of the keys which are regex patterns], complete) where complete is False if a key of the
+    node is not a valid regex (the keys after it are not searched).
+    """
+    node_key = tuple(node_path)
+
+    matcher = instrument_matchers.get(node_key)
+    if matcher is not None:
+        return matcher
+
+    # Walk down to the node (raises KeyError for a 'not found' key missing from the tree)
+    node = scripts.globals_vars.instrument_tree
+    for key in node_key:
+        node = node[key]
+
+    keys = []
+    literal_priorities = {}
+    pattern_keys = []
+    complete = True
+
+    for priority, key in enumerate(node.keys()):
+        # The keys are regex patterns, an invalid one stops the search at this key
+        try:
+            compiled_key = re.compile(rf"(\b|^|$){key}(\b|^|$)")
+        except re.error:
+            complete = False
+            break
+
+        keys.append(key)
+
+        if scripts.globals_vars.regex_metacharacters_pattern.search(key):
+            pattern_keys.append((priority, re.compile(key)))
+        else:
+            literal_priorities.setdefault(key, priority)
+
+    regex = re.compile(rf"(?=(?:\b|^|$)({'|'.join(keys)})(?:\b|^|$))") if keys else None
+
+    matcher = (regex, keys, literal_priorities, pattern_keys, complete)
+    instrument_matchers[node_key] = matcher
+
+    return matcher
+
+
+def search_instrument_tree(node_path, instrument_infos):
+    """
+    Searches the keys of a node of the instrument tree in instrument_infos, in one scan of the string. The key
+    returned is the first key, in the order of the tree, found between word boundaries (or the start or the end) of
+    instrument_infos.
+    :param node_path: The keys leading to the node, from the root of the instrument tree.
+    :param instrument_infos: A string containing information about the instrument.
+    :return: The key found, or 'not found'.
+    """
+    regex, keys, literal_priorities, pattern_keys, complete = get_instrument_matcher(node_path)
+
+    best_priority = len(keys)
+
+    if regex is not None:
+        # At each position the alternation matches the first key of the node found there, keep the first one overall
+        for match in regex.finditer(instrument_infos):
+            text = match.group(1)
+
+            # The text of a literal key is the key itself, a regex key is the first one matching the whole text
+            priority = literal_priorities.get(text, best_priority)
+            for pattern_priority, compiled_key in pattern_keys:
+                if pattern_priority >= priority:
+                    break
+                if compiled_key.fullmatch(text):
+                    priority = pattern_priority
+                    break
+
+            best_priority = min(best_priority, priority)
+
+            # The first key of the node can not be beaten
+            if best_priority == 0:
+                break
+
+    if best_priority < len(keys):
+        return keys[best_priority]
+
+    # The search did not go past an invalid key
+    if not complete:
+        raise re.error(f"invalid instrument tree key in {list(node_path)}")
+
+    return 'not found'
+
+
 def search_for_brand(tree_path, instrument_infos):
     """
     Searches for a brand in instrument_infos and appends the found brand or 'unknown' to the tree_path.
@@ -160,17 +217,9 @@ def search_for_brand(tree_path, instrument_infos):
 
     # try to execute the following instruction
     try:
-        # For each key in the instrument tree dictionary
-        for key in scripts.globals_vars.instrument_tree.keys():
-            # If the key (brand) is found in the instrument_infos string
-            if re.search(rf"(\b|^|$){key}(\b|^|$)", instrument_infos):
-                # Append the found key (brand) to the tree_path list
-                tree_path.append(key)
-                # Return the updated tree_path list
-                return tree_path
-        # If no brand key is found, append 'unknown' to the tree_path list
-        tree_path.append('not found')
-        # Return the updated tree_path list with 'unknown' appended
+        # Append the first brand of the instrument tree found in the instrument_infos string, or 'not found'
+        tree_path.append(search_instrument_tree([], instrument_infos))
+        # Return the updated tree_path list
         return tree_path
     # If the try block throws an exception, return None
     except:
@@ -187,18 +236,9 @@ def search_for_model(tree_path, instrument_infos):
 
     # Start by assuming no exception will occur
     try:
-        # Loop through the keys present in the first level of instrument_tree dictionary
-        for key in scripts.globals_vars.instrument_tree[tree_path[0]].keys():
-            # Using a regular expression, search for the key in instrument_infos.
-            # rf"(\b){key}(\b)" is a pattern that matches the key surrounded by word boundaries to avoid partial matches.
-            if re.search(rf"(\b|^|$){key}(\b|^|$)", instrument_infos):
-                # If a match is found, append the key to the tree_path list
-                tree_path.append(key)
-                # Return the updated tree_path
-                return tree_path
-
-        # If no match is found after the loop, append 'unknown' to the tree_path list
-        tree_path.append('not found')
+        # Search the keys of the brand node for a key surrounded by word boundaries in instrument_infos,
+        # append the found key (or 'not found') to the tree_path list
+        tree_path.append(search_instrument_tree(tree_path[:1], instrument_infos))
 
         # Return the updated tree_path
         return tree_path
@@ -223,11 +263,7 @@ def search_for_spectrum_type(tree_path, instrument_infos):
     :return: The tree_path List with found spectrum type appended, or 'unknown' if not found. None if an exception occurred.
     """
     try:  # Try to execute the following block of code
-        for key in scripts.globals_vars.instrument_tree[tree_path[0]][tree_path[1]].keys():  # This block of code iterates over each key found in the 2nd depth of the dictionary
-            if re.search(rf"(\b|^|$){key}(\b|^|$)", instrument_infos):  # If the key is found in the instrument data string
-                tree_path.append(key)  # Then append the found key value to the tree path
-                return tree_path  # Return the updated tree path
-        tree_path.append('not found')  # If the key is not found in the instrument data string, append 'unknown' to the tree path
+        tree_path.append(search_instrument_tree(tree_path[:2], instrument_infos))  # Append the key of the 2nd depth of the dictionary found in the instrument data string, or 'not found'
         return tree_path  # Return the updated tree path
     except:  # If any error occur while executing the above block of code
         return None  # Return None
@@ -247,18 +283,9 @@ def search_for_instrument_type(tree_path, instrument_infos):
     # If there is any error occurs, it will return None
     try:
 
-        # Loop through the keys in the instrument tree at the provided tree path
-        for key in scripts.globals_vars.instrument_tree[tree_path[0]][tree_path[1]][tree_path[2]].keys():
-
-            # Use regex to find if the current key exists in instrument_infos
-            # If it does, append it to the tree_path and return the updated tree_path
-            if re.search(rf"(\b|^|$){key}(\b|^|$)", instrument_infos):
-                tree_path.append(key)
-                return tree_path
-
-        # If we've looped through every key and haven't returned,
-        # append 'unknown' to the tree_path and return the updated tree_path
-        tree_path.append('not found')
+        # Search the keys of the instrument tree at the provided tree path in instrument_infos,
+        # append the found key (or 'not found') to the tree_path and return the updated tree_path
+        tree_path.append(search_instrument_tree(tree_path[:3], instrument_infos))
         return tree_path
 
     except:
@@ -276,14 +303,9 @@ def search_for_ionisation(tree_path, instrument_infos):
     If no matching key is found, 'unknown' is appended to the tree_path and returned.
     """
     try:
-        # Iterating over keys in the instrument tree at the specified path
-        for key in scripts.globals_vars.instrument_tree[tree_path[0]][tree_path[1]][tree_path[2]][tree_path[3]].keys():
-            # If the key is present in instrument_infos, append it to the path and return
-            if re.search(rf"(\b|^|$){key}(\b|^|$)", instrument_infos):
-                tree_path.append(key)
-                return tree_path
-        # If no match found, append 'unknown' to the path and return
-        tree_path.append('not found')
+        # Search the keys of the instrument tree at the specified path in instrument_infos,
+        # append the found key (or 'not found') to the path and return
+        tree_path.append(search_instrument_tree(tree_path[:4], instrument_infos))
         return tree_path
     except:
         # If anything goes wrong, return None
@@ -361,29 +383,20 @@ def make_tree_path(instrument_infos):
     return tree_path
 
 
-def normalize_instruments_and_resolution(metadata_dict):
+def resolve_instrument(instrument_infos):
     """
-    This function retrieves the instrument and resolution information from the provided
-    metadata dictionary, modifies them and updates the dictionary with the adjusted values.
-
-    :param metadata_dict: A dictionary containing metadata information. It should have
-    the keys "INSTRUMENT", "INSTRUMENTTYPE", and "RESOLUTION". These are the keys which will be
-    modified by this method.
-    :return: The modified metadata_dict dictionary.
+    Resolves the instrument, instrument type, resolution and ionization of cleaned instrument information, by walking
+    the instrument tree.
+    :param instrument_infos: The cleaned instrument information, between '. ' and ' .'.
+    :return: A tuple (instrument, instrument type, resolution, ionization or None), or None if the instrument is not
+    found in the instrument tree.
     """
-
-    # Get the cleaned instrument information for the given metadata
-    instrument_infos = clean_spectrum_instrument_info(metadata_dict)
-
-    # Ensur academia usage of the instrument information (additional information between '.')
-    instrument_infos = f". {instrument_infos} ."
-
     # Generate path in the instrument catalogue by using instrument information
     tree_path = make_tree_path(instrument_infos)
 
-    # If no path was found in the catalogue, return the metadata unaltered
+    # If no path was found in the catalogue, the instrument is not resolved
     if not tree_path:
-        return metadata_dict
+        return None
 
     # Try to retrieve the instrument's resolution and specific solution
     try:
@@ -396,17 +409,127 @@ def normalize_instruments_and_resolution(metadata_dict):
         # Split the solution string into separate components
         solution = solution.split(',')
     except:
-        # If an error occurred during retrieval, return the metadata unaltered
+        # If an error occurred during retrieval, the instrument is not resolved
+        return None
+
+    # If the instrument type contains the ionisation method, separate it to place it in its own field
+    ionization = solution[1].split('-')[1].strip() if len(solution[1].split('-')) >= 2 else None
+
+    return solution[0].strip(), solution[1].strip(), solution[2].strip(), ionization
+
+
+def get_instrument_cache_max_entries():
+    """
+    Returns the maximum number of entries of the instrument resolution cache selected in
+    parameters_dict["instrument_cache_max_entries"].
+    :return: The maximum number of entries (0 when the cache is disabled).
+    """
+    return max(0, int(parameters_dict.get("instrument_cache_max_entries", DEFAULT_INSTRUMENT_CACHE_MAX_ENTRIES)))
+
+
+def lookup_instrument_resolution(instrument_infos):
+    """
+    Returns the resolved instrument of cleaned instrument information from the instrument resolution cache, resolving
+    it with the instrument tree on a cache miss. The least recently used entries are evicted beyond
+    parameters_dict["instrument_cache_max_entries"].
+    :param instrument_infos: The cleaned instrument information, between '. ' and ' .'.
+    :return: The resolved instrument, see resolve_instrument.
+    """
+    max_entries = get_instrument_cache_max_entries()
+
+    if max_entries == 0:
+        return resolve_instrument(instrument_infos)
+
+    with instrument_cache_lock:
+        if instrument_infos in instrument_resolution_cache:
+            # Pop and re-insert the entry to move it to the end (most recently used)
+            resolved_instrument = instrument_resolution_cache.pop(instrument_infos)
+            instrument_resolution_cache[instrument_infos] = resolved_instrument
+            scripts.global_report.instrument_cache_hits += 1
+            return resolved_instrument
+
+    resolved_instrument = resolve_instrument(instrument_infos)
+
+    with instrument_cache_lock:
+        scripts.global_report.instrument_cache_misses += 1
+        instrument_resolution_cache[instrument_infos] = resolved_instrument
+
+        # Size-bounded eviction: drop the least recently used entries
+        while len(instrument_resolution_cache) > max_entries:
+            del instrument_resolution_cache[next(iter(instrument_resolution_cache))]
+
+    return resolved_instrument
+
+
+def record_repeated_instrument_lookups(repeated_spectra):
+    """
+    Counts cache hits for the spectra whose instrument information was resolved once for a group of spectra with the
+    same values (batch normalization, see values_normalizer.normalize_columns). Normalized spectrum by spectrum, each of
+    these spectra would have found the entry just resolved for the group in the cache, so the statistics count spectra
+    in both modes.
+    :param repeated_spectra: The number of spectra of the groups, minus one per group.
+    :return: None
+    """
+    if get_instrument_cache_max_entries() == 0:
+        return
+
+    with instrument_cache_lock:
+        scripts.global_report.instrument_cache_hits += repeated_spectra
+
+
+def reset_instrument_cache_statistics():
+    """
+    Resets the hit and miss counters of the instrument resolution cache, at the start of a run. The cached entries
+    are kept, they do not depend on the run.
+    :return: None
+    """
+    scripts.global_report.instrument_cache_hits = 0
+    scripts.global_report.instrument_cache_misses = 0
+
+
+def instrument_cache_report():
+    """
+    Formats the statistics of the instrument resolution cache over the run, for the deletion report.
+    :return: The statistics message.
+    """
+    hits = scripts.global_report.instrument_cache_hits
+    lookups = hits + scripts.global_report.instrument_cache_misses
+    hit_rate = 100 * hits / lookups if lookups else 0.0
+
+    return f"instrument cache: {hits} hits / {lookups} lookups ({hit_rate:.1f} %)"
+
+
+def normalize_instruments_and_resolution(metadata_dict):
+    """
+    This function retrieves the instrument and resolution information from the provided
+    metadata dictionary, modifies them and updates the dictionary with the adjusted values.
+    The instrument resolved for each distinct instrument information is cached (lookup_instrument_resolution).
+
+    :param metadata_dict: A dictionary containing metadata information. It should have
+    the keys "INSTRUMENT", "INSTRUMENTTYPE", and "RESOLUTION". These are the keys which will be
+    modified by this method.
+    :return: The modified metadata_dict dictionary.
+    """
+
+    # Get the cleaned instrument information for the given metadata
+    instrument_infos = clean_spectrum_instrument_info(metadata_dict)
+
+    # Ensur academia usage of the instrument information (additional information between '.')
+    instrument_infos = f". {instrument_infos} ."
+
+    # Resolve the instrument in the instrument catalogue, or reuse the resolution of the same instrument information
+    resolved_instrument = lookup_instrument_resolution(instrument_infos)
+
+    # If the instrument was not resolved, return the metadata unaltered
+    if resolved_instrument is None:
         return metadata_dict
 
     # Update the metadata dictionary with the retrieved solution
-    metadata_dict["INSTRUMENT"] = solution[0].strip()
-    metadata_dict["INSTRUMENTTYPE"] = solution[1].strip()
-    metadata_dict["RESOLUTION"] = solution[2].strip()
+    metadata_dict["INSTRUMENT"], metadata_dict["INSTRUMENTTYPE"], metadata_dict["RESOLUTION"], ionization = resolved_instrument
 
-    # If the instrument type contains the ionisation method, separate it and place it in its own field
-    if len(solution[1].split('-')) >= 2:
-        metadata_dict["IONIZATION"] = solution[1].split('-')[1].strip()
+    # If the instrument type contains the ionisation method, place it in its own field
+    if ionization is not None:
+        metadata_dict["IONIZATION"] = ionization
 
     # Return the updated metadata dictionary
     return metadata_dict
@@ -0,0 +1,32 @@
+import scripts.globals_vars
+import functools
+
+# Number of distinct values whose check result is kept, the same values are checked by several normalizers of a
+# spectrum and by the spectrum cleaning
+SHARED_CHECKS_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=SHARED_CHECKS_CACHE_SIZE)
+def float_check_value(value):
+    """
+    Returns the first floating number of a text value (group 1 of float_check_pattern), shared by the checks of
+    PRECURSORMZ and ENTROPY so that the regex runs once per value.
+
+    :param value: The text value (str() of the field).
+    :return: The matched number (as written, "," decimal separator kept), or None if the value contains no number.
+    """
+    match = scripts.globals_vars.float_check_pattern.search(value)
+
+    return match.group(1) if match else None
+
+
+@functools.lru_cache(maxsize=SHARED_CHECKS_CACHE_SIZE)
+def is_gc_instrument_type(instrument_type):
+    """
+    Checks whether an instrument type is a GC instrument ("GC" as a word), shared by the adduct check and the spectrum
+    cleaning.
+
+    :param instrument_type: The INSTRUMENTTYPE value.
+    :return: True if the instrument type contains the word "GC".
+    """
+    return scripts.globals_vars.gc_instrument_type_pattern.search(instrument_type) is not None
@@ -1,3 +1,4 @@
+from scripts.GUI.utils.global_vars import parameters_dict
 from scripts.normalizer.normalize_instruments_and_resolution import *
 from scripts.normalizer.missing_precursormz_re_calculation import *
 from scripts.normalizer.delete_no_smiles_no_inchi import *
@@ -10,55 +11,252 @@ from scripts.normalizer.normalize_ms_level import *
 from scripts.normalizer.normalize_empties import *
 from scripts.normalizer.normalize_ionmode import *
 from scripts.normalizer.normalize_adduct import *
+import scripts.global_report
+import pandas as pd
+import numpy as np
+import threading
+import operator
+import time
+
+# Normalizers of the metadata of a spectrum, applied in this order by normalize_values. Each normalizer takes the
+# metadata dictionary and returns it, or None when the spectrum is deleted (the next normalizers are skipped).
+VALUES_NORMALIZERS = [normalize_empties,  # Replace any missing or 'NaN' values with appropriate values
+                      repair_mol_descriptors,  # Repair molecular descriptors in the metadata
+                      delete_no_smiles_no_inchi_no_inchikey,  # Delete the spectra without SMILES, INCHI and INCHIKEY
+                      normalize_ionization,  # Normalize Ionization in the metadata
+                      normalize_instruments_and_resolution,  # Normalize the instruments and resolution data
+                      normalize_adduct,  # Normalize adduct data in the metadata
+                      missing_precursormz_re_calculation,  # Recalculate the missing or invalid PRECURSORMZ
+                      normalize_ionmode,  # Normalize the ion mode, from long form to short standardized form
+                      normalize_predicted,  # Normalize the predicted value in the metadata
+                      check_for_bad_adduct,  # Check if adduct in pos is really pos (exemple)
+                      normalize_ms_level,  # Normalize MS level
+                      normalize_retentiontime]  # Normalize Retention Time, which can be represented in different units
+
+# Normalizers of VALUES_NORMALIZERS which only read and write some fields of the spectrum, applied column-wise by
+# normalize_values_batch: {normalizer: fields read and written together (None for each field of the spectra on its
+# own)}. The other normalizers depend on the whole spectrum or delete spectra, they are applied spectrum by spectrum.
+COLUMN_NORMALIZERS = {normalize_empties: None,
+                      repair_mol_descriptors: ("SMILES", "INCHI", "INCHIKEY"),
+                      normalize_ionization: ("IONIZATION", "INSTRUMENTTYPE"),
+                      normalize_instruments_and_resolution: ("INSTRUMENT", "INSTRUMENTTYPE", "COMMENT", "RESOLUTION", "IONIZATION"),
+                      normalize_adduct: ("INSTRUMENTTYPE", "PRECURSORTYPE"),
+                      normalize_ionmode: ("IONMODE",),
+                      normalize_predicted: ("COMMENT", "PREDICTED", "FILENAME", "NAME"),
+                      normalize_ms_level: ("MSLEVEL",),
+                      normalize_retentiontime: ("RT",)}
+
+# Column normalizers counting statistics per spectrum: {normalizer: function called with the number of spectra which
+# were not normalized on their own (the spectra of each group minus one)}
+COLUMN_NORMALIZER_REPEATS = {normalize_instruments_and_resolution: record_repeated_instrument_lookups}
+
+# The timings of the normalizers are updated by the worker threads
+normalizer_timings_lock = threading.Lock()
 
 
 def normalize_values(metadata_dict):
     """
     This function takes in a metadata dictionary and applies numerous normalization functions on it to standardize its values.
+    The normalizers of VALUES_NORMALIZERS are applied in one pass. When parameters_dict["normalizers_timing"] is 1.0,
+    the time spent in each normalizer is recorded (see normalize_values_timed).
 
     :param metadata_dict: A dictionary containing metadata information.
-    :return: The normalized metadata dictionary.
+    :return: The normalized metadata dictionary, or None if the spectrum was deleted.
     """
-    # Replace any missing or 'NaN' values with appropriate values
-    metadata_dict = normalize_empties(metadata_dict)
+    if parameters_dict.get("normalizers_timing", 0.0) == 1.0:
+        return normalize_values_timed(metadata_dict)
+
+    for normalizer in VALUES_NORMALIZERS:
+        metadata_dict = normalizer(metadata_dict)
+
+        # The spectrum was deleted by this normalizer
+        if not metadata_dict:
+            break
+
+    return metadata_dict
 
-    # Repair molecular descriptors in the metadata
-    metadata_dict = repair_mol_descriptors(metadata_dict)
 
-    # If both 'SMILES' and 'INCHI' keys in the dictionary
-    # do not exist (have NaN values), we delete the dictionary.
-    metadata_dict = delete_no_smiles_no_inchi_no_inchikey(metadata_dict)
+def normalize_values_timed(metadata_dict):
+    """
+    Same as normalize_values, recording the number of calls and the cumulative time of each normalizer in
+    scripts.global_report.normalizer_calls and scripts.global_report.normalizer_seconds.
 
-    # If after the above operations the metadata_dict is not empty continue with the normalization
-    if metadata_dict:
-        # Normalize Ionization in the metadata
-        metadata_dict = normalize_ionization(metadata_dict)
+    :param metadata_dict: A dictionary containing metadata information.
+    :return: The normalized metadata dictionary, or None if the spectrum was deleted.
+    """
+    for normalizer in VALUES_NORMALIZERS:
+        start_time = time.perf_counter()
+        metadata_dict = normalizer(metadata_dict)
+        elapsed_time = time.perf_counter() - start_time
 
-        # Normalize the instruments and resolution data in the metadata
-        metadata_dict = normalize_instruments_and_resolution(metadata_dict)
+        record_normalizer_time(normalizer.__name__, 1, elapsed_time)
 
-        # Normalize adduct data in the metadata
-        metadata_dict = normalize_adduct(metadata_dict)
+        # The spectrum was deleted by this normalizer
+        if not metadata_dict:
+            break
 
-        # If 'PRECURSORMZ' key does not exist in the metadata_dict
-        # or no recalculation is needed, perform recalculation
-        metadata_dict = missing_precursormz_re_calculation(metadata_dict)
+    return metadata_dict
 
-        # Normalize the ion mode in the metadata, from long form to short standardized form
-        metadata_dict = normalize_ionmode(metadata_dict)
 
-        # Normalize the predicted value in the metadata
-        metadata_dict = normalize_predicted(metadata_dict)
 
-        # ckeck if adduct in pos is really pos (exemple)
-        metadata_dict = check_for_bad_adduct(metadata_dict)
+def record_normalizer_time(name, calls, elapsed_time):
+    """
+    Adds calls and time to the timings of a normalizer (parameters_dict["normalizers_timing"]).
 
-        if metadata_dict:
+    :param name: The name of the normalizer.
+    :param calls: The number of spectra normalized.
+    :param elapsed_time: The time spent, in seconds.
+    :return: None
+    """
+    with normalizer_timings_lock:
+        scripts.global_report.normalizer_calls[name] = scripts.global_report.normalizer_calls.get(name, 0) + calls
+        scripts.global_report.normalizer_seconds[name] = scripts.global_report.normalizer_seconds.get(name, 0.0) + elapsed_time
 
-            # Normalize MS level
-            metadata_dict = normalize_ms_level(metadata_dict)
 
-            # Normalize Retention Time in the metadata which can be represented in different units
-            metadata_dict = normalize_retentiontime(metadata_dict)
+def factorize_fields(metadata_list, fields):
+    """
+    Groups the spectra of a batch by the values of some fields, with pandas.factorize over the columns of the batch.
 
-    return metadata_dict
+    :param metadata_list: A list of metadata dictionaries.
+    :param fields: The fields.
+    :return: A tuple (group of each spectrum (numpy array), index of the first spectrum of each group), or None if a
+    value is not a string (the values are only grouped when they are compared like the per-spectrum normalizers do).
+    """
+    group_codes = None
+
+    for field in fields:
+        column = list(map(operator.itemgetter(field), metadata_list))
+        if set(map(type, column)) != {str}:
+            return None
+
+        codes, uniques = pd.factorize(np.array(column, dtype=object))
+
+        # Combine with the groups of the previous fields, renumbered to stay below the number of spectra
+        group_codes = codes if group_codes is None else pd.factorize(group_codes * len(uniques) + codes)[0]
+
+    _, first_indices, group_codes = np.unique(group_codes, return_index=True, return_inverse=True)
+
+    return group_codes, first_indices
+
+
+def normalize_columns(metadata_list, normalizer, fields):
+    """
+    Applies a column normalizer (COLUMN_NORMALIZERS) to a batch of spectra: the normalizer is called once per distinct
+    combination of values of its fields, on a dictionary of these fields only, and the normalized values are written to
+    all the spectra with these values.
+
+    :param metadata_list: A list of metadata dictionaries, updated in place.
+    :param normalizer: The normalizer.
+    :param fields: The fields read and written by the normalizer.
+    :return: The number of groups (calls of the normalizer).
+    """
+    groups = factorize_fields(metadata_list, fields)
+
+    # Values which are not strings: one group per spectrum
+    if groups is None:
+        group_codes, first_indices = np.arange(len(metadata_list)), np.arange(len(metadata_list))
+    else:
+        group_codes, first_indices = groups
+
+    # Normalized values of each group, only the fields changed by the normalizer are written back
+    group_changes = []
+    for index in first_indices.tolist():
+        values = {field: metadata_list[index][field] for field in fields}
+        normalized_dict = normalizer(dict(values))
+        group_changes.append([(field, normalized_dict[field]) for field in fields
+                              if not values_are_equal(values[field], normalized_dict[field])])
+
+    changed_groups = np.array([bool(changes) for changes in group_changes], dtype=bool)
+
+    for index in np.flatnonzero(changed_groups[group_codes]).tolist():
+        for field, value in group_changes[group_codes[index]]:
+            metadata_list[index][field] = value
+
+    return len(first_indices)
+
+
+def values_are_equal(value, normalized_value):
+    """
+    Checks whether a normalizer left a value unchanged (same object, or equal strings).
+
+    :param value: The value before the normalization.
+    :param normalized_value: The value after the normalization.
+    :return: True if the value does not need to be written back.
+    """
+    return value is normalized_value or (type(value) is str and type(normalized_value) is str and value == normalized_value)
+
+
+def normalize_values_batch(metadata_list):
+    """
+    Batch version of normalize_values: the normalizers of VALUES_NORMALIZERS are applied in the same order, each one to
+    all the spectra of the batch which are not deleted yet. The normalizers of COLUMN_NORMALIZERS are applied
+    column-wise (normalize_columns), the others spectrum by spectrum. The results are the same as normalize_values
+    applied to each spectrum.
+
+    :param metadata_list: A list of metadata dictionaries (updated in place).
+    :return: The list of the normalized metadata dictionaries, None for the deleted spectra.
+    """
+    results = list(metadata_list)
+    timing = parameters_dict.get("normalizers_timing", 0.0) == 1.0
+
+    for normalizer in VALUES_NORMALIZERS:
+        alive = [index for index, metadata_dict in enumerate(results) if metadata_dict]
+        if not alive:
+            break
+
+        start_time = time.perf_counter()
+
+        if normalizer in COLUMN_NORMALIZERS:
+            alive_list = [results[index] for index in alive]
+            fields = COLUMN_NORMALIZERS[normalizer]
+
+            if fields is not None:
+                groups = normalize_columns(alive_list, normalizer, fields)
+
+                # Statistics of the spectra of each group which were not normalized on their own
+                if normalizer in COLUMN_NORMALIZER_REPEATS:
+                    COLUMN_NORMALIZER_REPEATS[normalizer](len(alive_list) - groups)
+            else:
+                # Each field on its own, if all the spectra have the same fields
+                all_fields = tuple(alive_list[0])
+                if all(metadata_dict.keys() == alive_list[0].keys() for metadata_dict in alive_list):
+                    for field in all_fields:
+                        normalize_columns(alive_list, normalizer, (field,))
+                else:
+                    for metadata_dict in alive_list:
+                        normalizer(metadata_dict)
+        else:
+            for index in alive:
+                results[index] = normalizer(results[index])
+
+        if timing:
+            record_normalizer_time(normalizer.__name__, len(alive), time.perf_counter() - start_time)
+
+    return [metadata_dict if metadata_dict else None for metadata_dict in results]
+
+
+def reset_normalizer_timings():
+    """
+    Resets the timings of the normalizers, at the start of a run.
+
+    :return: None
+    """
+    scripts.global_report.normalizer_calls.clear()
+    scripts.global_report.normalizer_seconds.clear()
+
+
+def normalizer_timings_report():
+    """
+    Formats the timings of the normalizers over the run, from the slowest to the fastest normalizer.
+
+    :return: The timings message, or an empty string if no timing was recorded.
+    """
+    if not scripts.global_report.normalizer_calls:
+        return ""
+
+    lines = ["normalizers timing:"]
+    for name, seconds in sorted(scripts.global_report.normalizer_seconds.items(), key=lambda item: -item[1]):
+        calls = scripts.global_report.normalizer_calls.get(name, 0)
+        lines.append(f"    {name}: {seconds:.3f} s, {calls} spectra ({1e6 * seconds / max(calls, 1):.1f} us/spectrum)")
+
+    return "\n".join(lines)
@@ -0,0 +1,127 @@
+import numpy as np
+
+# Number of decimals of the m/z and intensity values of the output peak lists
+PEAK_DECIMALS = 8
+
+# Format of one peak of the output peak lists ("m/z intensity")
+PEAK_FORMAT = f"%.{PEAK_DECIMALS}f %.{PEAK_DECIMALS}f"
+
+global peak_list_templates
+# Format templates of the peak lists by (number of peaks, separator), built at first use
+peak_list_templates = {}
+
+
+def to_peak_array(peak_list_np):
+    """
+    Converts a cleaned peak list to the peak container used between the cleaning and the writers: a (n, 2) float64
+    NumPy array of [m/z, intensity] rows, rounded to PEAK_DECIMALS decimals like the output peak lists.
+
+    :param peak_list_np: The cleaned peak list (numpy array sorted by m/z).
+    :return: The peak array.
+    """
+    return np.ascontiguousarray(peak_list_np, dtype=np.float64).reshape(-1, 2).round(PEAK_DECIMALS)
+
+
+def as_peak_array(peaks):
+    """
+    Returns the peak array of a peak list, parsing it if it was given as text ("m/z intensity [annotation]" lines
+    separated by newlines or semicolons).
+
+    :param peaks: A peak array, a text peak list or a list of [m/z, intensity] pairs.
+    :return: The (n, 2) float64 peak array (empty if there is no peak).
+    """
+    if isinstance(peaks, np.ndarray):
+        return peaks
+
+    if isinstance(peaks, str):
+        separator = ';' if ';' in peaks else '\n'
+        peaks = [line.split()[:2] for line in peaks.strip().split(separator) if line.strip()]
+
+    if not isinstance(peaks, (list, tuple)) or len(peaks) == 0:
+        return np.empty((0, 2), dtype=np.float64)
+
+    return np.array(peaks, dtype=np.float64).reshape(-1, 2)
+
+
+def get_peak_list_template(n_peaks, separator):
+    """
+    Returns the format template of a peak list of n_peaks peaks, so that a whole peak list is formatted with a
+    single % operation.
+
+    :param n_peaks: The number of peaks.
+    :param separator: The separator of the peaks.
+    :return: The format template.
+    """
+    template = peak_list_templates.get((n_peaks, separator))
+
+    if template is None:
+        template = separator.join([PEAK_FORMAT] * n_peaks)
+        peak_list_templates[(n_peaks, separator)] = template
+
+    return template
+
+
+def pack_peak_arrays(peak_arrays):
+    """
+    Packs peak arrays into compressed sparse row buffers: the m/z and intensity values of all the peak lists in two
+    flat float64 buffers, and the offsets of each peak list in these buffers.
+
+    :param peak_arrays: A list of (n, 2) peak arrays.
+    :return: A tuple (mz, intensity, offsets) where the peaks of peak list i are at offsets[i]:offsets[i + 1].
+    """
+    offsets = np.zeros(len(peak_arrays) + 1, dtype=np.int64)
+
+    if not peak_arrays:
+        return np.empty(0, dtype=np.float64), np.empty(0, dtype=np.float64), offsets
+
+    np.cumsum([len(peaks) for peaks in peak_arrays], out=offsets[1:])
+
+    peaks = np.concatenate(peak_arrays).reshape(-1, 2)
+
+    return peaks[:, 0], peaks[:, 1], offsets
+
+
+def format_peak_lists(peak_lists, separator="\n"):
+    """
+    Formats peak lists to text ("m/z intensity" peaks with PEAK_DECIMALS decimals, joined by separator), as written
+    in the output files. The peak arrays are packed in compressed sparse row buffers and formatted in one pass.
+    Text peak lists (annotated by the de novo calculation) are only converted to the separator, other values are
+    returned unchanged.
+
+    :param peak_lists: An iterable of peak lists (peak arrays or text).
+    :param separator: The separator of the peaks ("\n" for MSP files, ";" for CSV files).
+    :return: The list of the formatted peak lists.
+    """
+    peak_lists = list(peak_lists)
+    formatted = list(peak_lists)
+
+    positions = [index for index, peaks in enumerate(peak_lists) if isinstance(peaks, np.ndarray)]
+
+    # Flat [m/z, intensity, m/z, intensity, ...] values of all the peak arrays
+    mz, intensity, offsets = pack_peak_arrays([peak_lists[index] for index in positions])
+    values = np.column_stack((mz, intensity)).ravel().tolist()
+
+    for index, start, end in zip(positions, offsets[:-1].tolist(), offsets[1:].tolist()):
+        formatted[index] = get_peak_list_template(end - start, separator) % tuple(values[2 * start:2 * end])
+
+    if separator != "\n":
+        for index, peaks in enumerate(peak_lists):
+            if isinstance(peaks, str):
+                formatted[index] = peaks.replace("\n", separator)
+
+    return formatted
+
+
+def format_peaks_column(df, separator="\n"):
+    """
+    Returns a copy of a DataFrame with its PEAKS_LIST column formatted to text (see format_peak_lists), for the
+    writers.
+
+    :param df: A DataFrame of spectra.
+    :param separator: The separator of the peaks.
+    :return: The DataFrame with text peak lists.
+    """
+    if 'PEAKS_LIST' not in df.columns or df.empty:
+        return df
+
+    return df.assign(PEAKS_LIST=format_peak_lists(df['PEAKS_LIST'], separator))
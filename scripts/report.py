@@ -277,6 +277,18 @@ def report(output_directory, POS_LC_df, POS_LC_In_Silico_df, POS_GC_df, POS_GC_I
     calculate_spectrum_number(POS_LC_df, POS_LC_In_Silico_df, POS_GC_df, POS_GC_In_Silico_df, NEG_LC_df, NEG_LC_In_Silico_df, NEG_GC_df, NEG_GC_In_Silico_df)
     calculate_unique_inchikeys(POS_LC_df, POS_LC_In_Silico_df, POS_GC_df, POS_GC_In_Silico_df, NEG_LC_df, NEG_LC_In_Silico_df, NEG_GC_df, NEG_GC_In_Silico_df)
 
+    # Write the formatted report to disk
+    write_report(output_directory)
+
+
+def write_report(output_directory):
+    """
+    Format the report from scripts.global_report.report_dict and scripts.deletion_report and write it to a file
+    named "report_<date>.txt" in the specified output directory.
+
+    :param output_directory: The directory where the report file will be written.
+    :return: None
+    """
     # Create the formatted report
     formated_report = format_report()
 
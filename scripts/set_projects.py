@@ -1,16 +1,25 @@
 from scripts.GUI.utils.global_vars import parameters_dict
-import json
 import os
 
-def remove_files(directory):
+# Files of the project output directory kept by reset_updates: the SPLASH cache only depends on the peak lists, not on
+# the update history
+RESET_KEPT_FILES = ("splash_cache.sqlite", "splash_cache.sqlite-journal")
+
+
+def remove_files(directory, kept_files=()):
     """
     Removes all files (except .gitkeep) in the given directory and its subdirectories.
+
+    :param directory: The directory to empty.
+    :param kept_files: Names of the files of the directory which are not removed.
     """
 
     for filename in os.listdir(directory):  # iterate through each file in the directory
         file_path = os.path.join(directory, filename)  # create a complete filepath
 
-        if os.path.isfile(file_path):  # if the path is a file
+        if filename in kept_files:  # if the file must be kept
+            continue
+        elif os.path.isfile(file_path):  # if the path is a file
             os.remove(file_path)  # remove the file
         elif os.path.isdir(file_path):  # if the path is a directory
             remove_files(file_path)  # call this function recursively to remove files in subdirectory
@@ -18,21 +27,22 @@ def remove_files(directory):
 
 def reset_updates(output_directory):
     """
-    Réinitialise les mises à jour en supprimant le fichier updates.json
-    et les fichiers de sortie existants.
+    Réinitialise les mises à jour en supprimant la base updates.sqlite (et l'ancien fichier updates.json)
+    et les fichiers de sortie existants. Le cache des SPLASH (splash_cache.sqlite) est conservé.
     """
-    json_update_path = os.path.join(output_directory, "updates.json")
     output_path = output_directory
 
     # --- CORRECTION ---
     # Au lieu de vider le fichier, on le supprime.
     # On vérifie d'abord s'il existe pour éviter une erreur si le fichier est déjà absent.
-    if os.path.exists(json_update_path):
-        os.remove(json_update_path)
+    for update_filename in ("updates.sqlite", "updates.sqlite-journal", "updates_bloom.npz", "updates.json"):
+        update_path = os.path.join(output_directory, update_filename)
+        if os.path.exists(update_path):
+            os.remove(update_path)
 
     # Le reste de la fonction pour supprimer les fichiers de sortie est correct
     if os.path.exists(output_path):
-        remove_files(output_path)
+        remove_files(output_path, kept_files=RESET_KEPT_FILES)
 
 
 def init_project(output_directory):
@@ -43,9 +53,6 @@ def init_project(output_directory):
     :return: None
     """
 
-    # Path to the file where updates will be stored
-    updates_file_path = os.path.join(output_directory, "updates.json")
-
     # Path to the .fraghub file
     fraghub_file_path = os.path.join(output_directory, ".fraghub")
 
@@ -60,12 +67,7 @@ def init_project(output_directory):
         # Creating the output directory since it doesn't exist
         os.makedirs(output_directory)
 
-    # Checking if the updates file already exists
-    if not os.path.isfile(updates_file_path):
-        # Creating the updates file since it doesn't exist
-        with open(updates_file_path, 'w') as fp:
-            # Write an empty JSON object to the file as initial content
-            json.dump({}, fp)
+    # The update store (updates.sqlite) is created on first use by scripts.update.load_update_file
 
     # Create an empty .fraghub file if it doesn't already exist
     if not os.path.isfile(fraghub_file_path):
@@ -1,9 +1,10 @@
 from scripts.GUI.utils.global_vars import parameters_dict
 from scripts.peaks_filters.entropy_calculation import *
 from scripts.calculate_maximized_chunk_size import *
+from scripts.executor import *
 from scripts.normalizer.values_normalizer import *
 from scripts.peaks_filters.filters import *
-import concurrent.futures
+from scripts.peak_arrays import *
 import scripts.deletion_report
 import scripts.globals_vars
 import numpy as np
@@ -41,32 +42,6 @@ def peak_list_cleaning(spectrum, peak_list, precursormz):
     return peak_list
 
 
-def peak_list_to_str(peak_list_np):
-    """
-    This function converts a peak list numpy array into a string format. Each peak is represented as a space-separated
-    string of floating point values, and each peak is separated by a newline.
-
-    :param peak_list_np: The peak list represented as a numpy array. The numpy array is expected to contain floating-point values.
-    :return: A string representation of the peak list where each row represents a peak and is formatted as a space-separated
-    string of floating-point values.
-    """
-    # Convert the peak list numpy array to a list of lists. Each sub-list contains floating point values representing a peak.
-    # The numpy round function is used to limit the precision of the floating-point values to 8 decimal places.
-    peak_list_np = peak_list_np.round(8).tolist()
-
-    # Convert the list of lists into a string format. Each sub-list (representing a peak) is converted into a space-separated
-    # string of floats. Sub-lists are then joined together with newline characters to form the final string.
-    #
-    # The join function is used twice:
-    # 1) The inner join function is used to convert each sub-list into a space-separated string of floats.
-    #    The string formatter is used to ensure each float is represented to 8 decimal places.
-    # 2) The outer join function is used to join together all the space-separated strings (representing peaks) with newline characters.
-    peak_list_np = "\n".join(" ".join(f"{val:.8f}" for val in sublist) for sublist in peak_list_np)
-
-    # Return the final string representation of the peak list.
-    return peak_list_np
-
-
 def spectrum_cleaning(spectrum):
     """
     This function cleans the input 'spectrum'.
@@ -76,28 +51,78 @@ def spectrum_cleaning(spectrum):
     After normalization, the function checks if the 'PRECURSORMZ' exists in the spectrum and a regular expression search for
     the 'float_check_pattern' in the 'PRECURSORMZ' key returns a match.
     If both conditions are true, it modifies 'PRECURSORMZ' to match the regex group, converts it to float and replaces any commas with periods.
-    If the float value is positive, it proceeds to convert the peak list to a numpy array and then to string,
-    subsequently updating the spectrum's 'PEAKS_LIST' and 'NUM PEAKS' attributes.
+    If the float value is positive, it proceeds to convert the peak list to a cleaned numpy array,
+    subsequently updating the spectrum's 'PEAKS_LIST' (numpy array) and 'NUM PEAKS' attributes.
 
     :param spectrum: dictionary containing spectrum information
     :return: cleaned spectrum dictionary if it passes all checks, otherwise None
     """
     peak_list = spectrum["PEAKS_LIST"]
     # If peak_list is not present in the spectrum dictionary, it returns None
-    if not peak_list:
-        spectrum['DELETION_REASON'] = "spectrum deleted because peaks list is empty"
-        scripts.deletion_report.deleted_spectrum_list.append(spectrum)
-        scripts.deletion_report.no_peaks_list += 1
+    if not has_peaks_list(spectrum):
         return None
     spectrum = normalize_values(spectrum)
     # If normalization of spectrum fails, it returns None
     if not spectrum:
         return None
+    return clean_normalized_spectrum(spectrum, peak_list)
+
+
+def has_peaks_list(spectrum):
+    """
+    Checks that a spectrum has a peak list, the spectra without peaks are deleted.
+
+    :param spectrum: dictionary containing spectrum information
+    :return: True if the spectrum has a peak list, False if it was deleted
+    """
+    if not spectrum["PEAKS_LIST"]:
+        spectrum['DELETION_REASON'] = "spectrum deleted because peaks list is empty"
+        scripts.deletion_report.deleted_spectrum_list.append(spectrum)
+        scripts.deletion_report.no_peaks_list += 1
+        return False
+    return True
+
+
+def spectrum_cleaning_batch(spectrum_list):
+    """
+    Batch version of spectrum_cleaning, for a sub-chunk of spectra: the metadata of the spectra are normalized together
+    (normalize_values_batch, column-wise for the normalizers which allow it), then each spectrum is cleaned like in
+    spectrum_cleaning.
+
+    :param spectrum_list: list of dictionaries containing spectrum information
+    :return: the list of the cleaned spectrum dictionaries, None for the deleted spectra
+    """
+    # The peak lists are taken before the normalization, like in spectrum_cleaning
+    peak_lists = [spectrum["PEAKS_LIST"] for spectrum in spectrum_list]
+
+    results = [None] * len(spectrum_list)
+    positions = [index for index, spectrum in enumerate(spectrum_list) if has_peaks_list(spectrum)]
+
+    normalized_list = normalize_values_batch([spectrum_list[index] for index in positions])
+
+    for index, spectrum in zip(positions, normalized_list):
+        # If normalization of spectrum fails, it stays None
+        if spectrum:
+            results[index] = clean_normalized_spectrum(spectrum, peak_lists[index])
+
+    return results
+
+
+def clean_normalized_spectrum(spectrum, peak_list):
+    """
+    Cleans a spectrum whose metadata were normalized: checks its precursor m/z, cleans its peak list and calculates its
+    entropy.
+
+    :param spectrum: dictionary containing the normalized spectrum information
+    :param peak_list: the peak list of the spectrum, taken before the normalization
+    :return: cleaned spectrum dictionary if it passes all checks, otherwise None
+    """
     # Checks if "PRECURSORMZ" exists in the spectrum
-    if "PRECURSORMZ" in spectrum and ("_GC" not in spectrum["FILENAME"] and not re.search(r"\bGC\b", spectrum["INSTRUMENTTYPE"])):
-        if re.search(scripts.globals_vars.float_check_pattern, str(spectrum["PRECURSORMZ"])):
+    if "PRECURSORMZ" in spectrum and ("_GC" not in spectrum["FILENAME"] and not is_gc_instrument_type(spectrum["INSTRUMENTTYPE"])):
+        precursor_mz = float_check_value(str(spectrum["PRECURSORMZ"]))
+        if precursor_mz is not None:
             # 'PRECURSORMZ' modification with match from a regular expression search for 'float_check_pattern'
-            spectrum["PRECURSORMZ"] = re.search(scripts.globals_vars.float_check_pattern, str(spectrum["PRECURSORMZ"])).group(1)
+            spectrum["PRECURSORMZ"] = precursor_mz
             float_precursor_mz = float(spectrum["PRECURSORMZ"].replace(",", "."))
             # Float value of 'PRECURSORMZ' needs to be greater than 0
             if float_precursor_mz <= 0.0:
@@ -114,7 +139,7 @@ def spectrum_cleaning(spectrum):
             intensities = peak_list_np[:, 1]
             spectrum["ENTROPY"] = str(entropy_calculation(intensities))
             if parameters_dict["remove_spectrum_under_entropy_score"] == 1.0:
-                if re.search(scripts.globals_vars.float_check_pattern, str(spectrum["ENTROPY"])):
+                if float_check_value(str(spectrum["ENTROPY"])) is not None:
                     if float(spectrum["ENTROPY"]) < parameters_dict["remove_spectrum_under_entropy_score_value"]:
                         spectrum['DELETION_REASON'] = "spectrum deleted because it's entropy score is lower than the threshold selected by the user."
                         scripts.deletion_report.deleted_spectrum_list.append(spectrum)
@@ -124,16 +149,15 @@ def spectrum_cleaning(spectrum):
             if peak_list_np.size == 0:
                 return None
             spectrum["NUM PEAKS"] = str(peak_list_np.shape[0])
-            # Convert numpy array back to string and update 'PEAKS_LIST' in spectrum
-            peak_list_np = peak_list_to_str(peak_list_np)
-            spectrum["PEAKS_LIST"] = peak_list_np
+            # Keep the peaks as a numpy array in 'PEAKS_LIST', they are only formatted to text by the writers
+            spectrum["PEAKS_LIST"] = to_peak_array(peak_list_np)
             return spectrum
         else:
             spectrum['DELETION_REASON'] = "spectrum deleted because precursor mz field is empty or contains invalid characters (not a floating number)."
             scripts.deletion_report.deleted_spectrum_list.append(spectrum)
             scripts.deletion_report.no_precursor_mz += 1
             return None
-    elif "_GC" in spectrum["FILENAME"] or re.search(r"\bGC\b", spectrum["INSTRUMENTTYPE"]):
+    elif "_GC" in spectrum["FILENAME"] or is_gc_instrument_type(spectrum["INSTRUMENTTYPE"]):
         float_precursor_mz = None
         peak_list_np = peak_list_cleaning(spectrum, peak_list, float_precursor_mz)
 
@@ -143,7 +167,7 @@ def spectrum_cleaning(spectrum):
         intensities = peak_list_np[:, 1]
         spectrum["ENTROPY"] = str(entropy_calculation(intensities))
         if parameters_dict["remove_spectrum_under_entropy_score"] == 1.0:
-            if re.search(scripts.globals_vars.float_check_pattern, str(spectrum["ENTROPY"])):
+            if float_check_value(str(spectrum["ENTROPY"])) is not None:
                 if float(spectrum["ENTROPY"]) < parameters_dict["remove_spectrum_under_entropy_score_value"]:
                     spectrum['DELETION_REASON'] = "spectrum deleted because it's entropy score is lower than the threshold selected by the user."
                     scripts.deletion_report.deleted_spectrum_list.append(spectrum)
@@ -153,15 +177,14 @@ def spectrum_cleaning(spectrum):
         if peak_list_np.size == 0:
             return None
         spectrum["NUM PEAKS"] = str(peak_list_np.shape[0])
-        # Convert numpy array back to string and update 'PEAKS_LIST' in spectrum
-        peak_list_np = peak_list_to_str(peak_list_np)
-        spectrum["PEAKS_LIST"] = peak_list_np
+        # Keep the peaks as a numpy array in 'PEAKS_LIST', they are only formatted to text by the writers
+        spectrum["PEAKS_LIST"] = to_peak_array(peak_list_np)
         return spectrum
 
     return spectrum
 
 
-def write_deleted_spectrums(output_directory):
+def write_deleted_spectrums(output_directory, written_files=None):
     """
     Groups the deleted spectrums by the DELETION_REASON and writes each group to a separate CSV file.
 
@@ -172,6 +195,8 @@ def write_deleted_spectrums(output_directory):
     Arguments:
     - output_directory (str): The path to the directory where the deleted spectrums directory
       and files should be created.
+    - written_files (set): The deletion files already written during this run, appended to instead of being
+      overwritten (streaming mode). Updated in place.
 
     Returns:
     - None
@@ -215,20 +240,26 @@ def write_deleted_spectrums(output_directory):
 
             # Write the group to a CSV file
             file_path = os.path.join(deleted_spectrums_dir, file_name)
-            group.to_csv(file_path, sep='\t', index=False, quotechar='"')
+            if written_files is not None and file_path in written_files:
+                # Append without headers, the file was already written during this run
+                group.to_csv(file_path, mode='a', sep='\t', index=False, quotechar='"', header=False)
+            else:
+                group.to_csv(file_path, sep='\t', index=False, quotechar='"')
+                if written_files is not None:
+                    written_files.add(file_path)
 
         # Clear the deleted spectrum list in memory
         scripts.deletion_report.deleted_spectrum_list = []
 
 
 def spectrum_cleaning_processing(spectrum_list, output_directory, progress_callback=None, total_items_callback=None, prefix_callback=None,
-                                 item_type_callback=None):
+                                 item_type_callback=None, written_files=None):
     """
     Main function used for performing spectrum cleaning operation on multiple spectrums.
 
-    This function uses the concurrent.futures module to perform cleaning operation on multiple spectrums concurrently.
-    The spectrum list is divided into chunks of determined size. Each chunk is then processed concurrently by utilizing
-    the ThreadPoolExecutor.
+    This function uses the shared execution engine (scripts.executor) to perform cleaning operation on multiple spectrums
+    concurrently. The spectrum list is divided into sub-chunks which are processed by the long-lived worker processes
+    or threads of the run, depending on the execution mode.
 
     During the operation, progress is reported via callbacks instead of a progress bar. The callbacks are triggered
     as the cleaning process progresses.
@@ -241,6 +272,7 @@ def spectrum_cleaning_processing(spectrum_list, output_directory, progress_callb
     :param total_items_callback: A function to set the total number of items (optional)
     :param prefix_callback: A function to dynamically set the prefix for the operation (optional)
     :param item_type_callback: A function to specify the type of items being processed (optional)
+    :param written_files: A set of the DELETED_SPECTRUMS files already written during this run, appended to instead of being overwritten (optional)
     :return: A list of cleaned spectrums
     :rtype: list
     """
@@ -257,35 +289,19 @@ def spectrum_cleaning_processing(spectrum_list, output_directory, progress_callb
     if total_items_callback:
         total_items_callback(len(spectrum_list), 0)  # Set total items and display initial completed = 0
 
-    # Define the chunk size: the number of spectrums that can be processed at once
-    chunk_size = calculate_maximized_chunk_size(data_list=spectrum_list)
-
-    # Initialize the list that will hold the cleaned spectra
-    final = []
-
-    # Variable to track processed items
-    processed_items = 0
-
-    # Loop over the spectrum list, processing chunks of size `chunk_size`
-    for i in range(0, len(spectrum_list), chunk_size):
-        # Create a thread pool executor for concurrent processing
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # Extract the current chunk
-            chunk = spectrum_list[i:i + chunk_size]
-            # Execute the `spectrum_cleaning` function for each item in the current chunk concurrently
-            results = list(executor.map(spectrum_cleaning, chunk))
-
-        # Collect all non-None results (cleaned spectrums)
-        final.extend([res for res in results if res is not None])
-
-        # Update the number of processed items
-        processed_items += len(chunk)
+    # Execute the cleaning concurrently with the long-lived pool of the shared execution engine (process / thread /
+    # serial), the progress is reported as the sub-chunks complete.
+    # Batch normalization (default): the metadata of each sub-chunk are normalized together, column-wise where
+    # possible. Otherwise the `spectrum_cleaning` function is applied spectrum by spectrum.
+    if parameters_dict.get("batch_normalization", 1.0) == 1.0:
+        results = executor_map(spectrum_cleaning_batch, spectrum_list, progress_callback=progress_callback, batched=True)
+    else:
+        results = executor_map(spectrum_cleaning, spectrum_list, progress_callback=progress_callback)
 
-        # Trigger the progress callback with the updated count
-        if progress_callback:
-            progress_callback(processed_items)
+    # Collect all non-None results (cleaned spectrums)
+    final = [res for res in results if res is not None]
 
-    write_deleted_spectrums(output_directory)
+    write_deleted_spectrums(output_directory, written_files=written_files)
 
     # Return the final cleaned spectrum list
     return final
@@ -0,0 +1,94 @@
+import scripts.globals_vars
+import dataclasses
+import pandas as pd
+
+# Attribute of each key of keys_list in the Spectrum record ("NUM PEAKS" is not a valid attribute name)
+SPECTRUM_SLOTS = {key: key.replace(" ", "_") for key in scripts.globals_vars.keys_list}
+
+
+class SpectrumMapping:
+    """
+    Dictionary-like access to the fields of a Spectrum record by their FragHub key (spectrum["NUM PEAKS"]), so that
+    the code written for the spectrum dictionaries keeps working. Attribute access (spectrum.PEAKS_LIST) is faster.
+    """
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, SPECTRUM_SLOTS[key])
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        try:
+            setattr(self, SPECTRUM_SLOTS[key], value)
+        except KeyError:
+            raise KeyError(key) from None
+
+    def __contains__(self, key):
+        return key in SPECTRUM_SLOTS
+
+    def __iter__(self):
+        return iter(SPECTRUM_SLOTS)
+
+    def __len__(self):
+        return len(SPECTRUM_SLOTS)
+
+    def get(self, key, default=None):
+        return getattr(self, SPECTRUM_SLOTS[key]) if key in SPECTRUM_SLOTS else default
+
+    def keys(self):
+        return SPECTRUM_SLOTS.keys()
+
+    def values(self):
+        """
+        :return: The tuple of the values of the fields, in the order of keys_list.
+        """
+        return tuple(getattr(self, slot) for slot in SPECTRUM_SLOTS.values())
+
+    def items(self):
+        return zip(SPECTRUM_SLOTS, self.values())
+
+    def to_dict(self):
+        """
+        :return: The spectrum dictionary {key of keys_list: value}, for the GUI and the writers.
+        """
+        return dict(zip(SPECTRUM_SLOTS, self.values()))
+
+    def __reduce__(self):
+        # Pickled as a tuple of values (no field name per spectrum) when sent to or from the worker processes
+        return Spectrum, self.values()
+
+
+# Compact record of the canonical FragHub fields of a spectrum (the keys of keys_list, all "" by default), stored in
+# __slots__ instead of a per-spectrum dictionary. Built from the values in the order of keys_list: Spectrum(*values).
+Spectrum = dataclasses.make_dataclass("Spectrum",
+                                      [(slot, object, dataclasses.field(default="")) for slot in SPECTRUM_SLOTS.values()],
+                                      bases=(SpectrumMapping,), slots=True)
+# Pickled by reference to this module (make_dataclass only accepts module= from Python 3.12)
+Spectrum.__module__ = __name__
+
+
+def spectrum_from_dict(spectrum_dict):
+    """
+    Builds a Spectrum record from a spectrum dictionary, the keys outside keys_list are ignored.
+
+    :param spectrum_dict: A dictionary {key of keys_list: value}.
+    :return: The Spectrum record, the missing keys are "".
+    """
+    return Spectrum(*[spectrum_dict.get(key, "") for key in SPECTRUM_SLOTS])
+
+
+def spectra_to_dataframe(spectrum_list):
+    """
+    Builds the DataFrame of a list of spectra (Spectrum records or dictionaries), one column per key of keys_list.
+
+    :param spectrum_list: A list of spectra.
+    :return: The DataFrame of the spectra, with the columns in the order of keys_list.
+    """
+    columns = list(SPECTRUM_SLOTS)
+
+    rows = [spectrum.values() if isinstance(spectrum, Spectrum) else tuple(spectrum.get(key) for key in columns)
+            for spectrum in spectrum_list]
+
+    return pd.DataFrame(rows, columns=columns)
@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division
+import numpy as np
+import hashlib
+
+from .spectrum_type import SpectrumType
+from .spectrum import Spectrum
+from .splash import *
+
+# Largest absolute m/z handled by the vectorised path: the formatted m/z (x 10**MZ_PRECISION) must fit in an int64
+MAX_VECTORISED_MZ = 1.0e12
+
+# Number of ions kept in the filtered spectrum of the prefilter block, and their minimum relative intensity
+PREFILTER_TOP_IONS = 10
+PREFILTER_BASE_PEAK_PERCENTAGE = 0.1
+
+# Characters of INTENSITY_MAP as an array, to translate whole histograms at once
+INTENSITY_MAP_ARRAY = np.array(list(INTENSITY_MAP))
+
+# Cache of the format strings of the exact hash block, by number of ions (up to MAX_CACHED_ION_FORMAT ions)
+MAX_CACHED_ION_FORMAT = 1000
+ion_format_cache = {}
+
+
+def reference_splash(peak_list, spectrum_type=SpectrumType.MS):
+    """
+    Computes the SPLASH of a peak list with the reference implementation (Splash class), used for the spectra the
+    vectorised path does not handle (non finite or negative values, non numeric peaks...).
+
+    :param peak_list: An iterable of (m/z, intensity) pairs.
+    :param spectrum_type: The spectrum type (SpectrumType).
+    :return: The SPLASH, or None if it can not be computed.
+    """
+    try:
+        return Splash().splash(Spectrum([tuple(peak) for peak in peak_list], spectrum_type))
+    except:
+        return None
+
+
+def to_peak_array(peak_list):
+    """
+    Converts a peak list to a (n, 2) float64 array, if it can be handled by the vectorised path.
+
+    :param peak_list: A list of [m/z, intensity] pairs, or a (n, 2) array.
+    :return: The peak array (empty for an empty peak list), or None if the reference implementation must be used.
+    """
+    try:
+        peak_array = np.asarray(peak_list)
+    except:
+        return None
+
+    # Empty peak list
+    if peak_array.size == 0:
+        return np.empty((0, 2), dtype=np.float64)
+
+    # Only numeric (n, 2) peak lists, strings or ragged lists go through the reference implementation
+    if peak_array.ndim != 2 or peak_array.shape[1] != 2 or peak_array.dtype.kind not in "fiu":
+        return None
+
+    # Python divides ints exactly: integers not exactly representable as float64 go through the reference implementation
+    if peak_array.dtype.kind in "iu" and np.abs(peak_array).max() >= 2 ** 53:
+        return None
+
+    return peak_array.astype(np.float64, copy=False)
+
+
+def valid_segments(peaks, starts):
+    """
+    Checks which spectra of a batch can be handled by the vectorised path: the spectra with non finite values,
+    negative intensities, no intensity or out of range m/z go through the reference implementation.
+
+    :param peaks: The (n, 2) array of the ions of all the spectra.
+    :param starts: The start index of each (non empty) spectrum.
+    :return: A boolean array, True for the valid spectra.
+    """
+    mz = peaks[:, 0]
+    intensity = peaks[:, 1]
+
+    finite = np.logical_and.reduceat(np.isfinite(peaks).all(axis=1), starts)
+
+    # Replace the non finite values so that the other checks do not warn
+    intensity = np.where(np.isfinite(intensity), intensity, 0.0)
+    mz = np.where(np.isfinite(mz), mz, 0.0)
+
+    return (finite
+            & (np.minimum.reduceat(intensity, starts) >= 0)
+            & (np.maximum.reduceat(intensity, starts) > 0)
+            & (np.maximum.reduceat(np.abs(mz), starts) < MAX_VECTORISED_MZ))
+
+
+def segment_max(values, starts):
+    """
+    Computes the maximum of each segment of values.
+
+    :param values: A 1D array.
+    :param starts: The start index of each (non empty) segment.
+    :return: The maximum of each segment.
+    """
+    return np.maximum.reduceat(values, starts)
+
+
+def calculate_histograms(mz, intensity, segment_ids, n_segments, base, length, bin_size):
+    """
+    Computes the wrapped histograms of several spectra at once, like Splash.calculate_histogram. np.bincount sums the
+    intensities in the order of the ions, exactly like the reference loop.
+
+    :param mz: The m/z of the ions of all the spectra.
+    :param intensity: The (normalized) intensities of the ions.
+    :param segment_ids: The index of the spectrum of each ion.
+    :param n_segments: The number of spectra.
+    :param base: The base of the histogram values.
+    :param length: The number of bins.
+    :param bin_size: The m/z width of a bin.
+    :return: A (n_segments, length) array of the histogram values.
+    """
+    # Bin ions using the histogram wrapping strategy (int() truncates toward zero)
+    bins = np.trunc(mz / bin_size).astype(np.int64) % length
+
+    histograms = np.bincount(segment_ids * length + bins, weights=intensity, minlength=n_segments * length)
+    histograms = histograms.reshape(n_segments, length)
+
+    # Normalize the histograms and scale to the provided base
+    max_intensity = histograms.max(axis=1)
+
+    return np.trunc(EPS_CORRECTION + (base - 1) * histograms / max_intensity[:, None]).astype(np.int64)
+
+
+def histogram_strings(histograms):
+    """
+    Translates histogram values to strings with INTENSITY_MAP.
+
+    :param histograms: A (n, length) array of histogram values.
+    :return: The list of histogram strings.
+    """
+    return [''.join(row) for row in INTENSITY_MAP_ARRAY[histograms].tolist()]
+
+
+def prefilter_strings(histograms):
+    """
+    Builds the prefilter blocks from the base 3 prefilter histograms, like Splash.translate_base(..., 3, 36, 4).
+
+    :param histograms: A (n, PREFILTER_LENGTH) array of histogram values.
+    :return: The list of prefilter blocks.
+    """
+    # Value of each histogram read as a base 3 number
+    values = histograms @ (PREFILTER_BASE ** np.arange(PREFILTER_LENGTH - 1, -1, -1, dtype=np.int64))
+
+    # 3**10 - 1 < 36**4: four base 36 digits are always enough
+    digits = np.stack([(values // 36 ** power) % 36 for power in (3, 2, 1, 0)], axis=1)
+
+    return histogram_strings(digits)
+
+
+def encode_spectra(mz, intensity, segment_ids, starts, ends):
+    """
+    Builds the exact hash blocks of several spectra at once, like Splash.encode_spectrum.
+
+    :param mz: The m/z of the ions of all the spectra.
+    :param intensity: The (normalized) intensities of the ions.
+    :param segment_ids: The index of the spectrum of each ion.
+    :param starts: The start index of the ions of each spectrum.
+    :param ends: The end index of the ions of each spectrum.
+    :return: The list of exact hash blocks.
+    """
+    # Format m/z and intensity (int() truncates toward zero)
+    formatted_mz = ((mz + EPS_CORRECTION) * MZ_PRECISION_FACTOR).astype(np.int64)
+    formatted_intensity = ((intensity + EPS_CORRECTION) * INTENSITY_PRECISION_FACTOR).astype(np.int64)
+
+    # Sort by spectrum, by increasing m/z and then by decreasing intensity
+    order = np.lexsort((-formatted_intensity, formatted_mz, segment_ids))
+
+    # Interleaved m/z and intensity values, as Python ints
+    values = np.column_stack((formatted_mz[order], formatted_intensity[order])).ravel().tolist()
+
+    hashes = []
+    for start, end in zip(starts.tolist(), ends.tolist()):
+        n_ions = end - start
+
+        # Format string "%d:%d %d:%d ..." of the spectrum
+        ion_format = ion_format_cache.get(n_ions)
+        if ion_format is None:
+            ion_format = ION_SEPARATOR.join(('%d' + ION_PAIR_SEPARATOR + '%d',) * n_ions)
+            if n_ions <= MAX_CACHED_ION_FORMAT:
+                ion_format_cache[n_ions] = ion_format
+
+        # Hash spectrum string using SHA256 and truncate
+        spectrum_string = (ion_format % tuple(values[2 * start:2 * end])).encode('utf-8')
+        hashes.append(hashlib.sha256(spectrum_string).hexdigest()[: MAX_HASH_CHARATERS_ENCODED_SPECTRUM])
+
+    return hashes
+
+
+def filter_spectra(mz, intensity, segment_ids, n_segments, starts):
+    """
+    Builds the filtered spectra of the prefilter block (ions above 10 % of the base peak, 10 most intense ions),
+    normalized again, like Splash.filter_spectrum followed by the Spectrum constructor.
+
+    :param mz: The m/z of the ions of all the spectra.
+    :param intensity: The (normalized) intensities of the ions.
+    :param segment_ids: The index of the spectrum of each ion.
+    :param n_segments: The number of spectra.
+    :param starts: The start index of the ions of each spectrum.
+    :return: A tuple (m/z, intensities, spectrum indexes) of the filtered ions, in the order of the reference.
+    """
+    # Filter first by base peak percentage
+    base_peak_intensity = segment_max(intensity, starts)
+    kept = intensity + EPS_CORRECTION >= PREFILTER_BASE_PEAK_PERCENTAGE * base_peak_intensity[segment_ids]
+
+    mz = mz[kept]
+    intensity = intensity[kept]
+    segment_ids = segment_ids[kept]
+
+    # Sort by spectrum, by decreasing intensity and then by increasing m/z (stable, like sorted())
+    order = np.lexsort((mz, -intensity, segment_ids))
+    mz = mz[order]
+    intensity = intensity[order]
+    segment_ids = segment_ids[order]
+
+    # Keep the top ions of each spectrum (the base peak is always kept, so no spectrum is empty)
+    filtered_starts = np.searchsorted(segment_ids, np.arange(n_segments))
+    rank = np.arange(len(segment_ids)) - filtered_starts[segment_ids]
+    top = rank < PREFILTER_TOP_IONS
+
+    mz = mz[top]
+    intensity = intensity[top]
+    segment_ids = segment_ids[top]
+
+    # Normalize again, like the Spectrum constructor
+    filtered_starts = np.searchsorted(segment_ids, np.arange(n_segments))
+    max_intensity = segment_max(intensity, filtered_starts)
+    intensity = intensity / max_intensity[segment_ids] * Spectrum.RELATIVE_INTENSITY_SCALE
+
+    return mz, intensity, segment_ids
+
+
+def splash_peak_arrays(peaks, lengths, spectrum_type=SpectrumType.MS):
+    """
+    Computes the SPLASH of several valid (see valid_segments), non empty spectra at once.
+
+    :param peaks: The (n, 2) float64 array of the ions of all the spectra.
+    :param lengths: The number of ions of each spectrum.
+    :param spectrum_type: The spectrum type (SpectrumType).
+    :return: The list of SPLASH.
+    """
+    n_segments = len(lengths)
+
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    mz = peaks[:, 0]
+    segment_ids = np.repeat(np.arange(n_segments, dtype=np.int64), lengths)
+
+    # Normalize intensities to the constant RELATIVE_INTENSITY_SCALE value, like the Spectrum constructor
+    intensity = peaks[:, 1]
+    intensity = intensity / segment_max(intensity, starts)[segment_ids] * Spectrum.RELATIVE_INTENSITY_SCALE
+
+    # Prefilter block
+    filtered_mz, filtered_intensity, filtered_segment_ids = filter_spectra(mz, intensity, segment_ids, n_segments, starts)
+    prefilters = prefilter_strings(calculate_histograms(filtered_mz, filtered_intensity, filtered_segment_ids, n_segments,
+                                                        PREFILTER_BASE, PREFILTER_LENGTH, PREFILTER_BIN_SIZE))
+
+    # Similarity histogram block
+    similarities = histogram_strings(calculate_histograms(mz, intensity, segment_ids, n_segments,
+                                                          SIMILARITY_BASE, SIMILARITY_LENGTH, SIMILARITY_BIN_SIZE))
+
+    # Exact hash block
+    hashes = encode_spectra(mz, intensity, segment_ids, starts, ends)
+
+    # Initial splash block to indicate version and spectrum type
+    initial_block = 'splash%s0' % spectrum_type
+
+    return ['-'.join([initial_block, prefilter, similarity, exact_hash])
+            for prefilter, similarity, exact_hash in zip(prefilters, similarities, hashes)]
+
+
+def splash_batch(peak_lists, spectrum_type=SpectrumType.MS):
+    """
+    Computes the SPLASH of a batch of spectra with NumPy: the histograms of the whole batch are computed with a single
+    np.bincount. The SPLASH are identical to the ones of the reference implementation (Splash class), which is still
+    used for the spectra the vectorised path does not handle.
+
+    :param peak_lists: A list of peak lists ([m/z, intensity] pairs) or of (n, 2) arrays.
+    :param spectrum_type: The spectrum type (SpectrumType).
+    :return: The list of SPLASH, None for the empty or invalid peak lists.
+    """
+    results = [None] * len(peak_lists)
+
+    indexes = []
+    peak_arrays = []
+
+    for i, peak_list in enumerate(peak_lists):
+        peak_array = to_peak_array(peak_list)
+
+        if peak_array is None:
+            # Reference implementation
+            results[i] = reference_splash(peak_list, spectrum_type)
+        elif len(peak_array):
+            indexes.append(i)
+            peak_arrays.append(peak_array)
+
+    if not peak_arrays:
+        return results
+
+    lengths = np.array([len(peak_array) for peak_array in peak_arrays], dtype=np.int64)
+    peaks = np.concatenate(peak_arrays)
+
+    valid = valid_segments(peaks, np.cumsum(lengths) - lengths)
+
+    # Spectra not handled by the vectorised path
+    if not valid.all():
+        for i in np.flatnonzero(~valid).tolist():
+            results[indexes[i]] = reference_splash(peak_lists[indexes[i]], spectrum_type)
+
+        peaks = peaks[np.repeat(valid, lengths)]
+        lengths = lengths[valid]
+        indexes = [index for index, is_valid in zip(indexes, valid.tolist()) if is_valid]
+
+    if indexes:
+        for i, splash in zip(indexes, splash_peak_arrays(peaks, lengths, spectrum_type)):
+            results[i] = splash
+
+    return results
+
+
+def splash_arrays(mz, intensity, spectrum_type=SpectrumType.MS):
+    """
+    Computes the SPLASH of a spectrum given as m/z and intensity arrays.
+
+    :param mz: The m/z values.
+    :param intensity: The intensity values.
+    :param spectrum_type: The spectrum type (SpectrumType).
+    :return: The SPLASH, or None if it can not be computed.
+    """
+    return splash_batch([np.column_stack((np.asarray(mz), np.asarray(intensity)))], spectrum_type)[0]
@@ -0,0 +1,169 @@
+from scripts.GUI.utils.global_vars import parameters_dict
+from scripts.update import SPLASH_QUERY_SIZE
+from scripts.spectrum_record import *
+import itertools
+import hashlib
+import os.path
+import sqlite3
+import array
+
+# Name of the SPLASH cache database, in the project output directory. The cache only depends on the peak lists, it is
+# kept when the updates are reset (see set_projects.reset_updates).
+SPLASH_CACHE_FILENAME = "splash_cache.sqlite"
+
+# Default maximum number of entries of the cache (parameters_dict["splash_cache_max_entries"], 0 disables the cache)
+DEFAULT_SPLASH_CACHE_MAX_ENTRIES = 2000000
+
+global splash_cache, splash_cache_tick
+# Connection to the SPLASH cache, a table {peak list digest: SPLASH, last use} of splash_cache.sqlite. None when no
+# cache is loaded.
+splash_cache = None
+# Last use of the entries looked up or stored by the current batch, incremented by each batch (least recently used
+# entries have the smallest values)
+splash_cache_tick = 0
+
+
+def get_splash_cache_max_entries():
+    """
+    Returns the maximum number of entries of the SPLASH cache selected in parameters_dict["splash_cache_max_entries"].
+
+    :return: The maximum number of entries (0 when the cache is disabled).
+    """
+    return max(0, int(parameters_dict.get("splash_cache_max_entries", DEFAULT_SPLASH_CACHE_MAX_ENTRIES)))
+
+
+def peak_list_digest(peak_list):
+    """
+    Computes a cheap digest (BLAKE2b, 128 bits) of the raw float64 values of a peak list, used as key of the SPLASH
+    cache.
+
+    :param peak_list: A list of [m/z, intensity] pairs, or a (n, 2) array.
+    :return: The hexadecimal digest, or None if the peak list can not be cached (empty, not numeric or not made of pairs).
+    """
+    try:
+        if len(peak_list) == 0 or not all(len(peak) == 2 for peak in peak_list):
+            return None
+
+        # Flatten the peaks in a float64 buffer
+        values = array.array('d', itertools.chain.from_iterable(peak_list))
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+    return hashlib.blake2b(values.tobytes(), digest_size=16).hexdigest()
+
+
+def load_splash_cache(output_directory):
+    """
+    Opens the SPLASH cache of the project, if enabled: the splash_cache table of splash_cache.sqlite (created if needed).
+    Only the digests of each batch are looked up, the cache is never loaded in memory.
+
+    :param output_directory: The project output directory.
+    :return: The connection to the SPLASH cache, or None if the cache is disabled.
+    """
+    global splash_cache, splash_cache_tick
+
+    # Close the cache of a previous run
+    close_splash_cache()
+
+    if get_splash_cache_max_entries() == 0:
+        return splash_cache
+
+    splash_cache = sqlite3.connect(os.path.join(output_directory, SPLASH_CACHE_FILENAME))
+
+    # The last use of the entries is indexed for the eviction of the least recently used entries
+    splash_cache.execute("CREATE TABLE IF NOT EXISTS splash_cache "
+                         "(digest TEXT PRIMARY KEY, splash TEXT, last_used INTEGER) WITHOUT ROWID")
+    splash_cache.execute("CREATE INDEX IF NOT EXISTS splash_cache_last_used ON splash_cache (last_used)")
+    splash_cache.commit()
+
+    splash_cache_tick = splash_cache.execute("SELECT COALESCE(MAX(last_used), 0) FROM splash_cache").fetchone()[0]
+
+    return splash_cache
+
+
+def close_splash_cache():
+    """
+    Closes the SPLASH cache, if opened.
+
+    :return: None
+    """
+    global splash_cache
+
+    if splash_cache is not None:
+        splash_cache.close()
+        splash_cache = None
+
+
+def lookup_splash_cache(spectrum_list):
+    """
+    Looks up the SPLASH of the peak lists of a list of spectra in the SPLASH cache, by chunks of SPLASH_QUERY_SIZE
+    digests. The entries found are marked as the most recently used.
+
+    :param spectrum_list: A list of spectra (Spectrum records or dictionaries with a "PEAKS_LIST" key).
+    :return: A tuple (digests, cached SPLASH), with None for the peak lists which can not be cached or are not found.
+    """
+    global splash_cache_tick
+
+    digests = [peak_list_digest(spectrum["PEAKS_LIST"]) if isinstance(spectrum, (Spectrum, dict)) else None
+               for spectrum in spectrum_list]
+
+    if splash_cache is None:
+        return digests, [None] * len(digests)
+
+    splash_cache_tick += 1
+
+    # Unique digests of the batch
+    unique_digests = [digest for digest in dict.fromkeys(digests) if digest is not None]
+
+    found = {}
+    with splash_cache:
+        for start in range(0, len(unique_digests), SPLASH_QUERY_SIZE):
+            chunk = unique_digests[start:start + SPLASH_QUERY_SIZE]
+            placeholders = ", ".join("?" * len(chunk))
+
+            found.update(splash_cache.execute("SELECT digest, splash FROM splash_cache WHERE digest IN (%s)"
+                                              % placeholders, chunk))
+            splash_cache.execute("UPDATE splash_cache SET last_used = ? WHERE digest IN (%s)" % placeholders,
+                                 [splash_cache_tick] + chunk)
+
+    return digests, [found.get(digest) for digest in digests]
+
+
+def store_splash_cache(digests, splash_list):
+    """
+    Adds newly computed SPLASH to the SPLASH cache.
+
+    :param digests: The peak list digests (None for the peak lists which can not be cached).
+    :param splash_list: The SPLASH computed for these peak lists.
+    :return: None
+    """
+    if splash_cache is None:
+        return
+
+    # Only valid SPLASH are cached
+    with splash_cache:
+        splash_cache.executemany("INSERT OR REPLACE INTO splash_cache (digest, splash, last_used) VALUES (?, ?, ?)",
+                                 ((digest, splash, splash_cache_tick) for digest, splash in zip(digests, splash_list)
+                                  if digest is not None and splash and splash != "None"))
+
+
+def save_splash_cache(output_directory):
+    """
+    Evicts the least recently used entries of the SPLASH cache beyond parameters_dict["splash_cache_max_entries"] and
+    closes it. The entries are committed as they are looked up and stored.
+
+    :param output_directory: The project output directory.
+    :return: None
+    """
+    if splash_cache is None:
+        return
+
+    # Size-bounded eviction: keep the most recently used entries
+    max_entries = get_splash_cache_max_entries()
+    count = splash_cache.execute("SELECT COUNT(*) FROM splash_cache").fetchone()[0]
+    if count > max_entries:
+        with splash_cache:
+            splash_cache.execute("DELETE FROM splash_cache WHERE digest IN (SELECT digest FROM splash_cache "
+                                 "ORDER BY last_used LIMIT ?)", (count - max_entries,))
+
+    close_splash_cache()
@@ -1,8 +1,8 @@
 from scripts.calculate_maximized_chunk_size import *
-from scripts.splash.spectrum_type import SpectrumType
-from scripts.splash.spectrum import Spectrum
-from scripts.splash.splash import Splash
-import concurrent.futures
+from scripts.executor import *
+from scripts.splash.splash_numpy import splash_batch
+from scripts.splash_cache import *
+from scripts.spectrum_record import *
 import os
 
 def hash_spectrum_data(spectrum_data):
@@ -12,25 +12,15 @@ def hash_spectrum_data(spectrum_data):
     :param spectrum_data: The spectrum data.
     :return: The hashed spectrum.
     """
-    peak_list = [tuple(peaks) for peaks in spectrum_data["PEAKS_LIST"]]
-
-    # Check if peak_list exist
-    if peak_list:
-        # calculate splash key
-        try:
-            spectrum = Spectrum(peak_list, SpectrumType.MS)
-            return Splash().splash(spectrum)
-        except:
-            return None
-    else:
-        return None
+    # calculate splash key with the NumPy SPLASH engine (None if the peak list is empty or invalid)
+    return splash_batch([spectrum_data["PEAKS_LIST"]])[0]
 
 
 def generate_splash(spectrum):
     """
 
-    :param spectrum: a dictionary containing the spectrum data
-    :return: a dictionary containing the spectrum data updated with a new splash
+    :param spectrum: a Spectrum record (or a dictionary) containing the spectrum data
+    :return: the spectrum data updated with a new splash
 
     This method generates a splash for the given spectrum data. The spectrum data is hashed using the `hash_spectrum_data` method and the resultant hash is converted into a string.
 
@@ -43,7 +33,7 @@ def generate_splash(spectrum):
     """
     # Hash the spectrum data and convert the resultant hash into a string.
     # splash holds the hashed id of the spectrum data
-    if not isinstance(spectrum, dict):
+    if not isinstance(spectrum, (Spectrum, dict)):
         return None
 
     splash = str(hash_spectrum_data(spectrum))
@@ -61,6 +51,27 @@ def generate_splash(spectrum):
     return spectrum
 
 
+def generate_splash_batch(spectrum_list):
+    """
+    Generates the splash of a list of spectra at once, like generate_splash applied to each spectrum: the SPLASH of the
+    whole list are computed by a single call to the vectorised NumPy SPLASH engine.
+
+    :param spectrum_list: A list of Spectrum records (or dictionaries) containing the spectrum data.
+    :return: The list of spectra updated with their splash (None for the items which are not spectra).
+    """
+    # Only Spectrum records and dictionaries are spectra
+    spectra = [spectrum for spectrum in spectrum_list if isinstance(spectrum, (Spectrum, dict))]
+
+    # Hash the peak lists of all the spectra
+    splash_list = splash_batch([spectrum["PEAKS_LIST"] for spectrum in spectra])
+
+    # Add the generated splash to the spectra, as a string like in generate_splash
+    for spectrum, splash in zip(spectra, splash_list):
+        spectrum["SPLASH"] = str(splash)
+
+    return [spectrum if isinstance(spectrum, (Spectrum, dict)) else None for spectrum in spectrum_list]
+
+
 def generate_splash_processing(spectrum_list, files, progress_callback=None, total_items_callback=None, prefix_callback=None, item_type_callback=None):
     """
     Perform parallel processing of the given spectrum list and generate SPLASH for each spectrum,
@@ -89,34 +100,43 @@ def generate_splash_processing(spectrum_list, files, progress_callback=None, tot
     if total_items_callback:
         total_items_callback(len(spectrum_list), 0)  # total = length of spectrum_list, completed = 0
 
-    # Calculate the chunk size once
-    chunk_size = calculate_maximized_chunk_size(data_list=spectrum_list)
+    # Look up the peak lists already met in a previous run in the SPLASH cache of the project (if loaded)
+    digests, cached_splash_list = lookup_splash_cache(spectrum_list)
+
+    # Positions of the spectra whose SPLASH must be computed
+    missing_indexes = [i for i, splash in enumerate(cached_splash_list) if splash is None]
+    cached_items = len(spectrum_list) - len(missing_indexes)
 
-    # List to store the final results
-    final = []
+    # The cached spectra are already processed
+    if progress_callback and cached_items:
+        progress_callback(cached_items)
 
-    # Variable to track progress
-    processed_items = 0
+    def missing_progress_callback(processed_items):
+        progress_callback(cached_items + processed_items)
 
-    # Divide the spectrum list into chunks and process each chunk
-    for i in range(0, len(spectrum_list), chunk_size):
-        # Create a chunk of spectra
-        chunk = spectrum_list[i:i + chunk_size]
+    # Use the long-lived pool of the shared execution engine (process / thread / serial):
+    # apply the `generate_splash_batch` function to each sub-chunk of the spectra missing from the cache,
+    # the progress is reported as the sub-chunks complete
+    missing_results = executor_map(generate_splash_batch, [spectrum_list[i] for i in missing_indexes],
+                                   progress_callback=missing_progress_callback if progress_callback else None,
+                                   batched=True)
 
-        # Use `ThreadPoolExecutor` for parallel processing
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # Apply the `generate_splash` function to each spectrum in the chunk
-            results = list(executor.map(generate_splash, chunk))
+    # Add the new SPLASH to the cache
+    store_splash_cache([digests[i] for i in missing_indexes],
+                       [result["SPLASH"] if result is not None else None for result in missing_results])
 
-        # Filter results to exclude `None` values
-        final.extend([res for res in results if res is not None])
+    # Add the cached SPLASH to their spectrum
+    results = spectrum_list[:]
+    for i, splash in enumerate(cached_splash_list):
+        if splash is not None:
+            results[i]["SPLASH"] = splash
 
-        # Update the number of processed items
-        processed_items += len(chunk)
+    # Place the computed spectra at their position
+    for i, result in zip(missing_indexes, missing_results):
+        results[i] = result
 
-        # Update progress via the callback, if provided
-        if progress_callback:
-            progress_callback(processed_items)
+    # Filter results to exclude `None` values
+    final = [res for res in results if res is not None]
 
     # Return the final list of results
     return final
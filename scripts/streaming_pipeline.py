@@ -0,0 +1,374 @@
+from scripts.GUI.utils.global_vars import parameters_dict
+from scripts.normalizer.mols_calculation import *
+from scripts.complete_from_pubchem_datas import *
+from scripts.convertors.parsing_to_dict import *
+from scripts.normalize_to_not_found import *
+from scripts.ontologies_completion import *
+from scripts.convertors.csv_to_msp import *
+from scripts.de_novo_calculation import *
+from scripts.spectrum_normalizer import *
+from scripts.duplicatas_remover import *
+from scripts.splash_generator import *
+import scripts.deletion_report
+import scripts.global_report
+import scripts.globals_vars
+from scripts.splitter import *
+from scripts.writers import *
+from scripts.update import *
+from scripts.report import *
+import pandas as pd
+import os
+
+# Output files of the pipeline, in the order returned by exp_in_silico_splitter:
+# (msp name, ionization mode, CSV filename, MSP filename, JSON filename, report key prefix)
+OUTPUTS = [("POS_LC", "POS", "POS_LC.csv", "POS_LC.msp", "POS_LC.json", "pos_lc_exp"),
+           ("POS_LC_insilico", "POS", "POS_LC_In_Silico.csv", "POS_LC_insilico.msp", "POS_LC_In_Silico.json", "pos_lc_insilico"),
+           ("POS_GC", "POS", "POS_GC.csv", "POS_GC.msp", "POS_GC.json", "pos_gc_exp"),
+           ("POS_GC_insilico", "POS", "POS_GC_In_Silico.csv", "POS_GC_insilico.msp", "POS_GC_In_Silico.json", "pos_gc_insilico"),
+           ("NEG_LC", "NEG", "NEG_LC.csv", "NEG_LC.msp", "NEG_LC.json", "neg_lc_exp"),
+           ("NEG_LC_insilico", "NEG", "NEG_LC_In_Silico.csv", "NEG_LC_insilico.msp", "NEG_LC_In_Silico.json", "neg_lc_insilico"),
+           ("NEG_GC", "NEG", "NEG_GC.csv", "NEG_GC.msp", "NEG_GC.json", "neg_gc_exp"),
+           ("NEG_GC_insilico", "NEG", "NEG_GC_In_Silico.csv", "NEG_GC_insilico.msp", "NEG_GC_In_Silico.json", "neg_gc_insilico")]
+
+
+def write_outputs_batch(dataframes, output_directory, update, written_outputs, report_counts, report_inchikeys,
+                        progress_callback=None, total_items_callback=None, prefix_callback=None,
+                        item_type_callback=None):
+    """
+    Write one batch of split DataFrames to the CSV / MSP / JSON output files selected by the user.
+    The first write of an output file uses the update flag of the run (overwrite or append), the following batches
+    are always appended to it.
+
+    :param dataframes: The 8 DataFrames returned by exp_in_silico_splitter (same order as OUTPUTS).
+    :param output_directory: The project output directory.
+    :param update: Boolean indicating if the run is an update of the existing output files.
+    :param written_outputs: A set of the output names already written during this run, updated in place.
+    :param report_counts: A dictionary {report key prefix: spectrum number}, updated in place.
+    :param report_inchikeys: A dictionary {report key prefix: set of INCHIKEY}, updated in place.
+    :param progress_callback: A function to update the progress (optional).
+    :param total_items_callback: A function to set the total number of items (optional).
+    :param prefix_callback: A function to dynamically set the prefix for the operation (optional).
+    :param item_type_callback: A function to specify the type of items processed (optional).
+    :return: None
+    """
+    for df, (name, mode, csv_filename, msp_filename, json_filename, report_key) in zip(dataframes, OUTPUTS):
+        if df.empty:
+            continue
+
+        # Append to the file if it was already written during this run
+        file_update = True if name in written_outputs else update
+
+        # The MSP conversion uses the peaks list before its newlines are replaced by write_csv
+        if parameters_dict["msp"] == 1.0:
+            msp_list = dataframe_to_msp(df, name, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
+
+        if parameters_dict["csv"] == 1.0:
+            write_csv(df, csv_filename, mode, file_update, output_directory, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
+
+        if parameters_dict["msp"] == 1.0:
+            write_msp(msp_list, msp_filename, mode, file_update, output_directory, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
+
+        if parameters_dict["json"] == 1.0:
+            write_json(file_update, df, json_filename, mode, output_directory, progress_callback=progress_callback, total_items_callback=total_items_callback, prefix_callback=prefix_callback, item_type_callback=item_type_callback)
+
+        written_outputs.add(name)
+
+        # Accumulate the report values
+        report_counts[report_key] += len(df)
+        report_inchikeys[report_key].update(df['INCHIKEY'].dropna())
+
+
+def finalize_unwritten_outputs(output_directory, update, written_outputs):
+    """
+    Call the writers with no spectrum for the output files that received none during the run, so that they are
+    created (or reset) as when the whole-library pipeline writes its empty DataFrames.
+
+    :param output_directory: The project output directory.
+    :param update: Boolean indicating if the run is an update of the existing output files.
+    :param written_outputs: A set of the output names written during this run.
+    :return: None
+    """
+    for name, mode, csv_filename, msp_filename, json_filename, report_key in OUTPUTS:
+        if name in written_outputs:
+            continue
+
+        if parameters_dict["csv"] == 1.0:
+            write_csv(pd.DataFrame(), csv_filename, mode, update, output_directory)
+
+        if parameters_dict["msp"] == 1.0:
+            write_msp([], msp_filename, mode, update, output_directory)
+
+        if parameters_dict["json"] == 1.0:
+            # Appending no record to an existing JSON array would leave a trailing comma in it
+            json_file_path = os.path.join(output_directory, "JSON", mode, json_filename)
+            if not (update and os.path.exists(json_file_path) and os.path.getsize(json_file_path) > 2):
+                write_json(update, pd.DataFrame(), json_filename, mode, output_directory)
+
+
+def streaming_processing(input_path, output_directory, check_stop_flag, progress_callback=None,
+                         total_items_callback=None, prefix_callback=None, item_type_callback=None, step_callback=None,
+                         deletion_callback=None):
+    """
+    Streaming execution mode of the pipeline: the input files are parsed lazily and the spectra flow in bounded
+    batches (parameters_dict["streaming_batch_size"]) through SPLASH generation, duplicates removal, update check,
+    cleaning, mols derivation, completion, splitting and writing, so that the peak memory is bounded by the batch
+    size rather than by the library size.
+
+    The parsed spectra are first spilled to a temporary on-disk store, then read back in batches once the duplicates
+    are known, so that the same spectrum as remove_duplicatas is kept for each (SPLASH, INCHIKEY) key. Only the small
+    per-key state is kept resident: the (SPLASH, INCHIKEY) -> (best row size, spill offset) index for duplicates
+    removal, the new SPLASH for the update store and the INCHIKEY sets for the report.
+
+    :param input_path: The list of input file paths.
+    :param output_directory: The project output directory.
+    :param check_stop_flag: A function raising an exception when the user stopped the process.
+    :param progress_callback: A function to update the progress (optional).
+    :param total_items_callback: A function to set the total number of items (optional).
+    :param prefix_callback: A function to dynamically set the prefix for the operation (optional).
+    :param item_type_callback: A function to specify the type of items processed (optional).
+    :param step_callback: A function to display the current step (optional).
+    :param deletion_callback: A function to display the deletion report (optional).
+    :return: The number of spectra written to the output files.
+    """
+    batch_size = int(parameters_dict.get("streaming_batch_size", 50000))
+
+    update = parameters_dict['reset_updates'] != 1.0
+
+    # Per-key state kept between batches
+    new_splash = {}
+    written_outputs = set()
+    written_files = set()
+    report_counts = {output[5]: 0 for output in OUTPUTS}
+    report_inchikeys = {output[5]: set() for output in OUTPUTS}
+    total_inchikeys = set()
+
+    total_spectra = 0
+    new_spectra = 0
+    cleaned_spectra = 0
+    previously_cleaned = 0
+    scripts.deletion_report.duplicatas_removed = 0
+
+    # Open the update store of the previous runs, the new SPLASH are only appended at the end of the run
+    load_update_file(output_directory)
+
+    # The SPLASH of the peak lists met in the previous runs are read from the SPLASH cache of the project
+    load_splash_cache(output_directory)
+
+    # Temporary on-disk store of the spectra for the duplicates removal
+    open_duplicatas_spill(output_directory)
+
+    try:
+        batches = iter_parsed_batches(input_path, batch_size, progress_callback=progress_callback,
+                                      total_items_callback=total_items_callback, prefix_callback=prefix_callback,
+                                      item_type_callback=item_type_callback, step_callback=step_callback)
+
+        # First pass: parsing, SPLASH generation and spill of the spectra, only the best spectrum of each key is
+        # recorded in memory
+        for mode, spectrum_list in batches:
+            check_stop_flag()
+
+            total_spectra += len(spectrum_list)
+
+            # STEP 2: generating SPLASH KEY
+            spectrum_list = process_converted_after(spectrum_list, mode, progress_callback=progress_callback,
+                                                    total_items_callback=total_items_callback,
+                                                    prefix_callback=prefix_callback,
+                                                    item_type_callback=item_type_callback)
+            if not spectrum_list:
+                continue
+
+            spectrum_list = spectra_to_dataframe(spectrum_list)[scripts.globals_vars.keys_list]
+            spectrum_list = spectrum_list.astype({col: str for col in scripts.globals_vars.keys_list if col != 'PEAKS_LIST'})
+            spectrum_list = spectrum_list.to_dict(orient='records')
+            spill_duplicatas_candidates(spectrum_list, progress_callback=progress_callback,
+                                        total_items_callback=total_items_callback, prefix_callback=prefix_callback,
+                                        item_type_callback=item_type_callback)
+
+        # STEP 3: removing duplicatas, second pass over the spill store
+        if step_callback:
+            step_callback("-- REMOVING DUPLICATAS --")
+        batches = iter_deduplicated_batches(output_directory, batch_size, written_files=written_files,
+                                            progress_callback=progress_callback,
+                                            total_items_callback=total_items_callback, prefix_callback=prefix_callback,
+                                            item_type_callback=item_type_callback)
+
+        for spectrum_list in batches:
+            check_stop_flag()
+
+            # STEP 4: checking for updates
+            before = len(spectrum_list)
+            spectrum_list, batch_splash = check_for_update_batch(spectrum_list, output_directory,
+                                                                 written_files=written_files,
+                                                                 progress_callback=progress_callback,
+                                                                 total_items_callback=total_items_callback,
+                                                                 prefix_callback=prefix_callback,
+                                                                 item_type_callback=item_type_callback)
+            previously_cleaned += before - len(spectrum_list)
+            new_spectra += len(spectrum_list)
+
+            if not spectrum_list:
+                continue
+
+            check_stop_flag()
+
+            # STEP 4: cleaning spectrums (Multithreaded)
+            spectrum_list = spectrum_cleaning_processing(spectrum_list, output_directory,
+                                                         progress_callback=progress_callback,
+                                                         total_items_callback=total_items_callback,
+                                                         prefix_callback=prefix_callback,
+                                                         item_type_callback=item_type_callback,
+                                                         written_files=written_files)
+
+            if not spectrum_list:
+                new_splash.update(batch_splash)
+                continue
+
+            check_stop_flag()
+
+            # The peaks stay numpy arrays up to the writers
+            spectrum_list = pd.DataFrame(spectrum_list)[scripts.globals_vars.keys_list]
+            spectrum_list = spectrum_list.astype({col: str for col in scripts.globals_vars.keys_list if col != 'PEAKS_LIST'})
+
+            # STEP 5: mols derivations and calculations
+            spectrum_list = mols_derivation_and_calculation(spectrum_list, output_directory,
+                                                            progress_callback=progress_callback,
+                                                            total_items_callback=total_items_callback,
+                                                            prefix_callback=prefix_callback,
+                                                            item_type_callback=item_type_callback,
+                                                            written_files=written_files)
+
+            if spectrum_list.empty:
+                new_splash.update(batch_splash)
+                continue
+
+            check_stop_flag()
+
+            # STEP 6: completing missing metadata from pubchem datas
+            spectrum_list = complete_from_pubchem_datas(spectrum_list, progress_callback=progress_callback,
+                                                        total_items_callback=total_items_callback,
+                                                        prefix_callback=prefix_callback,
+                                                        item_type_callback=item_type_callback)
+
+            # STEP 7: completing missing names
+            spectrum_list = ontologies_completion(spectrum_list, progress_callback=progress_callback,
+                                                  total_items_callback=total_items_callback,
+                                                  prefix_callback=prefix_callback,
+                                                  item_type_callback=item_type_callback)
+
+            check_stop_flag()
+
+            # STEP 8: DE NOVO CALCULATIONS
+            if parameters_dict["calculate_de_novo"] == 1.0:
+                spectrum_list = de_novo_calculation(spectrum_list, progress_callback=progress_callback,
+                                                    total_items_callback=total_items_callback,
+                                                    prefix_callback=prefix_callback,
+                                                    item_type_callback=item_type_callback)
+
+                check_stop_flag()
+
+            spectrum_list = normalize_to_not_found(spectrum_list)
+            total_inchikeys.update(spectrum_list['INCHIKEY'].dropna())
+            cleaned_spectra += len(spectrum_list)
+
+            # STEP 9: SPLITTING
+            POS_df, NEG_df = split_pos_neg(spectrum_list, progress_callback=progress_callback,
+                                           total_items_callback=total_items_callback, prefix_callback=prefix_callback,
+                                           item_type_callback=item_type_callback)
+            del spectrum_list
+
+            POS_LC_df, POS_GC_df, NEG_LC_df, NEG_GC_df = split_LC_GC(POS_df, NEG_df,
+                                                                     progress_callback=progress_callback,
+                                                                     total_items_callback=total_items_callback,
+                                                                     prefix_callback=prefix_callback,
+                                                                     item_type_callback=item_type_callback)
+            del POS_df
+            del NEG_df
+
+            dataframes = exp_in_silico_splitter(POS_LC_df, POS_GC_df, NEG_LC_df, NEG_GC_df,
+                                                progress_callback=progress_callback,
+                                                total_items_callback=total_items_callback,
+                                                prefix_callback=prefix_callback,
+                                                item_type_callback=item_type_callback)
+
+            check_stop_flag()
+
+            # STEP 10: writting output files
+            if step_callback:
+                step_callback("--  WRITING OUTPUT FILES --")
+            write_outputs_batch(dataframes, output_directory, update, written_outputs, report_counts,
+                                report_inchikeys, progress_callback=progress_callback,
+                                total_items_callback=total_items_callback, prefix_callback=prefix_callback,
+                                item_type_callback=item_type_callback)
+
+            # The SPLASH of a batch are only saved once its spectra are written
+            new_splash.update(batch_splash)
+
+    finally:
+        # Delete the spill store of the duplicates removal
+        close_duplicatas_spill()
+
+        # Append the new SPLASH to the update store
+        save_update_file(output_directory, new_splash)
+
+        # Evict the least recently used entries of the SPLASH cache and close it (the entries are committed per batch)
+        save_splash_cache(output_directory)
+
+    # All the input files were read to the end: record their fingerprints
+    save_input_fingerprints(output_directory, input_path)
+
+    scripts.deletion_report.previously_cleaned = previously_cleaned
+
+    if deletion_callback:
+        deletion_callback(f"duplicatas removed: {scripts.deletion_report.duplicatas_removed}")
+        deletion_callback(f"previously cleaned: {scripts.deletion_report.previously_cleaned}")
+
+    if total_spectra == 0:
+        if deletion_callback:
+            deletion_callback("-- THERE IS NO FILES TO PROCESS, EXITING PROCESS --")
+        return 0
+
+    if new_spectra == 0:
+        if deletion_callback:
+            deletion_callback("There is no new spectrums to process. Exiting code !")
+        return 0
+
+    if deletion_callback:
+        deletion_callback(
+            f"""
+            No peaks list: {scripts.deletion_report.no_peaks_list}
+            No smiles, no inchi, no inchikey: {scripts.deletion_report.no_smiles_no_inchi_no_inchikey}
+            No precursor mz: {scripts.deletion_report.no_precursor_mz}
+            No or bad adduct: {scripts.deletion_report.no_or_bad_adduct}
+            Low entropy score: {scripts.deletion_report.low_entropy_score}
+            Minimum peaks not required: {scripts.deletion_report.minimum_peaks_not_requiered}
+            All peaks above precursor mz: {scripts.deletion_report.all_peaks_above_precursor_mz}
+            No peaks in mz range: {scripts.deletion_report.no_peaks_in_mz_range}
+            Minimum high peaks not required: {scripts.deletion_report.minimum_high_peaks_not_requiered}
+            """
+        )
+        deletion_callback(instrument_cache_report())
+        if normalizer_timings_report():
+            deletion_callback(normalizer_timings_report())
+
+    if cleaned_spectra == 0:
+        if deletion_callback:
+            deletion_callback("-- THERE IS NO SPECTRUMS TO PROCESS AFTER CLEANING, EXITING PROCESS --")
+        return 0
+
+    # Outputs without any spectrum are written like in the whole-library pipeline
+    finalize_unwritten_outputs(output_directory, update, written_outputs)
+
+    if deletion_callback:
+        deletion_callback(
+            f"Total deletions: {sum([scripts.deletion_report.duplicatas_removed, scripts.deletion_report.previously_cleaned, scripts.deletion_report.no_peaks_list, scripts.deletion_report.no_smiles_no_inchi_no_inchikey, scripts.deletion_report.no_precursor_mz, scripts.deletion_report.low_entropy_score, scripts.deletion_report.minimum_peaks_not_requiered, scripts.deletion_report.all_peaks_above_precursor_mz, scripts.deletion_report.no_peaks_in_mz_range, scripts.deletion_report.minimum_high_peaks_not_requiered])}"
+        )
+
+    # Fill the report from the values accumulated over the batches
+    for report_key in report_counts:
+        scripts.global_report.report_dict[f"{report_key}_spectrum_number"] = report_counts[report_key]
+        scripts.global_report.report_dict[f"{report_key}_spectrum_unique_inchikey"] = len(report_inchikeys[report_key])
+    scripts.global_report.report_dict["TOTAL_unique_inchikey"] = len(total_inchikeys)
+
+    write_report(output_directory)
+
+    return cleaned_spectra
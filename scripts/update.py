@@ -1,72 +1,269 @@
 from scripts.calculate_maximized_chunk_size import *
-import concurrent.futures
+from scripts.bloom_filter import *
 import scripts.deletion_report
 import pandas as pd
 import os.path
+import sqlite3
 import json
 
-def init_json_update_file(json_update_file):
+# Incremental state of the project: the SPLASH of every spectrum processed in the previous runs, indexed in SQLite
+UPDATE_STORE_FILENAME = "updates.sqlite"
+
+# Former incremental state file (a JSON {"SPLASH_LIST": {SPLASH: True}}), migrated to the store on first use
+LEGACY_UPDATE_FILENAME = "updates.json"
+
+# Bloom filter of the SPLASH of the update store, rejecting most new SPLASH without querying the store
+UPDATE_BLOOM_FILENAME = "updates_bloom.npz"
+
+# Minimum capacity of the Bloom filter, it is rebuilt with twice the number of stored SPLASH when full
+MIN_BLOOM_CAPACITY = 1000000
+
+# Number of SPLASH per membership query (SQLite accepts at most 999 parameters per statement on old versions)
+SPLASH_QUERY_SIZE = 900
+
+# Number of SPLASH read at once from the store when the Bloom filter is rebuilt
+BLOOM_REBUILD_FETCH_SIZE = 100000
+
+global update_store, update_bloom
+# Connection to the update store of the project, opened by load_update_file
+update_store = None
+# Bloom filter of the SPLASH of the update store, loaded (or rebuilt) by load_update_file
+update_bloom = None
+
+
+def get_store_generation(connection):
+    """
+    Returns the generation of the update store, incremented by every insertion: a Bloom filter saved with another
+    generation is stale.
+
+    :param connection: The connection to the update store.
+    :return: The generation of the update store.
+    """
+    row = connection.execute("SELECT value FROM metadata WHERE key = 'generation'").fetchone()
+
+    return row[0] if row else 0
+
+
+def insert_splash(connection, splash_list):
+    """
+    Appends SPLASH to the update store and increments its generation, in a single transaction.
+
+    :param connection: The connection to the update store.
+    :param splash_list: An iterable of SPLASH.
+    :return: The new generation of the update store.
+    """
+    with connection:
+        connection.executemany("INSERT OR IGNORE INTO splash_list (splash) VALUES (?)",
+                               ((splash,) for splash in splash_list))
+        generation = get_store_generation(connection) + 1
+        connection.execute("INSERT OR REPLACE INTO metadata (key, value) VALUES ('generation', ?)", (generation,))
+
+    return generation
+
+
+def rebuild_update_bloom(output_directory):
+    """
+    Rebuilds the Bloom filter from the authoritative update store and writes it to disk.
+
+    :param output_directory: The project output directory.
+    :return: The Bloom filter.
+    """
+    global update_bloom
+
+    count = update_store.execute("SELECT COUNT(*) FROM splash_list").fetchone()[0]
+
+    # Room for as many new SPLASH as already stored before the next rebuild
+    update_bloom = create_bloom_filter(max(MIN_BLOOM_CAPACITY, 2 * count))
+
+    cursor = update_store.execute("SELECT splash FROM splash_list")
+    rows = cursor.fetchmany(BLOOM_REBUILD_FETCH_SIZE)
+    while rows:
+        bloom_add(update_bloom, [row[0] for row in rows])
+        rows = cursor.fetchmany(BLOOM_REBUILD_FETCH_SIZE)
+
+    save_bloom_filter(update_bloom, os.path.join(output_directory, UPDATE_BLOOM_FILENAME),
+                      get_store_generation(update_store))
+
+    return update_bloom
+
+
+def load_update_bloom(output_directory):
+    """
+    Loads the Bloom filter of the update store, rebuilt from the store when it is missing, stale or full.
+
+    :param output_directory: The project output directory.
+    :return: The Bloom filter.
+    """
+    global update_bloom
+
+    update_bloom, generation = load_bloom_filter(os.path.join(output_directory, UPDATE_BLOOM_FILENAME))
+
+    if update_bloom is None or generation != get_store_generation(update_store) or update_bloom["count"] > update_bloom["capacity"]:
+        rebuild_update_bloom(output_directory)
+
+    return update_bloom
+
+
+def migrate_update_file(connection, output_directory):
+    """
+    Migrates the SPLASH list of the legacy updates.json file to the update store, then removes the JSON file.
+    The insertions are idempotent, so an interrupted migration is simply done again on the next run.
+
+    :param connection: The connection to the update store.
+    :param output_directory: The project output directory.
+    :return: The number of migrated SPLASH.
+    """
+    legacy_file_path = os.path.join(output_directory, LEGACY_UPDATE_FILENAME)
+
+    if not os.path.isfile(legacy_file_path):
+        return 0
+
+    # Open the JSON file containing the previous update status
+    with open(legacy_file_path, 'r') as f:
+        json_update_file = json.load(f)
+
+    splash_list = json_update_file.get("SPLASH_LIST", {}) if json_update_file else {}
+
+    insert_splash(connection, splash_list)
+
+    # The JSON file is only removed once its SPLASH are committed to the store
+    os.remove(legacy_file_path)
+
+    return len(splash_list)
+
+
+def load_update_file(output_directory):
+    """
+    Opens the update store of the project (updates.sqlite, created if needed) containing the SPLASH of the previous
+    runs, migrates the legacy updates.json file if there is one and loads the Bloom filter of the store.
+
+    :param output_directory: The project output directory.
+    :return: The connection to the update store.
+    """
+    global update_store
+
+    # Close the store of a previous run
+    close_update_file()
+
+    update_store_path = os.path.join(output_directory, UPDATE_STORE_FILENAME)
+    update_store = sqlite3.connect(update_store_path)
+
+    # A single indexed column: the SPLASH are only inserted and looked up
+    update_store.execute("CREATE TABLE IF NOT EXISTS splash_list (splash TEXT PRIMARY KEY) WITHOUT ROWID")
+    update_store.execute("CREATE TABLE IF NOT EXISTS metadata (key TEXT PRIMARY KEY, value INTEGER)")
+    update_store.commit()
+
+    migrate_update_file(update_store, output_directory)
+
+    load_update_bloom(output_directory)
+
+    return update_store
+
+
+def close_update_file():
+    """
+    Closes the update store, if opened.
+
+    :return: None
+    """
+    global update_store, update_bloom
+
+    if update_store is not None:
+        update_store.close()
+        update_store = None
+
+    update_bloom = None
+
+
+def query_processed_splash(splash_list):
     """
-    :param json_update_file: The JSON update file to be initialized. It should be a dictionary or None.
-    :return: The initialized JSON update file. If the input JSON update file is None, a new dictionary will be created with the key "SPLASH_LIST" and an empty list as its value. If the
-    * input JSON update file is not None, it will be returned as is.
+    Batched membership query: returns the SPLASH of splash_list already processed in a previous run. The Bloom filter
+    rejects most new SPLASH, only the possible matches are queried in the store.
+
+    :param splash_list: A list of SPLASH.
+    :return: The set of the SPLASH of splash_list found in the update store.
     """
-    # Initialize the "first run" flag as False
+    processed_splash = set()
+
+    # Unique SPLASH
+    splash_list = list(dict.fromkeys(splash_list))
+
+    # Only keep the SPLASH possibly in the store, queried by chunks of SPLASH_QUERY_SIZE
+    if update_bloom is not None:
+        splash_list = [splash for splash, candidate in zip(splash_list, bloom_contains(update_bloom, splash_list).tolist())
+                       if candidate]
 
-    # If the json_update_file is not provided (None), set the "first run" flag to True,
-    # and initialize a new dictionary with "SPLASH_LIST" key and an empty value,
-    # then return this dictionary and the first_run flag
-    if not bool(json_update_file):
-        # Creating a new dictionary to represent the JSON update file
-        json_update_file = {"SPLASH_LIST": {}}
-        return json_update_file
+    for start in range(0, len(splash_list), SPLASH_QUERY_SIZE):
+        chunk = splash_list[start:start + SPLASH_QUERY_SIZE]
+        query = "SELECT splash FROM splash_list WHERE splash IN (%s)" % ", ".join("?" * len(chunk))
+        processed_splash.update(row[0] for row in update_store.execute(query, chunk))
+
+    return processed_splash
+
+
+def save_update_file(output_directory, new_splash):
+    """
+    Appends the SPLASH of the newly processed spectra to the update store and to its Bloom filter, and closes it.
+
+    :param output_directory: The project output directory.
+    :param new_splash: A dictionary {SPLASH: True} of the spectra processed during this run.
+    :return: None
+    """
+    # The store may have been closed (or never opened) if the run stopped early
+    if update_store is None:
+        load_update_file(output_directory)
+
+    # Append-only inserts, in a single transaction
+    generation = insert_splash(update_store, new_splash)
+
+    # Keep the Bloom filter in sync with the store, rebuilt larger when full
+    bloom_add(update_bloom, list(new_splash))
+    if update_bloom["count"] > update_bloom["capacity"]:
+        rebuild_update_bloom(output_directory)
     else:
-        # If json_update_file is already provided, simply return it as is along with the first_run flag
-        return json_update_file
+        save_bloom_filter(update_bloom, os.path.join(output_directory, UPDATE_BLOOM_FILENAME), generation)
 
+    close_update_file()
 
 
-def check_for_update(spectrum):
+def check_for_update(spectrum, processed_splash):
     """
     :param spectrum: The spectrum to check for updates.
-    :return: If the spectrum is not found in the dictionary or the dictionary is empty, returns the spectrum and the fraghub_id_spectrum. Otherwise, appends the spectrum to the deleted_spectrum_list and returns None.
+    :param processed_splash: The set of the SPLASH of the batch already processed in a previous run.
+    :return: If the spectrum was not processed in a previous run, returns the spectrum and the fraghub_id_spectrum. Otherwise, appends the spectrum to the deleted_spectrum_list and returns None.
     """
     # Extract the SPLASH from the provided spectrum
     fraghub_id_spectrum = spectrum["SPLASH"]
 
-    # Get the dictionary of SPLASH from the json file
-    fraghub_id_dict = json_update_file["SPLASH_LIST"]
-
-    # Check if the fraghub_id_dict is empty or if fraghub_id_spectrum does not exist in the fraghub_id_dict
-    if not fraghub_id_dict or fraghub_id_spectrum not in fraghub_id_dict:
-        # If the dictionary is empty, or the SPLASH is not present in the dictionary, an update is needed. Return the spectrum and the SPLASH
+    # Check if fraghub_id_spectrum was not processed in a previous run
+    if fraghub_id_spectrum not in processed_splash:
+        # The SPLASH is not present in the update store, an update is needed. Return the spectrum and the SPLASH
         return spectrum, fraghub_id_spectrum
     else:
         spectrum['DELETION_REASON'] = "spectrum deleted because already processed in a previous run."
-        # If the SPLASH is found in the dictionary, an update is not needed.
+        # If the SPLASH is found in the update store, an update is not needed.
         # Append the spectrum to the deleted_spectrum_list
         scripts.deletion_report.deleted_spectrum_list.append(spectrum)
         # Return None since no update is needed
         return None
 
 
-def check_for_update_processing(spectrum_list, output_directory, progress_callback=None, total_items_callback=None,
-                                prefix_callback=None, item_type_callback=None):
+def check_for_update_batch(spectrum_list, output_directory, written_files=None, progress_callback=None,
+                           total_items_callback=None, prefix_callback=None, item_type_callback=None):
     """
-    Check for updates in the given spectrum list using a profile name, with progress reporting via callbacks.
+    Check a batch of spectra against the update store opened by load_update_file, with progress reporting via callbacks.
+    Spectra already processed in a previous run are written to DELETED_SPECTRUMS/previously_cleaned.csv.
 
     :param spectrum_list: A list of spectrums to check for updates.
-    :param profile_name: The name of the profile to use for checking updates.
+    :param output_directory: The project output directory.
+    :param written_files: A set of the deletion files already written during this run, appended to instead of being
+                          overwritten. Updated in place.
     :param progress_callback: A function to update the progress (processed items).
     :param total_items_callback: A function to set the total number of items (optional).
     :param prefix_callback: A function to dynamically set the prefix for the operation (optional).
     :param item_type_callback: A function to specify the type of items (optional).
-    :return: A tuple (updated spectrum list, update flag, first run flag).
+    :return: A tuple (updated spectrum list, dictionary of new SPLASH).
     """
-    global json_update_file
-
-    total = len(spectrum_list)
-
     # Extra task prefix
     if prefix_callback:
         prefix_callback("checking for updates:")
@@ -79,65 +276,110 @@ def check_for_update_processing(spectrum_list, output_directory, progress_callba
     if total_items_callback:
         total_items_callback(len(spectrum_list), 0)  # Total = len(spectrum_list), Completed = 0
 
-    update_file_path = os.path.join(output_directory, "updates.json")
-    # Open the JSON file containing the previous update status
-    with open(update_file_path, 'r') as f:
-        json_update_file = json.load(f)
+    # Batched membership query of the SPLASH of the batch in the update store
+    processed_splash = query_processed_splash([spectrum["SPLASH"] for spectrum in spectrum_list])
 
-    # Initialize the update file and first run flag
-    json_update_file = init_json_update_file(json_update_file)
+    # Check each spectrum against the SPLASH found
+    results = [check_for_update(spectrum, processed_splash) for spectrum in spectrum_list]
 
-    # Define chunk size for parallel processing
-    chunk_size = calculate_maximized_chunk_size(data_list=spectrum_list)
+    # Update progress callback if provided
+    if progress_callback:
+        progress_callback(len(spectrum_list))
 
-    # Final list to store successfully checked spectra
-    final = []
-    processed_items = 0  # Track the number of processed items
+    # Final list of successfully checked spectra
+    final = [res for res in results if res is not None]
 
-    # Iterate through the spectrum list in chunks
-    for i in range(0, len(spectrum_list), chunk_size):
-        chunk = spectrum_list[i:i + chunk_size]
+    # Create a cleaned list with only updated spectra
+    final_spectrum_list = [res[0] for res in final]
 
-        # Use ThreadPoolExecutor for parallel processing
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # Check each spectrum in the chunk
-            results = list(executor.map(check_for_update, chunk))
+    # Generate a new SPLASH list
+    new_splash = {res[1]: True for res in final}
 
-        # Add successfully checked spectra to the final list
-        final.extend([res for res in results if res is not None])
+    deleted_spectrums_dir = os.path.join(output_directory, 'DELETED_SPECTRUMS')
+    previously_cleaned_file = os.path.join(deleted_spectrums_dir, 'previously_cleaned.csv')
+    deleted_spectra_df = pd.DataFrame(scripts.deletion_report.deleted_spectrum_list)
+    if written_files is not None and previously_cleaned_file in written_files:
+        # Append without headers, the file was already written during this run
+        if not deleted_spectra_df.empty:
+            deleted_spectra_df.to_csv(previously_cleaned_file, mode='a', sep='\t', index=False, quotechar='"', header=False)
+    else:
+        deleted_spectra_df.to_csv(previously_cleaned_file, sep='\t', index=False, quotechar='"')
+        # An empty batch has no columns to write as header: the file is written again by the next non-empty batch
+        if written_files is not None and not deleted_spectra_df.empty:
+            written_files.add(previously_cleaned_file)
 
-        # Update the number of processed items
-        processed_items += len(chunk)
+    # Reinitialize the deleted_spectrum_list to free memory
+    scripts.deletion_report.deleted_spectrum_list = []
 
-        # Update progress callback if provided
-        if progress_callback:
-            progress_callback(processed_items)
+    # Return the checked spectrum list and the new SPLASH
+    return final_spectrum_list, new_splash
 
-    # Create a cleaned list with only updated spectra
-    final_spectrum_list = [res[0] for res in final]
 
-    # Generate a new SPLASH list
-    new_splash = {res[1]: True for res in final}
+def check_for_update_processing(spectrum_list, output_directory, progress_callback=None, total_items_callback=None,
+                                prefix_callback=None, item_type_callback=None):
+    """
+    Check for updates in the given spectrum DataFrame, with progress reporting via callbacks. The membership of the
+    SPLASH in the update store is tested column-wise, only the spectra to process are converted to dictionaries.
+    Spectra already processed in a previous run are written to DELETED_SPECTRUMS/previously_cleaned.csv.
 
-    # Determine whether an update occurred
-    update = bool(final)
+    :param spectrum_list: A DataFrame of spectrums (output of remove_duplicatas) to check for updates.
+    :param output_directory: The project output directory.
+    :param progress_callback: A function to update the progress (processed items).
+    :param total_items_callback: A function to set the total number of items (optional).
+    :param prefix_callback: A function to dynamically set the prefix for the operation (optional).
+    :param item_type_callback: A function to specify the type of items (optional).
+    :return: A tuple (list of the spectrums to process, update flag).
+    """
+    total = len(spectrum_list)
 
-    # Update the SPLASH list in the JSON file
-    json_update_file["SPLASH_LIST"].update(new_splash)
+    # Extra task prefix
+    if prefix_callback:
+        prefix_callback("checking for updates:")
 
-    # Write the updated JSON file back to disk
-    with open(update_file_path, 'w') as f:
-        json.dump(json_update_file, f, ensure_ascii=False, indent=4)
+    # Specify the type of item being processed
+    if item_type_callback:
+        item_type_callback("spectra")
 
-    scripts.deletion_report.previously_cleaned = total - len(final_spectrum_list)
+    # Define the total number of items using the callback
+    if total_items_callback:
+        total_items_callback(total, 0)  # Total = len(spectrum_list), Completed = 0
+
+    # Load the SPLASH list of the previous runs
+    load_update_file(output_directory)
 
+    # Batched membership query of the SPLASH in the update store
+    processed_splash = query_processed_splash(spectrum_list['SPLASH'].tolist())
+    already_processed = spectrum_list['SPLASH'].isin(processed_splash)
+
+    # Update progress callback if provided
+    if progress_callback:
+        progress_callback(total)
+
+    # Write the spectra already processed in a previous run
+    deleted_spectra_df = spectrum_list[already_processed]
+    if deleted_spectra_df.empty:
+        deleted_spectra_df = pd.DataFrame()
+    else:
+        deleted_spectra_df = deleted_spectra_df.assign(
+            DELETION_REASON="spectrum deleted because already processed in a previous run.")
     deleted_spectrums_dir = os.path.join(output_directory, 'DELETED_SPECTRUMS')
     previously_cleaned_file = os.path.join(deleted_spectrums_dir, 'previously_cleaned.csv')
-    deleted_spectra_df = pd.DataFrame(scripts.deletion_report.deleted_spectrum_list)
     deleted_spectra_df.to_csv(previously_cleaned_file, sep='\t', index=False, quotechar='"')
 
-    # Reinitialize the deleted_spectrum_list to free memory
-    scripts.deletion_report.deleted_spectrum_list = []
+    del deleted_spectra_df
+
+    # Convert only the spectra to process to dictionaries
+    spectrum_list = spectrum_list[~already_processed]
+    new_splash = dict.fromkeys(spectrum_list['SPLASH'], True)
+    final_spectrum_list = spectrum_list.to_dict('records')
+
+    # Determine whether an update occurred
+    update = bool(final_spectrum_list)
+
+    # Append the new SPLASH to the update store
+    save_update_file(output_directory, new_splash)
+
+    scripts.deletion_report.previously_cleaned = total - len(final_spectrum_list)
 
     # Return the final spectrum list, the update flag, and the first run flag
     return final_spectrum_list, update
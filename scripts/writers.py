@@ -1,4 +1,5 @@
 from scripts.set_projects import parameters_dict
+from scripts.peak_arrays import *
 import pandas as pd
 import numpy as np
 import json
@@ -122,9 +123,8 @@ def write_csv(df, filename, mode, update, output_directory, progress_callback=No
     :param item_type_callback: Callable, function to indicate the type of elements being processed.
     :return: None.
     """
-    # Replace newline characters with semicolons in the PEAKS_LIST column
-    if 'PEAKS_LIST' in df.columns:
-        df['PEAKS_LIST'] = df['PEAKS_LIST'].str.replace('\n', ';', regex=False)
+    # Format the peak arrays of the PEAKS_LIST column to text, with semicolons between the peaks
+    df = format_peaks_column(df, ";")
 
     # Construct the file path dynamically
     output_file_path = f"{output_directory}/CSV/{mode}/{filename}"
@@ -284,8 +284,13 @@ def write_json(update: bool, df: pd.DataFrame, filename: str, mode: str, output_
                     num_peaks_int = 0
 
                 peaks_array = []
-                if isinstance(peaks_list_str, str) and peaks_list_str:
-                    for pair in peaks_list_str.strip().split(';'):
+                if isinstance(peaks_list_str, np.ndarray):
+                    # Peak arrays are written as they are, without text round trip
+                    peaks_array = peaks_list_str.tolist()
+                elif isinstance(peaks_list_str, str) and peaks_list_str:
+                    # Text peak lists (annotated by the de novo calculation)
+                    separator = ';' if ';' in peaks_list_str else '\n'
+                    for pair in peaks_list_str.strip().split(separator):
                         values = pair.split(maxsplit=2)
                         if len(values) >= 2:
                             try:
@@ -0,0 +1,84 @@
+from scripts.normalizer.normalize_instruments_and_resolution import clean_instrument, clean_instrument_type, clean_comment
+import random
+import re
+import pytest
+
+
+def reference_clean_instrument(instrument):
+    """
+    Former cleaning of the instrument names: the successive re.sub of the rule table, without the hyphen rule.
+    """
+    instrument = re.sub("-tof", "tof", instrument)
+    instrument = re.sub("q-", "q", instrument)
+    instrument = re.sub("q exactive", " qexactive ", instrument)
+    instrument = re.sub("applied biosystems", " sciex ", instrument)
+    instrument = re.sub(" ab ", " sciex ", instrument)
+    instrument = re.sub("sciex", " sciex ", instrument)
+    instrument = re.sub("triple(-| )?tof", " qqq ", instrument)
+    instrument = re.sub("triple(-| )?quad", " qqq ", instrument)
+    instrument = re.sub("... uplc ...", " ", instrument)
+
+    return instrument
+
+
+def reference_clean_comment(comment):
+    """
+    Former cleaning of the instrument types and of the comments: the successive re.sub of the rule table.
+    """
+    comment = re.sub("-tof", "tof", comment)
+    comment = re.sub("q-", "q", comment)
+    comment = re.sub("-", " ", comment)
+    comment = re.sub("q exactive", " qexactive ", comment)
+    comment = re.sub("applied biosystems", " sciex ", comment)
+    comment = re.sub(" ab ", " sciex ", comment)
+    comment = re.sub("sciex", " sciex ", comment)
+    comment = re.sub("triple(-| )?tof", " qqq ", comment)
+    comment = re.sub("triple(-| )?quad", " qqq ", comment)
+    comment = re.sub("... uplc ...", " ", comment)
+
+    return comment
+
+
+CLEANINGS = [(clean_instrument, reference_clean_instrument),
+             (clean_instrument_type, reference_clean_comment),
+             (clean_comment, reference_clean_comment)]
+
+# Pieces of the rules, assembled at random so that the rules overlap and cascade
+TOKENS = ["-", "tof", "q", "-tof", "q-", " ", "q exactive", "applied biosystems", " ab ", "ab", "sciex", "triple",
+          "triple-tof", "triple tof", "quad", "uplc", " uplc ", "abc", "x", "--", "qq", "exactive", "applied",
+          "biosystems", "orbitrap", "esi", "."]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_strings(seed):
+    rng = random.Random(seed)
+
+    for _ in range(20000):
+        text = "".join(rng.choice(TOKENS) for _ in range(rng.randint(0, 10)))
+
+        for cleaning, reference in CLEANINGS:
+            assert cleaning(text) == reference(text), (cleaning.__name__, text)
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    # The hyphen rule creates " ab ", replaced by the next rules
+    "waters-ab-sciex",
+    "x -ab- y",
+    # "applied biosystems" becomes " sciex ", padded again by the "sciex" rule
+    "applied biosystems 4000 qtrap",
+    "absciex triple-tof 5600",
+    # "q-" and "-tof" before the hyphen rule
+    "q-tof premier",
+    "maxis-tof q-exactive",
+    "thermo q exactive hf",
+    "agilent triple quad 6460",
+    "triple--tof",
+    "acquity uplc system",
+    "uplc at start",
+    "ends with a uplc",
+    "lc-esi-qtof; waters xevo g2 uplc-ms",
+])
+def test_cascade_cases(text):
+    for cleaning, reference in CLEANINGS:
+        assert cleaning(text) == reference(text)
@@ -0,0 +1,56 @@
+from scripts.convertors.parsing_to_dict import iter_spectrum_from_json
+from scripts.convertors.loaders import sniff_json_format, JSON_SNIFF_SIZE
+import tracemalloc
+import pytest
+
+
+@pytest.mark.parametrize("content, json_format, names", [
+    (b'[{"NAME": "a"},\n{"NAME": "b"}]', "array", ["a", "b"]),
+    (b'[\n  {\n    "NAME": "a"\n  }\n]\n', "array", ["a"]),
+    (b'{"NAME": "a"}\n\n{"NAME": "b"}\n', "ndjson", ["a", "b"]),
+    (b'{"NAME": "a"}', "ndjson", ["a"]),
+    (b'\xef\xbb\xbf{"NAME": "a"}\n', "ndjson", ["a"]),
+    (b'{\n  "NAME": "a"\n}\n', "array", []),
+    (b'', "ndjson", []),
+    (b'\n  \n', "ndjson", []),
+])
+def test_json_format(tmp_path, content, json_format, names):
+    json_file_path = tmp_path / "spectra.json"
+    json_file_path.write_bytes(content)
+
+    assert sniff_json_format(str(json_file_path)) == json_format
+    assert [spectrum["NAME"] for spectrum in iter_spectrum_from_json(str(json_file_path))] == names
+
+
+def test_sniff_reads_a_bounded_prefix(tmp_path):
+    # Minified JSON array on a single line, much larger than the sniffed prefix
+    spectrum = b'{"NAME": "a", "PEAKS_LIST": "' + b"100.0 1.0;" * 100 + b'"}'
+    json_file_path = tmp_path / "minified.json"
+    json_file_path.write_bytes(b" " * 10 + b"[" + b",".join([spectrum] * 20000) + b"]")
+    assert json_file_path.stat().st_size > 10 * JSON_SNIFF_SIZE
+
+    tracemalloc.start()
+    try:
+        json_format = sniff_json_format(str(json_file_path))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert json_format == "array"
+    assert peak < 3 * JSON_SNIFF_SIZE
+
+
+def test_sniff_long_first_line(tmp_path):
+    # A pretty-printed object whose first line is longer than the sniffed prefix is not decoded as NDJSON
+    json_file_path = tmp_path / "long_line.json"
+    json_file_path.write_bytes(b'{"NAME": "' + b"a" * (2 * JSON_SNIFF_SIZE) + b'",\n"PEAKS_LIST": ""}\n')
+
+    tracemalloc.start()
+    try:
+        json_format = sniff_json_format(str(json_file_path))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert json_format == "array"
+    assert peak < 3 * JSON_SNIFF_SIZE
@@ -0,0 +1,138 @@
+from scripts.convertors.msp_to_dict import extract_metadata_and_peak_list, peak_list_to_array
+import scripts.globals_vars
+import random
+import re
+import pytest
+
+
+def outcome(function, argument):
+    """
+    Result of a function, or the type of the exception it raises (the peak lists with "," decimal separators raise a
+    ValueError in both implementations).
+    """
+    try:
+        return function(argument)
+    except Exception as error:
+        return type(error)
+
+
+def reference_extract_metadata_and_peak_list(spectrum):
+    """
+    Former splitter of the MSP spectra: groups 1 and 2 of metadata_peak_list_split_pattern_msp.
+    """
+    match = re.search(scripts.globals_vars.metadata_peak_list_split_pattern_msp, spectrum)
+
+    return (match.group(1), match.group(2)) if match else (None, None)
+
+
+def reference_peak_list_to_array(peak_list):
+    """
+    Former conversion of the MSP peak lists: all the matches of peak_list_split_pattern.
+    """
+    return [[float(i), float(j)] for i, j in re.findall(scripts.globals_vars.peak_list_split_pattern, peak_list)]
+
+
+METADATA_LINES = [
+    "NAME: Caffeine",
+    "Name: 1,3,7-trimethylpurine-2,6-dione",
+    "PRECURSORMZ: 195.0877",
+    "PrecursorMZ: 195,0877",
+    "PRECURSORTYPE: [M+H]+",
+    "IONMODE: Positive",
+    "FORMULA: C8H10N4O2",
+    "SMILES: CN1C=NC2=C1C(=O)N(C(=O)N2C)C",
+    "INCHIKEY: RYYVLZVUVIJVGH-UHFFFAOYSA-N",
+    "RETENTIONTIME: 3.21",
+    "Comments: \"SMILES=CCO\" \"computed mass=46.04\" \"retention time=3.2 min\"",
+    "Comment: acquired on 2019:05:12 12:30",
+    "Synon: $:00in-source",
+    "Synon: $:28HCD 35",
+    "COLLISIONENERGY: 35 eV",
+    "INSTRUMENT: Orbitrap",
+    "MSLEVEL: 2",
+    "Ontology: Purines",
+    "DB#: MSBNK-001",
+    "Num Peaks: 3",
+    "NUM PEAKS: 12",
+    "NOTE 12 34",
+    "",
+]
+
+PEAK_SEPARATORS = [" ", "\t", "  ", ":", " \t "]
+
+PEAK_ANNOTATIONS = ["", "", "", " \"p-CH3\"", "\t\"C8H11N4O2+/0.2ppm\"", " 1", " ?", " a:b", ";"]
+
+
+def random_number(rng):
+    """
+    A random number as written in the MSP files (integer, decimal, "," decimal separator, exponent, negative).
+    """
+    value = rng.choice([
+        str(rng.randint(0, 2000)),
+        "%.4f" % rng.uniform(0, 2000),
+        "%.1f" % rng.uniform(0, 100),
+        "%.2e" % rng.uniform(0, 1e6),
+        "%.3E" % rng.uniform(0, 1e3),
+        ("%.3f" % rng.uniform(0, 1000)).replace(".", ","),
+        str(rng.randint(0, 99)) + ".",
+    ])
+
+    return "-" + value if rng.random() < 0.05 else value
+
+
+def random_peak_line(rng):
+    return random_number(rng) + rng.choice(PEAK_SEPARATORS) + random_number(rng) + rng.choice(PEAK_ANNOTATIONS)
+
+
+def random_spectrum(rng):
+    """
+    A random MSP spectrum: metadata lines followed by peak lines, with the irregularities met in the input libraries
+    (CRLF, blank lines, metadata after the peaks, annotations, no peaks, no metadata).
+    """
+    lines = [rng.choice(METADATA_LINES) for _ in range(rng.randint(0, 10))]
+    lines += [random_peak_line(rng) for _ in range(rng.randint(0, 15))]
+
+    # Irregular lines inside or after the peaks
+    for _ in range(rng.randint(0, 2)):
+        lines.insert(rng.randint(0, len(lines)), rng.choice(METADATA_LINES + ["", "  ", "abc", "12", "1 2 3"]))
+
+    newline = "\r\n" if rng.random() < 0.1 else "\n"
+    spectrum = newline.join(lines)
+
+    return spectrum + rng.choice(["", "\n", "\n\n", " "])
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_random_spectra(seed):
+    rng = random.Random(seed)
+
+    for _ in range(2000):
+        spectrum = random_spectrum(rng)
+
+        metadata, peak_list = extract_metadata_and_peak_list(spectrum)
+        assert (metadata, peak_list) == reference_extract_metadata_and_peak_list(spectrum), spectrum
+
+        if peak_list is not None:
+            assert outcome(peak_list_to_array, peak_list) == outcome(reference_peak_list_to_array, peak_list), peak_list
+
+
+@pytest.mark.parametrize("spectrum", [
+    "",
+    "\n",
+    "NAME: x",
+    "NAME: x\n",
+    "NAME: x\nNum Peaks: 2\n100 10\n200 20",
+    "NAME: x\nNum Peaks: 2\n100 10\n200 20\n",
+    "NAME: x\nNum Peaks: 2\n100\t10\n200:20\nCOMMENT: after\n300 30\n",
+    "NAME: x\nNum Peaks: 2\n100,5 10\n2e2 1E-3 \"annotated\"\n",
+    "NAME: x\nNum Peaks: 1\n\n100 10\n",
+    "100 10\n200 20\n",
+    "NAME: x\nNum Peaks: 1\n-100 -10\n",
+    "NAME: x\nNum Peaks: 1\n١٠٠ 10\n",
+])
+def test_edge_cases(spectrum):
+    metadata, peak_list = extract_metadata_and_peak_list(spectrum)
+    assert (metadata, peak_list) == reference_extract_metadata_and_peak_list(spectrum)
+
+    if peak_list is not None:
+        assert outcome(peak_list_to_array, peak_list) == outcome(reference_peak_list_to_array, peak_list)
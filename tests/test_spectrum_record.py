@@ -0,0 +1,20 @@
+from scripts.spectrum_record import Spectrum, spectrum_from_dict, spectra_to_dataframe, SPECTRUM_SLOTS
+import pickle
+
+
+def test_pickle_round_trip():
+    spectrum = spectrum_from_dict({"NAME": "caffeine", "NUM PEAKS": 2, "PEAKS_LIST": [[100.0, 1.0], [200.0, 2.0]]})
+
+    # The records are pickled when sent to or from the worker processes
+    assert Spectrum.__module__ == "scripts.spectrum_record"
+    assert pickle.loads(pickle.dumps(spectrum)) == spectrum
+
+
+def test_mapping_access():
+    spectrum = spectrum_from_dict({"NAME": "caffeine", "UNKNOWN KEY": "ignored"})
+    spectrum["NUM PEAKS"] = 2
+
+    assert spectrum.NUM_PEAKS == 2
+    assert spectrum.get("UNKNOWN KEY") is None
+    assert spectrum.to_dict() == {key: {"NAME": "caffeine", "NUM PEAKS": 2}.get(key, "") for key in SPECTRUM_SLOTS}
+    assert list(spectra_to_dataframe([spectrum]).columns) == list(SPECTRUM_SLOTS)
@@ -0,0 +1,50 @@
+from scripts.GUI.utils.global_vars import parameters_dict
+from scripts.splash_cache import load_splash_cache, lookup_splash_cache, store_splash_cache, save_splash_cache
+from scripts.set_projects import reset_updates
+import numpy as np
+import os
+
+
+def spectra(n_spectra):
+    return [{"PEAKS_LIST": [[100.0 + i, 1.0], [200.0, 2.0]]} for i in range(n_spectra)]
+
+
+def test_lookup_and_eviction(tmp_path, monkeypatch):
+    monkeypatch.setitem(parameters_dict, "splash_cache_max_entries", 3)
+    output_directory = str(tmp_path)
+
+    load_splash_cache(output_directory)
+    digests, cached_splash_list = lookup_splash_cache(spectra(5))
+    assert cached_splash_list == [None] * 5
+    store_splash_cache(digests, ["splash%d" % i for i in range(5)])
+
+    # Array peak lists share the entries of the list peak lists, empty peak lists are not cached
+    batch = [spectra(1)[0], {"PEAKS_LIST": np.array(spectra(2)[1]["PEAKS_LIST"])}, {"PEAKS_LIST": []}]
+    assert lookup_splash_cache(batch)[1] == ["splash0", "splash1", None]
+    save_splash_cache(output_directory)
+
+    # Only the most recently used entries are kept
+    load_splash_cache(output_directory)
+    cached_splash_list = lookup_splash_cache(spectra(5))[1]
+    save_splash_cache(output_directory)
+    assert cached_splash_list[:2] == ["splash0", "splash1"]
+    assert sum(splash is not None for splash in cached_splash_list) == 3
+
+
+def test_kept_by_reset_updates(tmp_path):
+    output_directory = str(tmp_path)
+
+    load_splash_cache(output_directory)
+    digests, _ = lookup_splash_cache(spectra(2))
+    store_splash_cache(digests, ["splash0", "splash1"])
+    save_splash_cache(output_directory)
+
+    (tmp_path / "updates.sqlite").write_bytes(b"")
+    (tmp_path / "report.txt").write_text("report")
+    reset_updates(output_directory)
+
+    assert sorted(os.listdir(output_directory)) == ["splash_cache.sqlite"]
+
+    load_splash_cache(output_directory)
+    assert lookup_splash_cache(spectra(2))[1] == ["splash0", "splash1"]
+    save_splash_cache(output_directory)
@@ -0,0 +1,94 @@
+from scripts.splash.splash_numpy import splash_batch, splash_arrays
+from scripts.splash.spectrum_type import SpectrumType
+from scripts.splash.spectrum import Spectrum
+from scripts.splash.splash import Splash
+import numpy as np
+import pytest
+
+
+def reference(peak_list):
+    """
+    SPLASH of a peak list computed by the reference Splash class, None when it can not be computed.
+    """
+    try:
+        return Splash().splash(Spectrum([tuple(peak) for peak in peak_list], SpectrumType.MS))
+    except Exception:
+        return None
+
+
+def random_peak_lists(seed, n_spectra):
+    """
+    Random peak lists, with sizes, m/z ranges and intensity scales like the ones of the input libraries.
+    """
+    rng = np.random.default_rng(seed)
+    peak_lists = []
+
+    for _ in range(n_spectra):
+        n_peaks = int(rng.integers(1, 200))
+        mz = rng.uniform(0, rng.choice([100.0, 1000.0, 5000.0]), n_peaks)
+        intensity = rng.uniform(0, rng.choice([1.0, 100.0, 1e6]), n_peaks)
+
+        # Rounded values give ties on the m/z and intensities
+        if rng.random() < 0.3:
+            mz = mz.round(1)
+            intensity = intensity.round(0)
+
+        peak_lists.append(np.column_stack((mz, intensity)).tolist())
+
+    return peak_lists
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_peak_lists(seed):
+    peak_lists = random_peak_lists(seed, 400)
+
+    assert splash_batch(peak_lists) == [reference(peak_list) for peak_list in peak_lists]
+
+
+def test_random_peak_arrays():
+    peak_lists = random_peak_lists(42, 200)
+
+    assert splash_batch([np.array(peak_list) for peak_list in peak_lists]) == [reference(peak_list) for peak_list in peak_lists]
+
+
+EDGE_CASES = {
+    "single_peak": [[100.0, 1.0]],
+    "nan_mz": [[float("nan"), 10.0], [150.0, 20.0]],
+    "nan_intensity": [[100.0, float("nan")], [150.0, 20.0]],
+    "infinite_intensity": [[100.0, float("inf")], [150.0, 20.0]],
+    "negative_intensity": [[100.0, -5.0], [150.0, 20.0]],
+    "negative_mz": [[-100.0, 5.0], [150.0, 20.0]],
+    "all_zero_intensities": [[100.0, 0.0], [150.0, 0.0]],
+    "int_values": [[100, 5], [150, 20], [151, 20]],
+    "huge_int_values": [[2 ** 60, 5], [150, 20]],
+    "duplicate_mz": [[100.0, 5.0], [100.0, 20.0], [100.0, 5.0], [250.5, 1.0]],
+    "duplicate_mz_and_intensity": [[100.0, 20.0], [100.0, 20.0]],
+    "huge_mz": [[1e13, 5.0], [150.0, 20.0]],
+    "many_top_ions_ties": [[float(mz), 10.0] for mz in range(50, 80)],
+    "text_values": [["100.0", "5.0"], ["150.0", "20.0"]],
+    "ragged": [[100.0, 5.0], [150.0]],
+}
+
+
+@pytest.mark.parametrize("name", EDGE_CASES)
+def test_edge_cases(name):
+    peak_list = EDGE_CASES[name]
+
+    # Alone and in a batch with valid spectra, to check the fallback to the reference implementation
+    assert splash_batch([peak_list]) == [reference(peak_list)]
+    assert splash_batch([[[10.0, 1.0]], peak_list, [[20.0, 2.0]]]) == [reference([[10.0, 1.0]]),
+                                                                       reference(peak_list),
+                                                                       reference([[20.0, 2.0]])]
+
+
+def test_empty_peak_list():
+    assert splash_batch([[]]) == [reference([])] == [None]
+    assert splash_batch([np.empty((0, 2))]) == [None]
+    assert splash_batch([]) == []
+
+
+def test_splash_arrays():
+    peak_list = random_peak_lists(7, 1)[0]
+    mz, intensity = zip(*peak_list)
+
+    assert splash_arrays(mz, intensity) == reference(peak_list)
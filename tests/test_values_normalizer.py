@@ -0,0 +1,103 @@
+from scripts.normalizer.values_normalizer import normalize_values, normalize_values_batch
+from scripts.normalizer.normalize_instruments_and_resolution import reset_instrument_cache_statistics
+import scripts.normalizer.normalize_instruments_and_resolution
+import scripts.deletion_report
+import scripts.global_report
+import scripts.globals_vars
+import random
+import copy
+import pytest
+
+# Values of the fields read by the normalizers, as found in the input libraries (other fields are "")
+FIELD_VALUES = {
+    "NAME": ["caffeine", "Aspirin", "nan", "", "unknown"],
+    "PREDICTED": ["", "true", "false", "nan"],
+    "RESOLUTION": ["", "17500", "high", "nan"],
+    "IONIZATION": ["", "ESI", "APCI", "EI", "n/a"],
+    "MSLEVEL": ["", "2", "MS2", "ms1", "3"],
+    "PRECURSORMZ": ["", "0", "195.0877", "195,0877", "abc", "786.8115 m/z", "nan"],
+    "EXACTMASS": ["", "194.0804", "nan"],
+    "PRECURSORTYPE": ["", "M", "M+Na", "[M+H]+", "[M-H]-", "[M+NH4]+", "M+H", "[M]+", "nan",
+                      "SOURCE_INSTRUMENT=LC-ESI-QTOF"],
+    "INSTRUMENTTYPE": ["", "LC-ESI-QTOF", "GC-EI-TOF", "Agilent 6530 Q-TOF", "Q Exactive Orbitrap",
+                       "Applied Biosystems API3000", "Waters Xevo TQ", "maXis plus", "nan"],
+    "INSTRUMENT": ["", "Agilent 6530 Q-TOF", "TripleTOF 5600 SCIEX", "Q Exactive Orbitrap", "maXis plus", "nan"],
+    "SMILES": ["", "CCO", "CCO computed", "c1ccccc1O", "CC(=O)Oc1ccccc1C(=O)O", "OC(=O)C(N)Cc1ccccc1", "nan"],
+    "INCHI": ["", "InChI=1S/C2H6O/c1-2-3/h3H,2H2,1H3", "nan"],
+    "INCHIKEY": ["", "LFQSCWFLJHTTHZ-UHFFFAOYSA-N", "nan"],
+    "RT": ["", "3.21 min", "193 s", "0.98", "nan"],
+    "IONMODE": ["", "P", "N", "Positive", "negative", "POS", "nan"],
+    "COMMENT": ["", "SMILES=CCO computed", "collision energy=35\" \"in-silico\" mode=x", "predicted spectrum",
+                "acquired on Q-Exactive, resolution 35000"],
+    "COLLISIONENERGY": ["", "35", "35 eV", "nan"],
+    "FILENAME": ["a.msp", "in-silico.msp", "b_predicted.mgf"],
+}
+
+
+def random_metadata(rng):
+    """
+    A random metadata dictionary with the fields of keys_list, in the order of keys_list.
+    """
+    return {key: rng.choice(FIELD_VALUES[key]) if key in FIELD_VALUES else ""
+            for key in scripts.globals_vars.keys_list if key != "PEAKS_LIST"}
+
+
+def normalize_each(metadata_list):
+    """
+    normalize_values applied spectrum by spectrum, with the spectra deleted during the normalization.
+    """
+    scripts.deletion_report.deleted_spectrum_list = []
+    results = [normalize_values(metadata_dict) for metadata_dict in metadata_list]
+    results = [metadata_dict if metadata_dict else None for metadata_dict in results]
+
+    return results, scripts.deletion_report.deleted_spectrum_list
+
+
+def normalize_batch(metadata_list):
+    """
+    normalize_values_batch, with the spectra deleted during the normalization.
+    """
+    scripts.deletion_report.deleted_spectrum_list = []
+    results = normalize_values_batch(metadata_list)
+
+    return results, scripts.deletion_report.deleted_spectrum_list
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_batch_normalization(seed):
+    rng = random.Random(seed)
+
+    # Repeated metadata, like the spectra of a same compound
+    metadata_list = [random_metadata(rng) for _ in range(300)]
+    metadata_list += [copy.deepcopy(rng.choice(metadata_list)) for _ in range(200)]
+
+    expected_results, expected_deleted = normalize_each(copy.deepcopy(metadata_list))
+    results, deleted = normalize_batch(copy.deepcopy(metadata_list))
+
+    # Same values, same key order and same deleted spectra (with their deletion reason)
+    assert [list(metadata_dict.items()) if metadata_dict else None for metadata_dict in results] == \
+           [list(metadata_dict.items()) if metadata_dict else None for metadata_dict in expected_results]
+    assert sorted(map(repr, deleted)) == sorted(map(repr, expected_deleted))
+    assert any(metadata_dict is None for metadata_dict in results)
+
+
+def instrument_cache_statistics(normalize, metadata_list):
+    """
+    Hits and misses of the instrument resolution cache during a normalization, starting from an empty cache.
+    """
+    scripts.normalizer.normalize_instruments_and_resolution.instrument_resolution_cache.clear()
+    reset_instrument_cache_statistics()
+
+    normalize(copy.deepcopy(metadata_list))
+
+    return scripts.global_report.instrument_cache_hits, scripts.global_report.instrument_cache_misses
+
+
+def test_batch_normalization_statistics():
+    rng = random.Random(0)
+    metadata_list = [random_metadata(rng) for _ in range(300)]
+
+    # The cache statistics count spectra in both modes
+    hits, misses = instrument_cache_statistics(normalize_batch, metadata_list)
+    assert (hits, misses) == instrument_cache_statistics(normalize_each, metadata_list)
+    assert hits > 0 and misses > 0